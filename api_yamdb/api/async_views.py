@@ -0,0 +1,188 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections, connections
+from django.http import StreamingHttpResponse
+from django.urls import URLPattern
+
+# Канал receive текущего соединения ASGI: по нему видно отключение клиента.
+asgi_receive = contextvars.ContextVar('asgi_receive', default=None)
+
+# Маршруты router_v1, которые под ASGI обслуживаются асинхронно.
+ASYNC_READ_ROUTES = (
+    'titles-list', 'titles-detail', 'reviews-list', 'comments-list',
+    'genres-list', 'categories-list',
+)
+
+
+@functools.lru_cache(maxsize=None)
+def get_executor():
+    """Пул потоков для ORM; у каждого потока своё соединение с БД.
+
+    Размер пула ASYNC_DB_THREADS ограничивает число соединений процесса,
+    а с CONN_MAX_AGE соединения потоков переиспользуются как пул. Когда
+    все потоки заняты, следующие запросы ждут в очереди пула.
+    """
+    return ThreadPoolExecutor(
+        max_workers=settings.ASYNC_DB_THREADS,
+        thread_name_prefix='yamdb-db',
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_feed_executor():
+    """Отдельный пул для опроса ленты изменений (api.changes).
+
+    Клиенты long-poll и SSE ждут минутами и опрашивают БД раз в
+    CHANGE_FEED_POLL_INTERVAL. В своём пуле на CHANGE_FEED_DB_THREADS
+    потоков они не занимают потоки представлений чтения.
+    """
+    return ThreadPoolExecutor(
+        max_workers=settings.CHANGE_FEED_DB_THREADS,
+        thread_name_prefix='yamdb-feed',
+    )
+
+
+def run_view(view, request, args, kwargs):
+    try:
+        response = view(request, *args, **kwargs)
+        # Рендер здесь, а не в общем потоке обработчика ASGI.
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Асинхронная обёртка синхронного представления DRF.
+
+    Цикл событий не ждёт базу: представление целиком выполняется в пуле
+    потоков get_executor, а пока идёт запрос к БД, процесс принимает и
+    обслуживает другие соединения.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await sync_to_async(
+            run_view, thread_sensitive=False, executor=get_executor()
+        )(view, request, args, kwargs)
+
+    return wrapper
+
+
+def async_read_urls(patterns):
+    """Подменяет представления ASYNC_READ_ROUTES, если включён ASGI-режим."""
+    if not settings.ASYNC_READ_VIEWS:
+        return patterns
+    return [
+        URLPattern(pattern.pattern, async_view(pattern.callback),
+                   pattern.default_args, pattern.name)
+        if pattern.name in ASYNC_READ_ROUTES else pattern
+        for pattern in patterns
+    ]
+
+
+def iterate_in_loop(content):
+    """Перебирает асинхронный генератор в собственном цикле событий."""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(content.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(content.aclose())
+        loop.close()
+
+
+class AsyncStreamingHttpResponse(StreamingHttpResponse):
+    """Потоковый ответ, тело которого - асинхронный генератор.
+
+    StreamingASGIHandler перебирает такое тело прямо в цикле событий, не
+    занимая поток. Под WSGI (runserver, тестовый клиент) генератор
+    перебирается в собственном цикле событий.
+    """
+
+    def __init__(self, content, *args, **kwargs):
+        super().__init__(iterate_in_loop(content), *args, **kwargs)
+        self.async_streaming_content = content
+
+
+async def thread_parts(parts):
+    """Перебирает синхронный генератор в отдельном потоке на ответ."""
+    loop = asyncio.get_event_loop()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        try:
+            while True:
+                part = await loop.run_in_executor(executor, next, parts, None)
+                if part is None:
+                    return
+                yield part
+        finally:
+            await loop.run_in_executor(executor, connections.close_all)
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGIHandler, который читает потоковые ответы вне цикла событий.
+
+    Django 3.2 перебирает потоковый ответ прямо в цикле событий, а
+    генераторы выгрузки читают БД. Тело такого ответа перебирается в
+    отдельном потоке на ответ (thread_parts), цикл событий только
+    отправляет готовые части; тело AsyncStreamingHttpResponse
+    перебирается в цикле событий. Перебор прекращается, когда клиент
+    отключился: поток SSE иначе опрашивал бы БД до конца своего срока.
+
+    send_response - недокументированный метод ASGIHandler Django 3.2, его
+    сигнатура проверена только для этой версии. Django 4.2 сам перебирает
+    потоковые ответы вне цикла событий, после обновления класс не нужен.
+    """
+
+    async def __call__(self, scope, receive, send):
+        token = asgi_receive.set(receive)
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            asgi_receive.reset(token)
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+        if isinstance(response, AsyncStreamingHttpResponse):
+            parts = response.async_streaming_content
+        else:
+            parts = thread_parts(response.streaming_content)
+        response.streaming_content = ()
+
+        async def send_with_body(message):
+            if (message['type'] == 'http.response.body'
+                    and not message.get('more_body')):
+                await self.stream_parts(parts, send)
+            await send(message)
+
+        await super().send_response(response, send_with_body)
+
+    async def stream_parts(self, parts, send):
+        # Тело запроса уже прочитано: следующее сообщение - отключение.
+        receive = asgi_receive.get()
+        disconnect = asyncio.ensure_future(receive()) if receive else None
+        try:
+            async for part in parts:
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+                if disconnect is not None and disconnect.done():
+                    return
+        finally:
+            if disconnect is not None:
+                disconnect.cancel()
+            await parts.aclose()
@@ -0,0 +1,199 @@
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from rest_framework import serializers, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from reviews.models import Category, Genre, GenreTitle, Title, TitleRank
+
+from .cache import bump_version_on_commit
+
+
+class TitleBulkItemSerializer(serializers.ModelSerializer):
+    """Проверка одного произведения без обращений к БД.
+
+    Слаги категории и жанров сверяются с базой потом, разом для всей пачки.
+    """
+    id = serializers.IntegerField(required=False)
+    category = serializers.SlugField(max_length=50)
+    genre = serializers.ListField(
+        child=serializers.SlugField(max_length=50), allow_empty=True
+    )
+
+    class Meta:
+        model = Title
+        fields = ('id', 'name', 'year', 'description', 'category', 'genre')
+
+
+class SlugBulkItemSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=256)
+    slug = serializers.SlugField(max_length=50)
+
+
+def validate_items(data, serializer_class):
+    """Проверяет каждый элемент и возвращает данные и ошибки по индексам."""
+    if not isinstance(data, list):
+        raise ValidationError({'non_field_errors': ['Ожидается список.']})
+    if len(data) > settings.BULK_MAX_ITEMS:
+        raise ValidationError({'non_field_errors': [
+            f'Не больше {settings.BULK_MAX_ITEMS} элементов за запрос.'
+        ]})
+    items, errors = [], []
+    for item in data:
+        serializer = serializer_class(data=item)
+        if serializer.is_valid():
+            items.append(serializer.validated_data)
+            errors.append({})
+        else:
+            items.append(None)
+            errors.append(serializer.errors)
+    return items, errors
+
+
+def add_error(errors, index, field, message):
+    errors[index].setdefault(field, []).append(message)
+
+
+def check_duplicates(items, errors, key):
+    seen = set()
+    for index, item in enumerate(items):
+        if item is None or item.get(key) is None:
+            continue
+        if item[key] in seen:
+            add_error(errors, index, key, 'Значение повторяется в запросе.')
+        seen.add(item[key])
+
+
+def bulk_response(errors, results, created):
+    if any(errors):
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+    return Response(
+        results,
+        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+    )
+
+
+def check_title_references(items, errors, categories, genres, existing,
+                           upsert):
+    for index, item in enumerate(items):
+        if item is None:
+            continue
+        if item['category'] not in categories:
+            add_error(errors, index, 'category', 'Категория не найдена.')
+        missing = [slug for slug in item['genre'] if slug not in genres]
+        if missing:
+            add_error(errors, index, 'genre',
+                      f'Жанры не найдены: {", ".join(missing)}.')
+        if 'id' in item and not upsert:
+            add_error(errors, index, 'id',
+                      'id передаётся только при обновлении (PUT).')
+        elif 'id' in item and item['id'] not in existing:
+            add_error(errors, index, 'id', 'Произведение не найдено.')
+
+
+def write_titles(data, upsert):
+    """Создаёт или обновляет произведения пачкой в одной транзакции.
+
+    Категории, жанры и существующие произведения читаются одним запросом
+    на модель, произведения и связи с жанрами пишутся через bulk_*.
+    """
+    items, errors = validate_items(data, TitleBulkItemSerializer)
+    check_duplicates(items, errors, 'id')
+    valid = [item for item in items if item is not None]
+    categories = Category.objects.in_bulk(
+        {item['category'] for item in valid}, field_name='slug'
+    )
+    genres = Genre.objects.in_bulk(
+        {slug for item in valid for slug in item['genre']},
+        field_name='slug',
+    )
+    ids = {item['id'] for item in valid if 'id' in item}
+    existing = Title.objects.in_bulk(ids) if upsert and ids else {}
+    check_title_references(items, errors, categories, genres, existing,
+                           upsert)
+    if any(errors):
+        return bulk_response(errors, None, created=False)
+
+    to_create, to_update, links = [], [], []
+    for item in items:
+        title = existing.get(item.get('id')) or Title()
+        title.name = item['name']
+        title.year = item['year']
+        title.description = item.get('description')
+        title.category = categories[item['category']]
+        (to_update if title.pk else to_create).append(title)
+        links.append((title, [
+            genres[slug] for slug in dict.fromkeys(item['genre'])
+        ]))
+    updated_ids = {title.pk for title in to_update}
+    try:
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                Title.objects.bulk_create(to_create, batch_size=1000)
+            else:
+                # Без RETURNING bulk_create не выдаёт id, а они нужны связям.
+                for title in to_create:
+                    title.save()
+            Title.objects.bulk_update(
+                to_update, ['name', 'year', 'description', 'category'],
+                batch_size=1000,
+            )
+            GenreTitle.objects.filter(title__in=updated_ids).delete()
+            GenreTitle.objects.bulk_create(
+                [
+                    GenreTitle(title=title, genre=genre)
+                    for title, title_genres in links
+                    for genre in title_genres
+                ],
+                batch_size=1000,
+            )
+            # bulk_* не отправляют сигналы, версии и строки рейтинговых
+            # списков обновляются здесь.
+            TitleRank.objects.rebuild(Title.objects.filter(
+                pk__in=[title.pk for title, _ in links]
+            ))
+            bump_version_on_commit('catalog', 'all')
+    except IntegrityError as error:
+        raise ValidationError({'non_field_errors': [str(error)]})
+    results = [
+        {
+            'id': title.pk,
+            'status': 'updated' if title.pk in updated_ids else 'created',
+        }
+        for title, _ in links
+    ]
+    return bulk_response(errors, results, created=bool(to_create))
+
+
+def write_slugged(model, serializer_class, data, upsert):
+    """Создаёт или обновляет по слагу жанры или категории пачкой."""
+    items, errors = validate_items(data, SlugBulkItemSerializer)
+    check_duplicates(items, errors, 'slug')
+    valid = [item for item in items if item is not None]
+    existing = model.objects.in_bulk(
+        {item['slug'] for item in valid}, field_name='slug'
+    )
+    if not upsert:
+        for index, item in enumerate(items):
+            if item is not None and item['slug'] in existing:
+                add_error(errors, index, 'slug', 'Слаг уже существует.')
+    if any(errors):
+        return bulk_response(errors, None, created=False)
+    objects, to_create, to_update = [], [], []
+    for item in items:
+        obj = existing.get(item['slug'])
+        if obj is None:
+            obj = model(**item)
+            to_create.append(obj)
+        else:
+            obj.name = item['name']
+            to_update.append(obj)
+        objects.append(obj)
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create(to_create, batch_size=1000)
+            model.objects.bulk_update(to_update, ['name'], batch_size=1000)
+            bump_version_on_commit('catalog', 'all')
+    except IntegrityError as error:
+        raise ValidationError({'non_field_errors': [str(error)]})
+    results = serializer_class(objects, many=True).data
+    return bulk_response(errors, results, created=bool(to_create))
@@ -0,0 +1,119 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+VERSION_KEY = 'yamdb:version:{scope}:{pk}'
+MODIFIED_KEY = 'yamdb:modified:{scope}:{pk}'
+PAGE_KEY = 'yamdb:page:{scope}:{pk}:{versions}:{digest}'
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def initial_version():
+    # Счётчик начинается с текущего времени: если ключ версии вытеснен из
+    # кэша, новая версия не совпадёт ни с одной из уже закэшированных.
+    return time.time_ns() // 1000
+
+
+def get_versions(*scopes):
+    """Возвращает версии для пар (scope, pk), создавая недостающие."""
+    cache = get_cache()
+    keys = [VERSION_KEY.format(scope=scope, pk=pk) for scope, pk in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = initial_version()
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def get_validators(*scopes):
+    """Возвращает версии и время последнего изменения для пар (scope, pk).
+
+    Время изменения - максимум по всем парам в секундах; версии и отметки
+    читаются одним обращением к кэшу.
+    """
+    cache = get_cache()
+    version_keys = [
+        VERSION_KEY.format(scope=scope, pk=pk) for scope, pk in scopes
+    ]
+    modified_keys = [
+        MODIFIED_KEY.format(scope=scope, pk=pk) for scope, pk in scopes
+    ]
+    stored = cache.get_many(version_keys + modified_keys)
+    now = int(time.time())
+    for key in modified_keys:
+        if key not in stored:
+            # Неизвестное время изменения считается текущим, так что
+            # If-Modified-Since не подтвердит ответ, собранный раньше.
+            if not cache.add(key, now, timeout=None):
+                stored[key] = cache.get(key, now)
+            else:
+                stored[key] = now
+    if any(key not in stored for key in version_keys):
+        versions = get_versions(*scopes)
+    else:
+        versions = [stored[key] for key in version_keys]
+    return versions, max(stored[key] for key in modified_keys)
+
+
+def bump_version(scope, pk):
+    cache = get_cache()
+    key = VERSION_KEY.format(scope=scope, pk=pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, initial_version(), timeout=None)
+    cache.set(MODIFIED_KEY.format(scope=scope, pk=pk), int(time.time()),
+              timeout=None)
+
+
+def bump_version_on_commit(scope, pk):
+    """Сдвигает версию после фиксации транзакции записи.
+
+    Пока транзакция не зафиксирована, читатель может закэшировать старые
+    данные, поэтому сдвиг до коммита оставил бы в кэше устаревшую страницу.
+    """
+    transaction.on_commit(lambda: bump_version(scope, pk))
+
+
+class VersionedListCacheMixin:
+    """Кэширует сериализованные страницы списка по версии родителя.
+
+    Ключ страницы включает версии из get_list_validator_scopes: версию
+    родительского объекта, его предков и имён пользователей, поэтому
+    запись сбрасывает кэш сдвигом одного счётчика.
+    """
+    cache_scope = None
+    cache_lookup_kwarg = None
+
+    def get_list_cache_key(self, request):
+        pk = self.kwargs.get(self.cache_lookup_kwarg)
+        versions = get_versions(*self.get_list_validator_scopes())
+        digest = hashlib.md5(
+            request.build_absolute_uri().encode()
+        ).hexdigest()
+        return PAGE_KEY.format(
+            scope=self.cache_scope,
+            pk=pk,
+            versions='.'.join(str(version) for version in versions),
+            digest=digest,
+        )
+
+    def list(self, request, *args, **kwargs):
+        cache = get_cache()
+        key = self.get_list_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
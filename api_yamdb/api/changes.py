@@ -0,0 +1,241 @@
+import asyncio
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.http import JsonResponse
+from reviews.models import Comment, Review
+
+from .async_views import AsyncStreamingHttpResponse, get_feed_executor
+from .export import dumps
+from .models import ChangeEvent, ChangeSequence
+from .rows import datetime_field
+from .serializers import CommentSerializer, ReviewSerializer
+
+EVENT_VALUES = (
+    'seq', 'kind', 'action', 'object_id', 'review_id', 'data', 'created',
+)
+EVENT_STREAM = 'text/event-stream'
+# Пустая строка-комментарий SSE не даёт прокси закрыть тихое соединение.
+HEARTBEAT_INTERVAL = 15
+
+
+def next_seq_sql():
+    quote = connection.ops.quote_name
+    table = quote(ChangeSequence._meta.db_table)
+    title, last = quote('title'), quote('last')
+    return (
+        f'INSERT INTO {table} ({title}, {last}) VALUES (%s, 1) '
+        f'ON CONFLICT ({title}) DO UPDATE SET {last} = {table}.{last} + 1 '
+        f'RETURNING {last}'
+    )
+
+
+def comment_title_id(comment):
+    """id произведения комментария или None, если ревью уже удалено.
+
+    Загруженное ревью не запрашивается повторно, а при каскадном удалении
+    читается одно поле; ответ запоминается в комментарии для остальных
+    сигналов.
+    """
+    if not hasattr(comment, '_title_id'):
+        if Comment.review.is_cached(comment):
+            comment._title_id = comment.review.title_id
+        else:
+            comment._title_id = Review.objects.filter(
+                pk=comment.review_id
+            ).values_list('title_id', flat=True).first()
+    return comment._title_id
+
+
+def record_change(instance, action):
+    """Пишет событие об изменении ревью или комментария.
+
+    Вызывается из сигналов внутри транзакции записи: номер события и
+    само событие фиксируются вместе с изменением или не фиксируются.
+    """
+    if isinstance(instance, Review):
+        kind, serializer = ChangeEvent.REVIEW, ReviewSerializer
+        title_id, review_id = instance.title_id, None
+    else:
+        kind, serializer = ChangeEvent.COMMENT, CommentSerializer
+        title_id, review_id = comment_title_id(instance), instance.review_id
+        if title_id is None:
+            # Ревью удалено раньше комментария, его событие уже в ленте.
+            return
+    with connection.cursor() as cursor:
+        cursor.execute(next_seq_sql(), [title_id])
+        seq = cursor.fetchone()[0]
+    ChangeEvent.objects.create(
+        title_id=title_id, seq=seq, kind=kind, action=action,
+        object_id=instance.pk, review_id=review_id,
+        data=None if action == ChangeEvent.DELETED else (
+            serializer(instance).data
+        ),
+    )
+
+
+def event_item(row):
+    return {
+        'seq': row['seq'],
+        'type': row['kind'],
+        'action': row['action'],
+        'id': row['object_id'],
+        'review_id': row['review_id'],
+        'data': row['data'],
+        'time': datetime_field.to_representation(row['created']),
+    }
+
+
+def latest_seq(title_id):
+    return ChangeSequence.objects.filter(title=title_id).values_list(
+        'last', flat=True
+    ).first() or 0
+
+
+def fetch_changes(title_id, since):
+    """События после курсора since; None, если часть из них уже удалена.
+
+    Номера событий произведения идут подряд, так что пропуск после
+    курсора означает очистку ленты: клиенту нужно перечитать списки.
+    """
+    rows = list(ChangeEvent.objects.filter(
+        title_id=title_id, seq__gt=since
+    ).order_by('seq').values(*EVENT_VALUES)[:settings.CHANGE_FEED_PAGE_SIZE])
+    if rows and rows[0]['seq'] != since + 1:
+        return None
+    return [event_item(row) for row in rows]
+
+
+def run_query(func, *args):
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+def in_db_thread(func, *args):
+    """Выполняет func в пуле потоков ленты (get_feed_executor).
+
+    Ожидающие клиенты не держат собственных соединений: их число
+    ограничено размером пула, сколько бы клиентов ни ждало событий.
+    """
+    return get_feed_executor().submit(run_query, func, *args)
+
+
+async def wait_for_changes(title_id, since, wait):
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + wait
+    while True:
+        events = await asyncio.wrap_future(
+            in_db_thread(fetch_changes, title_id, since)
+        )
+        remaining = deadline - loop.time()
+        if events != [] or remaining <= 0:
+            return events
+        await asyncio.sleep(
+            min(settings.CHANGE_FEED_POLL_INTERVAL, remaining)
+        )
+
+
+def sse_message(event):
+    return (
+        f'id: {event["seq"]}\n'
+        f'event: {event["type"]}.{event["action"]}\n'
+        f'data: {dumps(event)}\n\n'
+    ).encode()
+
+
+async def event_stream(title_id, since):
+    """Поток SSE: события по мере появления до CHANGE_FEED_STREAM_DURATION.
+
+    Потом поток закрывается, и EventSource переподключается с
+    Last-Event-ID. Событие reset - лента очищена после курсора. Между
+    опросами поток ждёт в цикле событий и не занимает поток.
+    """
+    loop = asyncio.get_event_loop()
+    started = last_sent = loop.time()
+    interval = settings.CHANGE_FEED_POLL_INTERVAL
+    yield f'retry: {int(interval * 1000)}\n\n'.encode()
+    while loop.time() - started < settings.CHANGE_FEED_STREAM_DURATION:
+        events = await asyncio.wrap_future(
+            in_db_thread(fetch_changes, title_id, since)
+        )
+        if events is None:
+            yield b'event: reset\ndata: {}\n\n'
+            return
+        for event in events:
+            yield sse_message(event)
+            since = event['seq']
+        now = loop.time()
+        if events:
+            last_sent = now
+        elif now - last_sent >= HEARTBEAT_INTERVAL:
+            last_sent = now
+            yield b': ping\n\n'
+        if len(events) < settings.CHANGE_FEED_PAGE_SIZE:
+            await asyncio.sleep(interval)
+
+
+def json_response(data, status=200):
+    # Кириллица без экранирования, как в ответах DRF.
+    return JsonResponse(data, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def parse_int(value, name, upper=None):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = -1
+    if number < 0 or (upper is not None and number > upper):
+        limit = '' if upper is None else f' не больше {upper}'
+        return None, json_response(
+            {name: [f'Нужно целое неотрицательное число{limit}.']},
+            status=400,
+        )
+    return number, None
+
+
+async def title_changes(request, title_id):
+    """Изменения ревью и комментариев произведения после ?since=.
+
+    Без since возвращается текущий курсор: его нужно получить до
+    загрузки списков. Если событий нет, ответ ждёт их до ?wait= секунд
+    (по умолчанию CHANGE_FEED_MAX_WAIT). С Accept: text/event-stream
+    события идут потоком SSE, курсор - since или Last-Event-ID.
+    Ответ 410 - события после курсора удалены, списки нужно перечитать.
+    """
+    if request.method != 'GET':
+        return json_response({'detail': f'Метод "{request.method}" не '
+                                        f'разрешен.'}, status=405)
+    stream = EVENT_STREAM in request.headers.get('Accept', '')
+    since = request.GET.get('since')
+    if stream and since is None:
+        since = request.headers.get('Last-Event-ID')
+    if since is None:
+        since = await asyncio.wrap_future(in_db_thread(latest_seq, title_id))
+        if not stream:
+            return json_response({'cursor': since, 'events': []})
+    since, error = parse_int(since, 'since')
+    if error is not None:
+        return error
+    if stream:
+        response = AsyncStreamingHttpResponse(
+            event_stream(title_id, since), content_type=EVENT_STREAM
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    wait, error = parse_int(request.GET.get(
+        'wait', settings.CHANGE_FEED_MAX_WAIT
+    ), 'wait', settings.CHANGE_FEED_MAX_WAIT)
+    if error is not None:
+        return error
+    events = await wait_for_changes(title_id, since, wait)
+    if events is None:
+        return json_response({'detail': 'События после курсора удалены, '
+                                        'перечитайте списки.'}, status=410)
+    return json_response({
+        'cursor': events[-1]['seq'] if events else since,
+        'events': events,
+    })
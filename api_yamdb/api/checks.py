@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+@register(Tags.caches)
+def shared_cache_check(app_configs, **kwargs):
+    """Кэш ответов и пользователей должен быть общим для процессов.
+
+    Версии списков и сброс закэшированного пользователя видны только
+    процессу, который их записал, поэтому с LocMemCache остальные
+    процессы отдают устаревшие страницы и удалённых пользователей.
+    """
+    errors = []
+    aliases = {settings.RESPONSE_CACHE_ALIAS, settings.AUTH_USER_CACHE_ALIAS}
+    for alias in sorted(aliases):
+        backend = settings.CACHES.get(alias, {}).get('BACKEND')
+        if backend in PROCESS_LOCAL_CACHES:
+            errors.append(Warning(
+                f'Кэш {alias!r} ({backend}) не общий для процессов.',
+                hint='Задайте CACHE_BACKEND с общим хранилищем: кэш в БД '
+                     'или Redis.',
+                id='api.W001',
+            ))
+    return errors
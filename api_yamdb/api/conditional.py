@@ -0,0 +1,58 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+
+from .cache import get_validators
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 Not Modified по ETag и Last-Modified из версий в кэше.
+
+    Валидаторы строятся из счётчиков версий, которые сдвигают сигналы
+    записи, поэтому проверка не выполняет ни основных запросов, ни
+    сериализации. Версии читаются до выборки данных: если запись произойдёт
+    между ними, клиент получит свежее тело со старым ETag и просто
+    перезапросит его в следующий раз.
+    """
+
+    def get_list_validator_scopes(self):
+        raise NotImplementedError
+
+    def get_detail_validator_scopes(self):
+        return self.get_list_validator_scopes()
+
+    def get_etag(self, request, versions):
+        source = '|'.join([
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+            *(str(version) for version in versions),
+        ])
+        return 'W/"{}"'.format(hashlib.md5(source.encode()).hexdigest())
+
+    def conditional(self, scopes, handler, request, *args, **kwargs):
+        versions, last_modified = get_validators(*scopes)
+        etag = self.get_etag(request, versions)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(
+            self.get_list_validator_scopes(), super().list,
+            request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(
+            self.get_detail_validator_scopes(), super().retrieve,
+            request, *args, **kwargs
+        )
@@ -1,8 +1,58 @@
-import random
+import secrets
 import string
 
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from users.models import ConfirmationCode
+
+ALPHABET = string.ascii_uppercase + string.ascii_lowercase
+
 
 def generate_confirmation_code():
 
-    return ''.join(random.choices(
-        string.ascii_uppercase + string.ascii_lowercase, k=10))
+    return ''.join(secrets.choice(ALPHABET) for _ in range(10))
+
+
+def hash_confirmation_code(code):
+    return salted_hmac(
+        'api.confirmation_code', code, algorithm='sha256'
+    ).hexdigest()
+
+
+def store_confirmation_code(user, code):
+    """Сохраняет хеш нового кода вместо прежнего, сбрасывая попытки.
+
+    update_or_create блокирует строку кода, а при одновременной первой
+    выдаче повторяет чтение после IntegrityError.
+    """
+    ConfirmationCode.objects.update_or_create(user=user, defaults={
+        'code_hash': hash_confirmation_code(code),
+        'expires_at': timezone.now() + settings.CONFIRMATION_CODE_LIFETIME,
+        'attempts': 0,
+    })
+
+
+def check_confirmation_code(user, code):
+    """Проверяет код; верный код одноразовый, неверный тратит попытку.
+
+    user должен быть загружен с select_related('confirmation'). Хеш,
+    срок и попытки повторяются в UPDATE/DELETE, поэтому параллельные
+    запросы не превысят лимит, не используют код дважды и не удалят код,
+    выданный заново после загрузки пользователя.
+    """
+    stored = getattr(user, 'confirmation', None)
+    if stored is None:
+        return False
+    codes = ConfirmationCode.objects.filter(
+        user=user,
+        code_hash=stored.code_hash,
+        expires_at__gt=timezone.now(),
+        attempts__lt=settings.CONFIRMATION_CODE_MAX_ATTEMPTS,
+    )
+    if constant_time_compare(stored.code_hash, hash_confirmation_code(code)):
+        deleted, _ = codes.delete()
+        return bool(deleted)
+    codes.update(attempts=F('attempts') + 1)
+    return False
@@ -0,0 +1,15 @@
+from rest_framework import status
+from rest_framework.response import Response
+from reviews.deletion import schedule_deletion
+
+
+class ScheduledDestroyMixin:
+    """DELETE через reviews.deletion: 204 или 202, если удаление в очереди."""
+    deletion_kind = None
+
+    def destroy(self, request, *args, **kwargs):
+        job = schedule_deletion(self.deletion_kind, self.get_object().pk)
+        if job is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response({'job': job.pk, 'status': job.status},
+                        status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,122 @@
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import renderers, views
+from reviews.models import Comment, Review, Title
+
+from .permissions import IsAdmin
+from .rows import (COMMENT_VALUES, REVIEW_VALUES, TITLE_VALUES, comment_rows,
+                   genres_by_title, review_rows, title_rows)
+
+
+def dumps(item):
+    # Тот же компактный вид, что у JSONRenderer DRF.
+    return json.dumps(item, ensure_ascii=False, separators=(',', ':'))
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    """Объект JSON на строку; для ответов с ошибками - одна строка."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (dumps(data) + '\n').encode()
+
+
+def iter_batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def ndjson_chunks(batches):
+    for batch in batches:
+        yield ''.join(dumps(item) + '\n' for item in batch).encode()
+
+
+def json_array_chunks(batches):
+    separator = '['
+    for batch in batches:
+        yield (separator + ','.join(dumps(item) for item in batch)).encode()
+        separator = ','
+    yield b']' if separator == ',' else b'[]'
+
+
+class ExportView(views.APIView):
+    """Потоковая выгрузка всей таблицы в NDJSON или JSON-массив.
+
+    Строки читаются серверным курсором (iterator) пачками по
+    EXPORT_CHUNK_SIZE и сразу отправляются клиенту, поэтому память не
+    зависит от размера таблицы. Формат выбирается заголовком Accept или
+    параметром ``?format=ndjson|json``.
+    """
+    permission_classes = (IsAdmin,)
+    renderer_classes = (NDJSONRenderer, renderers.JSONRenderer)
+    queryset = None
+    values_fields = ()
+    parent_field = None
+
+    def build_rows(self, rows):
+        raise NotImplementedError
+
+    def iter_items(self):
+        fields = list(self.values_fields)
+        if self.parent_field:
+            fields.append(f'{self.parent_field}_id')
+        chunk_size = settings.EXPORT_CHUNK_SIZE
+        rows = self.queryset.order_by('pk').values(*fields).iterator(
+            chunk_size=chunk_size
+        )
+        for batch in iter_batches(rows, chunk_size):
+            items = self.build_rows(batch)
+            if self.parent_field:
+                for item, row in zip(items, batch):
+                    item[self.parent_field] = row[f'{self.parent_field}_id']
+            yield items
+
+    def get(self, request):
+        renderer = request.accepted_renderer
+        if renderer.format == 'json':
+            content = json_array_chunks(self.iter_items())
+        else:
+            content = ndjson_chunks(self.iter_items())
+        return StreamingHttpResponse(
+            content, content_type=f'{renderer.media_type}; charset=utf-8'
+        )
+
+
+class TitleExportView(ExportView):
+    queryset = Title.objects.all()
+    values_fields = TITLE_VALUES
+
+    def build_rows(self, rows):
+        # Пачка упорядочена по id, её жанры выбираются одним диапазоном.
+        return title_rows(rows, genres_by_title(
+            id_range=(rows[0]['id'], rows[-1]['id'])
+        ))
+
+
+class ReviewExportView(ExportView):
+    queryset = Review.objects.all()
+    values_fields = REVIEW_VALUES
+    parent_field = 'title'
+
+    def build_rows(self, rows):
+        return review_rows(rows)
+
+
+class CommentExportView(ExportView):
+    queryset = Comment.objects.all()
+    values_fields = COMMENT_VALUES
+    parent_field = 'review'
+
+    def build_rows(self, rows):
+        return comment_rows(rows)
@@ -1,9 +1,11 @@
 from django_filters import rest_framework as filters
 from reviews.models import Title
 
+from .search import SearchBackend
+
 
 class TitleFilter(filters.FilterSet):
-    name = filters.CharFilter(field_name='name', lookup_expr='icontains')
+    name = filters.CharFilter(method='filter_name')
     year = filters.NumberFilter(field_name='year')
     category = filters.CharFilter(field_name="category__slug")
     genre = filters.CharFilter(field_name='genre__slug')
@@ -11,3 +13,6 @@ class TitleFilter(filters.FilterSet):
     class Meta:
         model = Title
         fields = ['name', 'year', 'category', 'genre']
+
+    def filter_name(self, queryset, name, value):
+        return SearchBackend(queryset.db).search(queryset, name, [value])
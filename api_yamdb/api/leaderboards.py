@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.db.models import Subquery
+from rest_framework.exceptions import ValidationError
+from reviews.models import Category, Genre, TitleRank
+
+from .rows import TITLE_VALUES, title_rows
+
+DEFAULT_SIZE = 10
+
+
+def board_filter(params):
+    """Список по параметрам запроса: genre, category, year или все."""
+    chosen = [name for name in ('genre', 'category', 'year')
+              if name in params]
+    if len(chosen) > 1:
+        raise ValidationError({'non_field_errors': [
+            'Укажите не больше одного из параметров genre, category, year.'
+        ]})
+    if not chosen:
+        return {'board': TitleRank.ALL, 'key': 0}
+    name = chosen[0]
+    if name == 'year':
+        try:
+            return {'board': TitleRank.YEAR, 'key': int(params['year'])}
+        except ValueError:
+            raise ValidationError({'year': ['Год должен быть целым числом.']})
+    model = Genre if name == 'genre' else Category
+    return {
+        'board': name,
+        'key': Subquery(model.objects.filter(
+            slug=params[name]
+        ).values('pk')),
+    }
+
+
+def board_size(params):
+    try:
+        size = int(params.get('limit', DEFAULT_SIZE))
+    except ValueError:
+        size = 0
+    if not 1 <= size <= settings.LEADERBOARD_MAX_SIZE:
+        raise ValidationError({'limit': [
+            f'Число от 1 до {settings.LEADERBOARD_MAX_SIZE}.'
+        ]})
+    return size
+
+
+def leaderboard(params):
+    """Первые места списка в формате TitleGETSerializer с баллом.
+
+    Строки берутся по индексу title_rank_board_idx вместе с
+    произведением и категорией одним запросом, жанры - вторым.
+    """
+    ranks = TitleRank.objects.filter(
+        review_count__gte=settings.LEADERBOARD_MIN_REVIEWS,
+        **board_filter(params),
+    ).order_by('-score', 'title_id').values(
+        'score', *(f'title__{field}' for field in TITLE_VALUES)
+    )[:board_size(params)]
+    rows = [
+        dict({field: rank[f'title__{field}'] for field in TITLE_VALUES},
+             score=rank['score'])
+        for rank in ranks
+    ]
+    items = title_rows(rows)
+    for item, row in zip(items, rows):
+        item['score'] = round(row['score'], 2)
+    return items
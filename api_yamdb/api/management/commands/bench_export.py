@@ -0,0 +1,67 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.test import APIClient
+from reviews.models import Category, Title
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет время до первого байта, общее время и пик памяти потоковой '
+        'выгрузки произведений на таблице заданного размера. Все записи '
+        'откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument(
+            '--format', choices=('ndjson', 'json'), default='ndjson',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['rows'])
+            admin = User.objects.create(
+                username='bench_export', email='bench_export@yamdb.ru',
+                role=User.ADMIN,
+            )
+            client = APIClient()
+            client.force_authenticate(admin)
+            url = reverse('export-titles') + f'?format={options["format"]}'
+            first_byte, total, size = self.read(client.get(url))
+            # tracemalloc сильно замедляет интерпретатор, поэтому память
+            # измеряется отдельным проходом.
+            tracemalloc.start()
+            self.read(client.get(url))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stdout.write(
+                f'{options["rows"]} строк, {size / 2 ** 20:.1f} МиБ: '
+                f'первый байт {first_byte * 1000:.1f} мс, всего '
+                f'{total:.1f} с ({options["rows"] / total:.0f} строк/с), '
+                f'пик памяти {peak / 2 ** 20:.1f} МиБ'
+            )
+            transaction.set_rollback(True)
+
+    def read(self, response):
+        started = time.perf_counter()
+        chunks = iter(response.streaming_content)
+        size = len(next(chunks))
+        first_byte = time.perf_counter() - started
+        for chunk in chunks:
+            size += len(chunk)
+        return first_byte, time.perf_counter() - started, size
+
+    def seed(self, count, batch_size=10_000):
+        category = Category.objects.create(
+            name='Бенчмарк', slug='bench-export'
+        )
+        for start in range(0, count, batch_size):
+            Title.objects.bulk_create(
+                Title(name=f'Выгрузка {i}', year=2000, category=category)
+                for i in range(start, min(start + batch_size, count))
+            )
@@ -0,0 +1,80 @@
+import random
+import time
+
+from api.throttling import take_tokens
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет цену ограничителя частоты: время одной проверки корзин '
+        'и число запросов к БД на запрос, а также регистрацию с '
+        'ограничителем и без него. Все записи откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=5000)
+        parser.add_argument(
+            '--keys', type=int, default=1000,
+            help='Число разных адресов, по которым распределены проверки.',
+        )
+        parser.add_argument('--requests', type=int, default=300)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.bench_checks(options['checks'], options['keys'])
+            transaction.set_rollback(True)
+        results = {}
+        # Первый проход прогревает кэши и не учитывается.
+        for enabled in (False, False, True):
+            with transaction.atomic(), override_settings(
+                RATE_LIMIT_ENABLED=enabled,
+                RATE_LIMITS={'signup': {'ip': '1000000/h'}},
+            ):
+                results[enabled] = self.bench_signup(options['requests'])
+                transaction.set_rollback(True)
+        overhead = (results[True] - results[False]) * 1000
+        self.stdout.write(
+            f'Регистрация: {results[False] * 1000:.2f} мс без ограничителя, '
+            f'{results[True] * 1000:.2f} мс с ним '
+            f'({overhead:+.2f} мс на запрос)'
+        )
+
+    def bench_checks(self, checks, keys):
+        rng = random.Random(0)
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(checks):
+                ident = rng.randrange(keys)
+                started = time.perf_counter()
+                take_tokens([
+                    (f'bench:ip:{ident}', (100, 1.0)),
+                    (f'bench:user:{ident}', (50, 1.0)),
+                ])
+                timings.append(time.perf_counter() - started)
+        timings.sort()
+        self.stdout.write(
+            f'Проверка двух корзин: p50 {percentile(timings, 0.5) * 1e6:.0f} '
+            f'мкс, p99 {percentile(timings, 0.99) * 1e6:.0f} мкс, '
+            f'{len(queries) / checks:g} запрос(а) к БД на проверку'
+        )
+
+    def bench_signup(self, requests):
+        client = Client()
+        url = reverse('signup')
+        started = time.perf_counter()
+        for number in range(requests):
+            response = client.post(url, {
+                'username': f'bench_rl_{number}',
+                'email': f'bench_rl_{number}@yamdb.ru',
+            })
+            assert response.status_code == 200, response.content
+        return (time.perf_counter() - started) / requests
@@ -0,0 +1,81 @@
+import random
+import string
+import time
+
+from api.search import SearchBackend
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from reviews.management.commands.seed_data import WORDS
+from reviews.models import Category, Title
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает задержку поиска произведений через индекс и через '
+        'icontains на каталогах разного размера. Все записи откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+',
+            default=[10_000, 100_000, 1_000_000],
+        )
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        backend = SearchBackend()
+        with transaction.atomic():
+            category = Category.objects.create(
+                name='Бенчмарк', slug='bench-search'
+            )
+            created = 0
+            tokens = []
+            for size in sorted(options['sizes']):
+                tokens.extend(self.seed(category, size - created, rng))
+                created = size
+                # Ищется фрагмент названия конкретного произведения.
+                queries = [
+                    rng.choice(tokens)[1:6]
+                    for _ in range(options['queries'])
+                ]
+                indexed = self.measure(queries, lambda term: (
+                    backend.search(Title.objects.all(), 'name', [term])
+                ))
+                plain = self.measure(queries, lambda term: (
+                    Title.objects.filter(name__icontains=term)
+                ))
+                self.stdout.write(
+                    f'{size:>9} произведений: индекс {indexed:7.2f} мс, '
+                    f'icontains {plain:7.2f} мс на запрос'
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, category, count, rng, batch_size=10_000):
+        tokens = []
+        while count > 0:
+            batch = [
+                ''.join(rng.choices(string.ascii_lowercase, k=8))
+                for _ in range(min(batch_size, count))
+            ]
+            Title.objects.bulk_create(
+                Title(
+                    name=' '.join(rng.sample(WORDS, 2) + [token]),
+                    year=rng.randint(1900, 2022),
+                    category=category,
+                )
+                for token in batch
+            )
+            tokens.extend(batch)
+            count -= len(batch)
+        return tokens
+
+    def measure(self, queries, build):
+        # Как в эндпоинте списка: COUNT для пагинации и первая страница.
+        started = time.perf_counter()
+        for term in queries:
+            queryset = build(term)
+            queryset.count()
+            list(queryset.values_list('pk', flat=True)[:5])
+        return (time.perf_counter() - started) * 1000 / len(queries)
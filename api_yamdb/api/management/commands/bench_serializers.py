@@ -0,0 +1,114 @@
+import time
+
+from api.rows import REVIEW_VALUES, TITLE_VALUES, review_rows, title_rows
+from api.serializers import ReviewSerializer, TitleGETSerializer
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from reviews.models import Category, Genre, GenreTitle, Review, Title
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость сериализаторов и быстрого списка из values() '
+        'для произведений и ревью на страницах разного размера. Выборка и '
+        'рендеринг JSON входят в замер. Все записи откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-sizes', type=int, nargs='+', default=[5, 100, 1000],
+        )
+        parser.add_argument(
+            '--seconds', type=float, default=1.0,
+            help='Минимальная длительность замера одного варианта.',
+        )
+
+    def handle(self, *args, **options):
+        size = max(options['page_sizes'])
+        with transaction.atomic():
+            title = self.seed(size)
+            titles = Title.objects.select_related('category').prefetch_related(
+                Prefetch('genre', queryset=Genre.objects.order_by('slug'))
+            ).filter(category__slug='bench-serializers')
+            reviews = title.reviews.select_related('author')
+            for page_size in options['page_sizes']:
+                self.compare(
+                    'произведения', page_size, options['seconds'],
+                    lambda: TitleGETSerializer(
+                        titles[:page_size], many=True
+                    ).data,
+                    lambda: title_rows(
+                        titles.prefetch_related(None).values(
+                            *TITLE_VALUES
+                        )[:page_size]
+                    ),
+                )
+                self.compare(
+                    'ревью', page_size, options['seconds'],
+                    lambda: ReviewSerializer(
+                        reviews[:page_size], many=True
+                    ).data,
+                    lambda: review_rows(
+                        reviews.values(*REVIEW_VALUES)[:page_size]
+                    ),
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, size):
+        category = Category.objects.create(
+            name='Бенчмарк', slug='bench-serializers'
+        )
+        Genre.objects.bulk_create(
+            Genre(name=f'Бенчмарк {i}', slug=f'bench-serializers-{i}')
+            for i in range(3)
+        )
+        genres = list(
+            Genre.objects.filter(slug__startswith='bench-serializers-')
+        )
+        Title.objects.bulk_create(
+            Title(name=f'Произведение {i}', year=2000, category=category,
+                  description='Описание')
+            for i in range(size)
+        )
+        titles = list(Title.objects.filter(category=category))
+        GenreTitle.objects.bulk_create(
+            GenreTitle(title=title, genre=genre)
+            for title in titles for genre in genres
+        )
+        User.objects.bulk_create(
+            User(username=f'bench_serializers{i}',
+                 email=f'bench_serializers{i}@yamdb.ru')
+            for i in range(size)
+        )
+        authors = User.objects.filter(
+            username__startswith='bench_serializers'
+        )
+        Review.objects.bulk_create(
+            Review(title=titles[0], author=author, text='Текст', score=5)
+            for author in authors
+        )
+        return titles[0]
+
+    def compare(self, label, page_size, seconds, serializer, values):
+        renderer = JSONRenderer()
+        slow = self.measure(lambda: renderer.render(serializer()), seconds)
+        fast = self.measure(lambda: renderer.render(values()), seconds)
+        self.stdout.write(
+            f'{label:>12}, страница {page_size:>5}: сериализатор '
+            f'{slow * page_size:>10.0f} объектов/с, values() '
+            f'{fast * page_size:>10.0f} объектов/с (x{fast / slow:.1f})'
+        )
+
+    def measure(self, render, seconds):
+        """Возвращает число страниц в секунду."""
+        pages = 0
+        started = time.perf_counter()
+        while True:
+            render()
+            pages += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= seconds:
+                return pages / elapsed
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность /auth/signup/ при отправке '
+        'письма в запросе и при постановке в очередь. Все записи '
+        'откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument(
+            '--email-backend', default=None,
+            help='Почтовый бэкенд для режима inline, по умолчанию '
+                 'settings.EMAIL_BACKEND.',
+        )
+
+    def handle(self, *args, **options):
+        backend = options['email_backend']
+        overrides = {'EMAIL_BACKEND': backend} if backend else {}
+        results = {}
+        for mode in ('inline', 'queue'):
+            with override_settings(EMAIL_DELIVERY=mode,
+                                   RATE_LIMIT_ENABLED=False, **overrides):
+                results[mode] = self.run(mode, options['requests'])
+            self.stdout.write(
+                f'{mode}: {results[mode]:.1f} регистраций/с'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Очередь быстрее в {results["queue"] / results["inline"]:.2f} '
+            f'раза'
+        ))
+
+    def run(self, mode, requests):
+        client = Client()
+        url = reverse('signup')
+        with transaction.atomic():
+            started = time.perf_counter()
+            for number in range(requests):
+                response = client.post(url, {
+                    'username': f'bench_{mode}_{number}',
+                    'email': f'bench_{mode}_{number}@yamdb.ru',
+                })
+                assert response.status_code == 200, response.content
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return requests / elapsed
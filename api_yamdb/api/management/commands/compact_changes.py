@@ -0,0 +1,35 @@
+from api.models import ChangeEvent
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет события ленты изменений старше CHANGE_FEED_RETENTION. '
+        'Последнее событие каждого произведения остаётся: по нему лента '
+        'отличает клиента с устаревшим курсором (ответ 410) от клиента, '
+        'у которого нет новых событий.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        newest = ChangeEvent.objects.filter(
+            title_id=OuterRef('title_id')
+        ).order_by('-seq').values('seq')[:1]
+        expired = ChangeEvent.objects.filter(
+            created__lt=timezone.now() - settings.CHANGE_FEED_RETENTION,
+            seq__lt=Subquery(newest),
+        )
+        deleted = 0
+        while True:
+            batch = list(expired.values_list('pk', flat=True)[
+                :options['batch_size']
+            ])
+            if not batch:
+                break
+            deleted += ChangeEvent.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(f'Удалено событий: {deleted}')
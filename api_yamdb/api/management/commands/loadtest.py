@@ -0,0 +1,313 @@
+import json
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from rest_framework_simplejwt.tokens import AccessToken
+from reviews.management.commands.seed_data import SEED_PREFIX
+from reviews.models import Comment, Genre, Review, Title
+from users.models import User
+
+# Имя, вес в смеси, нужен ли токен администратора/пользователя.
+ENDPOINTS = (
+    ('titles-list', 20, None),
+    ('titles-filter', 5, None),
+    ('titles-search', 5, None),
+    ('titles-detail', 15, None),
+    ('reviews-list', 15, None),
+    ('reviews-detail', 5, None),
+    ('comments-list', 10, None),
+    ('genres-list', 4, None),
+    ('categories-list', 4, None),
+    ('users-me', 5, 'user'),
+    ('users-list', 2, 'admin'),
+    ('comments-create', 3, 'user'),
+    ('signup', 1, None),
+)
+# Процесс сервера для --server: синхронный gunicorn как в Dockerfile и
+# gunicorn с воркером uvicorn для asgi.py.
+SERVER_COMMANDS = {
+    'wsgi': ['gunicorn', 'api_yamdb.wsgi:application'],
+    'asgi': ['gunicorn', 'api_yamdb.asgi:application',
+             '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест API: смесь запросов к эндпоинтам api/ и users/ '
+        'от нескольких параллельных клиентов. Без --url поднимает '
+        'локальный сервер: многопоточный WSGI в процессе команды или '
+        'gunicorn (--server wsgi|asgi). Данные берутся из seed_data. '
+        'Результат - JSON с p50/p95/p99 и запросами в секунду по каждому '
+        'эндпоинту.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', help='Адрес уже запущенного сервера, например '
+                          'http://127.0.0.1:8000.',
+        )
+        parser.add_argument(
+            '--server', choices=('threaded', 'wsgi', 'asgi'),
+            default='threaded',
+            help='Локальный сервер, если не задан --url.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число процессов gunicorn для --server wsgi|asgi.',
+        )
+        parser.add_argument('--clients', type=int, default=16)
+        parser.add_argument(
+            '--duration', type=float, default=30.0,
+            help='Длительность замера в секундах.',
+        )
+        parser.add_argument(
+            '--warmup', type=float, default=2.0,
+            help='Секунды прогрева, не входящие в результат.',
+        )
+        parser.add_argument('--output', help='Файл для JSON-результата.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.load_targets()
+        server = process = None
+        base_url = options['url']
+        if base_url is None and options['server'] == 'threaded':
+            server = ThreadedWSGIServer(
+                ('127.0.0.1', 0), QuietRequestHandler, allow_reuse_address=True
+            )
+            server.set_app(get_wsgi_application())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            host, port = server.server_address[:2]
+            base_url = f'http://{host}:{port}'
+        elif base_url is None:
+            process, base_url = self.start_gunicorn(options['server'],
+                                                    options['workers'])
+        self.base_url = base_url.rstrip('/')
+        # Соединение команды не должно держать блокировки во время теста.
+        connections.close_all()
+        try:
+            self.run_clients(options['clients'], options['warmup'],
+                             options['seed'])
+            started = time.monotonic()
+            samples = self.run_clients(options['clients'],
+                                       options['duration'], options['seed'])
+            elapsed = time.monotonic() - started
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            if process is not None:
+                process.terminate()
+                process.wait()
+        report = self.build_report(samples, elapsed, options)
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+        self.stdout.write(text)
+
+    def start_gunicorn(self, server, workers, timeout=30):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        command, *arguments = SERVER_COMMANDS[server]
+        process = subprocess.Popen(
+            [sys.executable, '-m', command, *arguments,
+             '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+             '--log-level', 'warning'],
+            cwd=settings.BASE_DIR,
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'gunicorn завершился с кодом '
+                                   f'{process.returncode}.')
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+            except OSError:
+                time.sleep(0.2)
+                continue
+            return process, f'http://127.0.0.1:{port}'
+        process.terminate()
+        raise CommandError('gunicorn не начал принимать соединения.')
+
+    def load_targets(self):
+        users = list(User.objects.filter(
+            username__startswith=f'{SEED_PREFIX}_user'
+        ).values_list('pk', flat=True)[:200])
+        admin = User.objects.filter(username=f'{SEED_PREFIX}_admin').first()
+        if not users or admin is None:
+            raise CommandError('Сначала выполните manage.py seed_data.')
+        self.user_tokens = [
+            str(AccessToken.for_user(User(pk=pk))) for pk in users
+        ]
+        self.admin_token = str(AccessToken.for_user(admin))
+        self.titles = list(Title.objects.values_list('pk', flat=True))
+        self.reviews = list(
+            Review.objects.values_list('pk', 'title_id')[:50000]
+        )
+        self.comment_reviews = list(
+            Comment.objects.values_list('review_id', 'review__title_id')
+            .distinct()[:50000]
+        ) or self.reviews
+        self.genres = list(Genre.objects.values_list('slug', flat=True))
+        self.words = [
+            name.split()[0] for name in
+            Title.objects.values_list('name', flat=True)[:500]
+        ]
+
+    def build_request(self, name, rng):
+        """Возвращает метод, путь, тело и роль токена для запроса."""
+        title = rng.choice(self.titles)
+        review, review_title = rng.choice(self.reviews)
+        commented, commented_title = rng.choice(self.comment_reviews)
+        comments = (f'/api/v1/titles/{commented_title}/reviews/'
+                    f'{commented}/comments/')
+        return {
+            'titles-list': ('GET', '/api/v1/titles/?' + urlencode(
+                {'page': rng.randint(1, 20)}
+            ), None),
+            'titles-filter': ('GET', '/api/v1/titles/?' + urlencode(
+                {'genre': rng.choice(self.genres)}
+            ), None),
+            'titles-search': ('GET', '/api/v1/titles/?' + urlencode(
+                {'name': rng.choice(self.words)}
+            ), None),
+            'titles-detail': ('GET', f'/api/v1/titles/{title}/', None),
+            'reviews-list': (
+                'GET', f'/api/v1/titles/{review_title}/reviews/', None
+            ),
+            'reviews-detail': (
+                'GET', f'/api/v1/titles/{review_title}/reviews/{review}/',
+                None,
+            ),
+            'comments-list': ('GET', comments, None),
+            'genres-list': ('GET', '/api/v1/genres/', None),
+            'categories-list': ('GET', '/api/v1/categories/', None),
+            'users-me': ('GET', '/api/v1/users/me/', None),
+            'users-list': ('GET', '/api/v1/users/', None),
+            'comments-create': (
+                'POST', comments, {'text': 'Комментарий нагрузочного теста.'}
+            ),
+            'signup': ('POST', '/api/v1/auth/signup/', {
+                'username': f'load{rng.getrandbits(48):x}',
+                'email': f'load{rng.getrandbits(48):x}@yamdb.ru',
+            }),
+        }[name]
+
+    def send(self, method, path, data, role, rng):
+        headers = {'Accept': 'application/json'}
+        if role == 'admin':
+            headers['Authorization'] = f'Bearer {self.admin_token}'
+        elif role == 'user':
+            token = rng.choice(self.user_tokens)
+            headers['Authorization'] = f'Bearer {token}'
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        request = Request(self.base_url + path, data=body, headers=headers,
+                          method=method)
+        try:
+            with urlopen(request, timeout=30) as response:
+                response.read()
+                return response.status
+        except HTTPError as error:
+            error.read()
+            return error.code
+        except URLError:
+            return 0
+
+    def client(self, deadline, seed):
+        rng = random.Random(seed)
+        names = [name for name, _, _ in ENDPOINTS]
+        weights = [weight for _, weight, _ in ENDPOINTS]
+        roles = {name: role for name, _, role in ENDPOINTS}
+        samples = []
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            method, path, data = self.build_request(name, rng)
+            started = time.perf_counter()
+            status = self.send(method, path, data, roles[name], rng)
+            samples.append((name, time.perf_counter() - started, status))
+        return samples
+
+    def run_clients(self, clients, duration, seed):
+        deadline = time.monotonic() + duration
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            futures = [
+                executor.submit(self.client, deadline, seed * 1000 + number)
+                for number in range(clients)
+            ]
+            return [
+                sample for future in futures for sample in future.result()
+            ]
+
+    def build_report(self, samples, elapsed, options):
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        statuses = defaultdict(lambda: defaultdict(int))
+        for name, latency, status in samples:
+            latencies[name].append(latency * 1000)
+            statuses[name][str(status)] += 1
+            if not 200 <= status < 400:
+                errors[name] += 1
+        endpoints = {}
+        for name, _, _ in ENDPOINTS:
+            values = sorted(latencies[name])
+            endpoints[name] = self.summary(values, errors[name], elapsed)
+            endpoints[name]['statuses'] = dict(statuses[name])
+        return {
+            'base_url': self.base_url,
+            'server': None if options['url'] else options['server'],
+            'workers': options['workers'],
+            'clients': options['clients'],
+            'duration_s': round(elapsed, 3),
+            'total': self.summary(
+                sorted(latency * 1000 for _, latency, _ in samples),
+                sum(errors.values()), elapsed,
+            ),
+            'endpoints': endpoints,
+        }
+
+    def summary(self, values, errors, elapsed):
+        def rounded(value):
+            return None if value is None else round(value, 2)
+
+        return {
+            'requests': len(values),
+            'errors': errors,
+            'rps': round(len(values) / elapsed, 2) if elapsed else None,
+            'p50_ms': rounded(percentile(values, 0.50)),
+            'p95_ms': rounded(percentile(values, 0.95)),
+            'p99_ms': rounded(percentile(values, 0.99)),
+        }
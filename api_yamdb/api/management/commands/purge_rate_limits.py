@@ -0,0 +1,18 @@
+import time
+
+from api.models import RateLimitBucket
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет корзины ограничителя частоты, которые уже полностью '
+        'пополнились: для них новая корзина ничем не отличается от старой.'
+    )
+
+    def handle(self, *args, **options):
+        deleted, _ = RateLimitBucket.objects.filter(
+            updated__lt=time.time() - F('capacity') / F('rate')
+        ).delete()
+        self.stdout.write(f'Удалено корзин: {deleted}')
@@ -0,0 +1,338 @@
+import asyncio
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework.response import Response
+
+from .slow_queries import slow_queries
+from .workers import worker_files
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+COUNTERS = (
+    ('requests_total', 'Число обработанных запросов.'),
+    ('db_queries_total', 'Число SQL-запросов.'),
+    ('db_seconds_total', 'Время выполнения SQL-запросов, с.'),
+    ('serializer_seconds_total', 'Время сериализации ответа, с.'),
+    ('response_bytes_total', 'Размер тел ответов, байт.'),
+)
+PREFIX = 'yamdb_'
+LABELS = ('view', 'action', 'method', 'status')
+
+current_request = contextvars.ContextVar('metrics_request', default=None)
+
+
+class RequestMetrics:
+    """Счётчики одного запроса, которые собирают обёртки БД и сериализатора."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+        self.serializer = None
+        self.view = 'unresolved'
+        self.action = ''
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: время каждого запроса к БД.
+        if self.explaining:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.db_seconds += duration
+            self.queries += 1
+        threshold = settings.SLOW_QUERY_THRESHOLD
+        if threshold is not None and duration >= threshold:
+            slow_queries.record(self, sql, params, many, context, duration)
+        return result
+
+
+@contextmanager
+def serializer_timer(name=None):
+    """Засчитывает время блока как сериализацию текущего запроса.
+
+    Вложенные вызовы не учитываются повторно; name внешнего вызова
+    попадает в журнал медленных запросов.
+    """
+    metrics = current_request.get()
+    if metrics is None:
+        yield
+        return
+    if not metrics.serializer_depth:
+        metrics.serializer = name
+    metrics.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_depth -= 1
+        if not metrics.serializer_depth:
+            metrics.serializer_seconds += time.perf_counter() - started
+            metrics.serializer = None
+
+
+def format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def sample_order(sample):
+    # Корзины гистограммы по возрастанию границы, затем _sum и _count.
+    name, labels, _ = sample
+    suffixes = ('_bucket', '_sum', '_count')
+    rank = next(
+        (i for i, suffix in enumerate(suffixes) if name.endswith(suffix)), 0
+    )
+    bound = float(labels[len(LABELS)]) if len(labels) > len(LABELS) else 0
+    return labels[:len(LABELS)], rank, bound
+
+
+class Registry:
+    """Накопитель метрик процесса с выгрузкой в файл.
+
+    Каждый процесс (воркер gunicorn) держит счётчики в памяти и не чаще
+    раза в METRICS_FLUSH_INTERVAL секунд атомарно переписывает свой файл
+    в METRICS_DIR. Эндпоинт метрик суммирует файлы всех процессов, а
+    файлы завершившихся удаляет: их счётчики пропадают, как при
+    перезапуске процесса. Без METRICS_DIR видны только метрики текущего
+    процесса.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.values = defaultdict(float)
+        self.last_flush = 0.0
+
+    @property
+    def directory(self):
+        return settings.METRICS_DIR
+
+    def path(self, pid):
+        return os.path.join(self.directory, f'metrics_{pid}.json')
+
+    def observe(self, labels, metrics, duration, size):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Воркер унаследовал счётчики родителя при fork.
+                self.reset()
+            values = self.values
+            for name, value in (
+                ('requests_total', 1),
+                ('db_queries_total', metrics.queries),
+                ('db_seconds_total', metrics.db_seconds),
+                ('serializer_seconds_total', metrics.serializer_seconds),
+                ('response_bytes_total', size),
+            ):
+                values[(name, labels)] += value
+            for bound in DURATION_BUCKETS:
+                if duration <= bound:
+                    values[('request_duration_seconds_bucket',
+                            labels + (str(bound),))] += 1
+            values[('request_duration_seconds_bucket',
+                    labels + ('+Inf',))] += 1
+            values[('request_duration_seconds_sum', labels)] += duration
+            values[('request_duration_seconds_count', labels)] += 1
+            now = time.monotonic()
+            if self.directory and (
+                    now - self.last_flush >= settings.METRICS_FLUSH_INTERVAL):
+                self.last_flush = now
+                self.flush_locked()
+
+    def flush(self):
+        if self.directory:
+            with self.lock:
+                self.flush_locked()
+
+    def flush_locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(self.pid)
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump([
+                [name, list(labels), value]
+                for (name, labels), value in self.values.items()
+            ], f)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Сумма счётчиков этого процесса и файлов остальных."""
+        with self.lock:
+            total = defaultdict(float, self.values)
+            own = self.pid
+        if not self.directory:
+            return total
+        for pid, path in worker_files(self.directory, 'metrics'):
+            if pid == own:
+                continue
+            try:
+                with open(path) as f:
+                    rows = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in rows:
+                total[(name, tuple(labels))] += value
+        return total
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus 0.0.4."""
+        values = self.collect()
+        lines = []
+        groups = [
+            (name, 'counter', help_text) for name, help_text in COUNTERS
+        ] + [('request_duration_seconds', 'histogram',
+              'Длительность обработки запроса, с.')]
+        for group, kind, help_text in groups:
+            lines.append(f'# HELP {PREFIX}{group} {help_text}')
+            lines.append(f'# TYPE {PREFIX}{group} {kind}')
+            samples = [
+                (name, labels, value)
+                for (name, labels), value in values.items()
+                if name == group or (
+                    kind == 'histogram' and name.startswith(group + '_')
+                )
+            ]
+            for name, labels, value in sorted(samples, key=sample_order):
+                names = LABELS + (('le',) if name.endswith('_bucket') else ())
+                rendered = ','.join(
+                    '{}="{}"'.format(label, str(text).replace('"', '\\"'))
+                    for label, text in zip(names, labels)
+                )
+                lines.append(
+                    f'{PREFIX}{name}{{{rendered}}} {format_value(value)}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper всех соединений: запрос засчитывается текущему.
+
+    Счётчики запроса берутся из current_request. Переменная контекста
+    переходит вместе с контекстом в потоки sync_to_async, поэтому
+    запросы синхронных представлений под ASGI и представлений из
+    api.async_views учитываются так же, как под WSGI.
+    """
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Сигнал приходит при каждом переподключении того же объекта.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsMiddleware:
+    """Измеряет запрос: длительность, SQL, сериализацию и размер ответа.
+
+    Метки - класс представления DRF и его действие (list, retrieve, ...).
+    Под ASGI работает асинхронно; SQL засчитывается в record_query, в
+    каком бы потоке ни выполнялось представление.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Признак, по которому Django считает middleware асинхронным.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.acall(request)
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.observe(request, response, metrics, started)
+        return response
+
+    async def acall(self, request):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.observe(request, response, metrics, started)
+        return response
+
+    def observe(self, request, response, metrics, started):
+        duration = time.perf_counter() - started
+        size = 0 if response.streaming else len(response.content)
+        labels = (metrics.view, metrics.action, request.method,
+                  str(response.status_code))
+        registry.observe(labels, metrics, duration, size)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current_request.get()
+        if metrics is None:
+            return
+        view = getattr(view_func, 'cls', None)
+        metrics.view = getattr(view, '__name__', None) or getattr(
+            view_func, '__name__', 'unknown'
+        )
+        actions = getattr(view_func, 'actions', None) or {}
+        metrics.action = actions.get(
+            request.method.lower(), request.method.lower()
+        )
+
+
+class TimedListMixin:
+    """list, в котором serializer.data засчитывается как сериализация.
+
+    Повторяет ListModelMixin DRF; время чтения .data корневого
+    сериализатора попадает в serializer_seconds_total, вложенные
+    сериализаторы вызывают только to_representation.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                self.serialize(page, many=True)
+            )
+        return Response(self.serialize(queryset, many=True))
+
+    def serialize(self, instance, many=False):
+        serializer = self.get_serializer(instance, many=many)
+        with serializer_timer(self.get_serializer_class().__name__):
+            return serializer.data
+
+
+class TimedRetrieveMixin(TimedListMixin):
+    """TimedListMixin и retrieve с тем же замером сериализации."""
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.serialize(self.get_object()))
@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 13:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Ключ')),
+                ('tokens', models.FloatField(verbose_name='Доступно токенов')),
+                ('capacity', models.FloatField(verbose_name='Ёмкость')),
+                ('rate', models.FloatField(verbose_name='Пополнение, токенов в секунду')),
+                ('updated', models.FloatField(verbose_name='Обновлено, unix-время')),
+                ('allowed', models.BooleanField(default=True, verbose_name='Последний запрос пропущен')),
+            ],
+            options={
+                'verbose_name': 'Корзина ограничителя',
+                'verbose_name_plural': 'Корзины ограничителя',
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2 on 2026-10-18 14:07
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_rate_limit_bucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title_id', models.IntegerField(verbose_name='id произведения')),
+                ('seq', models.BigIntegerField(verbose_name='Номер в ленте произведения')),
+                ('kind', models.CharField(choices=[('review', 'Ревью'), ('comment', 'Комментарий')], max_length=10, verbose_name='Объект')),
+                ('action', models.CharField(choices=[('created', 'Создание'), ('updated', 'Изменение'), ('deleted', 'Удаление')], max_length=10, verbose_name='Действие')),
+                ('object_id', models.IntegerField(verbose_name='id объекта')),
+                ('review_id', models.IntegerField(blank=True, null=True, verbose_name='id ревью комментария')),
+                ('data', models.JSONField(blank=True, null=True, verbose_name='Объект в формате API')),
+                ('created', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Время')),
+            ],
+            options={
+                'verbose_name': 'Событие ленты изменений',
+                'verbose_name_plural': 'События ленты изменений',
+            },
+        ),
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('title', models.IntegerField(primary_key=True, serialize=False, verbose_name='id произведения')),
+                ('last', models.BigIntegerField(verbose_name='Последний номер')),
+            ],
+            options={
+                'verbose_name': 'Счётчик ленты изменений',
+                'verbose_name_plural': 'Счётчики ленты изменений',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='changeevent',
+            constraint=models.UniqueConstraint(fields=('title_id', 'seq'), name='change_event_title_seq'),
+        ),
+    ]
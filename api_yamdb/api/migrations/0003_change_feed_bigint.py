@@ -0,0 +1,33 @@
+# Generated by Django 3.2 on 2026-10-18 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_change_feed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='changeevent',
+            name='object_id',
+            field=models.BigIntegerField(verbose_name='id объекта'),
+        ),
+        migrations.AlterField(
+            model_name='changeevent',
+            name='review_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='id ревью комментария'),
+        ),
+        migrations.AlterField(
+            model_name='changeevent',
+            name='title_id',
+            field=models.BigIntegerField(verbose_name='id произведения'),
+        ),
+        migrations.AlterField(
+            model_name='changesequence',
+            name='title',
+            field=models.BigIntegerField(primary_key=True, serialize=False, verbose_name='id произведения'),
+        ),
+    ]
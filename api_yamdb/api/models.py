@@ -0,0 +1,132 @@
+from django.db import models
+from django.utils import timezone
+
+
+class RateLimitBucket(models.Model):
+    """Корзина токенов ограничителя частоты запросов.
+
+    Пишется и читается одним запросом в api.throttling, поэтому общее
+    состояние видят все процессы.
+    """
+
+    key = models.CharField(
+        max_length=255,
+        primary_key=True,
+        verbose_name='Ключ',
+    )
+    tokens = models.FloatField(
+        verbose_name='Доступно токенов',
+    )
+    capacity = models.FloatField(
+        verbose_name='Ёмкость',
+    )
+    rate = models.FloatField(
+        verbose_name='Пополнение, токенов в секунду',
+    )
+    updated = models.FloatField(
+        verbose_name='Обновлено, unix-время',
+    )
+    allowed = models.BooleanField(
+        default=True,
+        verbose_name='Последний запрос пропущен',
+    )
+
+    class Meta:
+        verbose_name = 'Корзина ограничителя'
+        verbose_name_plural = 'Корзины ограничителя'
+
+    def __str__(self):
+        return f'{self.key}: {self.tokens:.2f}/{self.capacity:g}'
+
+
+class ChangeSequence(models.Model):
+    """Последний номер события в ленте изменений произведения.
+
+    Номер берёт api.changes одним upsert в транзакции записи. Блокировка
+    строки до фиксации выстраивает записи по произведению в очередь,
+    поэтому номера в ленте идут без пропусков и в порядке фиксации.
+    """
+
+    title = models.BigIntegerField(
+        primary_key=True,
+        verbose_name='id произведения',
+    )
+    last = models.BigIntegerField(
+        verbose_name='Последний номер',
+    )
+
+    class Meta:
+        verbose_name = 'Счётчик ленты изменений'
+        verbose_name_plural = 'Счётчики ленты изменений'
+
+    def __str__(self):
+        return f'{self.title}: {self.last}'
+
+
+class ChangeEvent(models.Model):
+    """Событие ленты изменений ревью и комментариев произведения.
+
+    Пишется в той же транзакции, что и изменение. id произведения и ревью
+    хранятся числами, а не внешними ключами: события удалённых объектов
+    остаются в ленте до очистки manage.py compact_changes.
+    """
+
+    REVIEW = 'review'
+    COMMENT = 'comment'
+    KINDS = [
+        (REVIEW, 'Ревью'),
+        (COMMENT, 'Комментарий'),
+    ]
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTIONS = [
+        (CREATED, 'Создание'),
+        (UPDATED, 'Изменение'),
+        (DELETED, 'Удаление'),
+    ]
+    title_id = models.BigIntegerField(
+        verbose_name='id произведения',
+    )
+    seq = models.BigIntegerField(
+        verbose_name='Номер в ленте произведения',
+    )
+    kind = models.CharField(
+        max_length=10,
+        choices=KINDS,
+        verbose_name='Объект',
+    )
+    action = models.CharField(
+        max_length=10,
+        choices=ACTIONS,
+        verbose_name='Действие',
+    )
+    object_id = models.BigIntegerField(
+        verbose_name='id объекта',
+    )
+    review_id = models.BigIntegerField(
+        blank=True,
+        null=True,
+        verbose_name='id ревью комментария',
+    )
+    data = models.JSONField(
+        blank=True,
+        null=True,
+        verbose_name='Объект в формате API',
+    )
+    created = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name='Время',
+    )
+
+    class Meta:
+        verbose_name = 'Событие ленты изменений'
+        verbose_name_plural = 'События ленты изменений'
+        constraints = [
+            models.UniqueConstraint(fields=['title_id', 'seq'],
+                                    name='change_event_title_seq'),
+        ]
+
+    def __str__(self):
+        return f'{self.title_id}#{self.seq} {self.kind} {self.action}'
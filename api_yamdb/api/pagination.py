@@ -0,0 +1,220 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Курсорная пагинация по составному ключу сортировки.
+
+    Курсор хранит значения ключа крайнего элемента страницы, поэтому
+    следующая страница выбирается условием по индексу, без OFFSET и COUNT.
+    """
+    ordering = ('-id',)
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        position, self.reverse = self.decode_cursor(request)
+        ordering = self.get_ordering()
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(
+                ordering, position
+            ))
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.build_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.build_link(self.page[0], reverse=True)
+
+    def get_ordering(self):
+        if not self.reverse:
+            return self.ordering
+        return tuple(
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        )
+
+    def get_fields(self):
+        return [
+            self.model._meta.get_field(name.lstrip('-'))
+            for name in self.ordering
+        ]
+
+    def get_position_filter(self, ordering, position):
+        """Строит условие «строго после позиции» для ключа сортировки."""
+        conditions = []
+        for index, name in enumerate(ordering):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            equal = {
+                previous.lstrip('-'): position[number]
+                for number, previous in enumerate(ordering[:index])
+            }
+            equal[f"{name.lstrip('-')}__{lookup}"] = position[index]
+            conditions.append(Q(**equal))
+        # Нестрогая граница по первому столбцу даёт СУБД диапазон индекса.
+        first = ordering[0]
+        lookup = 'lte' if first.startswith('-') else 'gte'
+        bound = Q(**{f"{first.lstrip('-')}__{lookup}": position[0]})
+        return bound & reduce(or_, conditions)
+
+    def build_link(self, item, reverse):
+        values = []
+        for field in self.get_fields():
+            if isinstance(item, dict):
+                value = item[field.attname]
+            else:
+                value = field.value_from_object(item)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(None if value is None else str(value))
+        payload = {'p': values}
+        if reverse:
+            payload['r'] = 1
+        cursor = urlsafe_b64encode(
+            json.dumps(payload, separators=(',', ':')).encode()
+        ).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            cursor,
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode()))
+            values = payload['p']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                field.to_python(value)
+                for field, value in zip(self.get_fields(), values)
+            ]
+            # Число вне диапазона столбца ломает запрос к СУБД. У SQLite
+            # валидаторов диапазона нет, поэтому 64 бита проверяются явно.
+            for field, value in zip(self.get_fields(), position):
+                field.run_validators(value)
+                if isinstance(value, int) and not (
+                        -2 ** 63 <= value < 2 ** 63):
+                    raise ValueError
+        except (BinasciiError, KeyError, TypeError, ValueError,
+                ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if any(value is None for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(payload.get('r'))
+
+
+class OptionalKeysetPagination(PageNumberPagination):
+    """Постраничная пагинация с переключением на курсорную.
+
+    Курсорный режим включается параметром ``?pagination=cursor`` или
+    наличием ``?cursor=``; ``keyset_by_default`` делает его режимом
+    эндпоинта по умолчанию, а ``?pagination=page`` возвращает номера страниц.
+    """
+    keyset_class = KeysetPagination
+    keyset_by_default = False
+    mode_query_param = 'pagination'
+
+    def use_keyset(self, request):
+        mode = request.query_params.get(self.mode_query_param)
+        if mode == 'cursor':
+            return True
+        if mode == 'page':
+            return False
+        return (
+            self.keyset_by_default
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_page_link(self, link):
+        # Номера страниц не переносят курсор из текущего запроса.
+        if link is None:
+            return None
+        return remove_query_param(link, self.keyset_class.cursor_query_param)
+
+    def get_next_link(self):
+        return self.get_page_link(super().get_next_link())
+
+    def get_previous_link(self):
+        return self.get_page_link(super().get_previous_link())
+
+
+class PubDateKeysetPagination(KeysetPagination):
+    ordering = ('-pub_date', '-id')
+
+
+class IdKeysetPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class PubDatePagination(OptionalKeysetPagination):
+    """Отзывы и комментарии: курсор по (pub_date, id), новые первыми."""
+    keyset_class = PubDateKeysetPagination
+
+
+class IdPagination(OptionalKeysetPagination):
+    """Произведения и пользователи: курсор по первичному ключу."""
+    keyset_class = IdKeysetPagination
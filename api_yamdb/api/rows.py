@@ -0,0 +1,120 @@
+from collections import OrderedDict, defaultdict
+
+from rest_framework import serializers
+from rest_framework.response import Response
+from reviews.models import GenreTitle
+
+from .metrics import serializer_timer
+from .sparse import EXPAND_QUERY_PARAM, FIELDS_QUERY_PARAM
+
+# Тот же формат дат, что у DateTimeField в ReviewSerializer.
+datetime_field = serializers.DateTimeField()
+
+TITLE_VALUES = (
+    'id', 'rating', 'name', 'year', 'description',
+    'category__name', 'category__slug',
+)
+REVIEW_VALUES = ('id', 'text', 'author__username', 'score', 'pub_date')
+COMMENT_VALUES = ('id', 'text', 'author__username', 'pub_date')
+
+
+def genres_by_title(title_ids=None, id_range=None):
+    """Жанры всех произведений страницы одним запросом, по слагу.
+
+    Для пачек подряд идущих id (выгрузка) вместо IN передаётся диапазон
+    id_range: такой запрос дешевле собрать, а СУБД читает индекс отрезком.
+    Сортировка в Python: ORDER BY по слагу заставил бы СУБД обходить
+    весь индекс жанров вместо поиска связей по произведениям.
+    """
+    genres = defaultdict(list)
+    links = GenreTitle.objects.all()
+    if id_range is not None:
+        first, last = id_range
+        links = links.filter(title_id__gte=first, title_id__lte=last)
+    else:
+        links = links.filter(title_id__in=title_ids)
+    links = links.values_list('title_id', 'genre__name', 'genre__slug')
+    for title_id, name, slug in sorted(links, key=lambda link: link[2]):
+        genres[title_id].append(OrderedDict(name=name, slug=slug))
+    return genres
+
+
+def title_rows(rows, genres=None):
+    """Произведения из строк values() в формате TitleGETSerializer."""
+    rows = list(rows)
+    if genres is None:
+        genres = genres_by_title([row['id'] for row in rows])
+    return [
+        OrderedDict((
+            ('id', row['id']),
+            ('rating', row['rating']),
+            ('genre', genres.get(row['id'], [])),
+            ('category', OrderedDict((
+                ('name', row['category__name']),
+                ('slug', row['category__slug']),
+            ))),
+            ('name', row['name']),
+            ('year', row['year']),
+            ('description', row['description']),
+        ))
+        for row in rows
+    ]
+
+
+def review_rows(rows):
+    """Ревью из строк values() в формате ReviewSerializer."""
+    to_representation = datetime_field.to_representation
+    return [
+        OrderedDict((
+            ('id', row['id']),
+            ('text', row['text']),
+            ('author', row['author__username']),
+            ('score', row['score']),
+            ('pub_date', to_representation(row['pub_date'])),
+        ))
+        for row in rows
+    ]
+
+
+def comment_rows(rows):
+    """Комментарии из строк values() в формате CommentSerializer."""
+    to_representation = datetime_field.to_representation
+    return [
+        OrderedDict((
+            ('id', row['id']),
+            ('text', row['text']),
+            ('author', row['author__username']),
+            ('pub_date', to_representation(row['pub_date'])),
+        ))
+        for row in rows
+    ]
+
+
+class ValuesListMixin:
+    """Быстрый список: словари из values() вместо полей сериализатора.
+
+    Используется, только если клиент не выбирал поля через ?fields= или
+    ?expand=; результат совпадает с выводом serializer_class байт в байт.
+    """
+    values_fields = ()
+    build_rows = None
+
+    def use_values(self, request):
+        return self.build_rows is not None and not (
+            FIELDS_QUERY_PARAM in request.query_params
+            or EXPAND_QUERY_PARAM in request.query_params
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_values(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.prefetch_related(None).values(*self.values_fields)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            with serializer_timer(self.build_rows.__name__):
+                data = self.build_rows(page)
+            return self.get_paginated_response(data)
+        with serializer_timer(self.build_rows.__name__):
+            data = self.build_rows(rows)
+        return Response(data)
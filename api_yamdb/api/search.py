@@ -0,0 +1,177 @@
+import logging
+
+from django.db import connections, transaction
+from django.db.models import FloatField, Func, Value
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+logger = logging.getLogger(__name__)
+
+# Триграммный поиск находит подстроки длиной от трёх символов,
+# более короткие запросы выполняются обычным icontains.
+MIN_TERM_LENGTH = 3
+
+# Столбцы с индексом поиска, который создают миграции reviews 0005 и
+# users 0003.
+SEARCH_COLUMNS = (
+    ('reviews_title', 'name'),
+    ('reviews_genre', 'name'),
+    ('reviews_category', 'name'),
+    ('users_user', 'username'),
+)
+
+_fts_tables = {}
+
+
+def fts_table(table, column):
+    return f'{table}_{column}_fts'
+
+
+def fts_triggers(quote, table, column):
+    """Имена и SQL триггеров, которые синхронизируют FTS5-таблицу."""
+    fts = fts_table(table, column)
+    table, column, name = quote(table), quote(column), quote(fts)
+    delete_old = (f"INSERT INTO {name}({name}, rowid, {column}) "
+                  f"VALUES ('delete', old.id, old.{column});")
+    insert_new = (f'INSERT INTO {name}(rowid, {column}) '
+                  f'VALUES (new.id, new.{column});')
+    return [
+        (f'{fts}_ai', f'CREATE TRIGGER {quote(f"{fts}_ai")} AFTER INSERT '
+                      f'ON {table} BEGIN {insert_new} END'),
+        (f'{fts}_ad', f'CREATE TRIGGER {quote(f"{fts}_ad")} AFTER DELETE '
+                      f'ON {table} BEGIN {delete_old} END'),
+        (f'{fts}_au', f'CREATE TRIGGER {quote(f"{fts}_au")} AFTER UPDATE '
+                      f'OF {column} ON {table} BEGIN {delete_old} '
+                      f'{insert_new} END'),
+    ]
+
+
+def ensure_fts_triggers(connection):
+    """Восстанавливает триггеры FTS5, потерянные при перестройке таблиц.
+
+    Изменения схемы SQLite выполняет копированием таблицы, и триггеры
+    старой таблицы удаляются вместе с ней. Недостающие триггеры
+    создаются заново, а индекс перестраивается по текущим строкам.
+    Вызывается после каждого migrate (api.signals).
+    """
+    if connection.vendor != 'sqlite':
+        return
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing = {row[0] for row in cursor.fetchall()}
+        for table, column in SEARCH_COLUMNS:
+            fts = fts_table(table, column)
+            if fts not in tables:
+                continue
+            missing = [
+                sql for name, sql in fts_triggers(quote, table, column)
+                if name not in existing
+            ]
+            if not missing:
+                continue
+            with transaction.atomic(using=connection.alias):
+                for sql in missing:
+                    cursor.execute(sql)
+                cursor.execute(f"INSERT INTO {quote(fts)}({quote(fts)}) "
+                               f"VALUES ('rebuild')")
+            logger.info('Триггеры поиска для %s.%s восстановлены.',
+                        table, column)
+
+
+class Similarity(Func):
+    function = 'SIMILARITY'
+    output_field = FloatField()
+
+
+class SearchBackend:
+    """Поиск подстрок по индексированному столбцу с ранжированием."""
+
+    def __init__(self, using='default'):
+        self.connection = connections[using]
+
+    def has_fts_table(self, table, column):
+        key = (self.connection.alias, table, column)
+        if key not in _fts_tables:
+            with self.connection.cursor() as cursor:
+                _fts_tables[key] = fts_table(table, column) in (
+                    self.connection.introspection.table_names(cursor)
+                )
+        return _fts_tables[key]
+
+    def has_trigram(self):
+        """Установлено ли расширение pg_trgm; ответ хранится в соединении.
+
+        Миграция reviews 0005 пропускает расширение, если у пользователя
+        БД нет прав на CREATE EXTENSION, и тогда similarity() недоступна.
+        """
+        if not hasattr(self.connection, 'yamdb_has_trigram'):
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+                )
+                self.connection.yamdb_has_trigram = (
+                    cursor.fetchone() is not None
+                )
+        return self.connection.yamdb_has_trigram
+
+    def search(self, queryset, field, terms, ranked=False):
+        if isinstance(terms, str):
+            terms = terms.split()
+        terms = [term for term in terms if term]
+        if not terms:
+            return queryset
+        model = queryset.model
+        table = model._meta.db_table
+        column = model._meta.get_field(field).column
+        short = [term for term in terms if len(term) < MIN_TERM_LENGTH]
+        indexed = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+        for term in short:
+            queryset = queryset.filter(**{f'{field}__icontains': term})
+        if self.connection.vendor == 'sqlite' and indexed and (
+                self.has_fts_table(table, column)):
+            return self.search_fts(queryset, table, column, indexed, ranked)
+        for term in indexed:
+            queryset = queryset.filter(**{f'{field}__icontains': term})
+        if (ranked and self.connection.vendor == 'postgresql'
+                and self.has_trigram()):
+            queryset = queryset.annotate(
+                search_rank=Similarity(field, Value(' '.join(terms)))
+            ).order_by('-search_rank', 'pk')
+        return queryset
+
+    def search_fts(self, queryset, table, column, terms, ranked):
+        quote = self.connection.ops.quote_name
+        fts = quote(fts_table(table, column))
+        match = ' AND '.join(
+            '"{}"'.format(term.replace('"', '""')) for term in terms
+        )
+        queryset = queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', [match]
+        ))
+        if not ranked:
+            return queryset
+        return queryset.annotate(search_rank=RawSQL(
+            f'SELECT rank FROM {fts} WHERE {fts} MATCH %s '
+            f'AND rowid = {quote(table)}.{quote("id")}',
+            [match],
+            output_field=FloatField(),
+        )).order_by('search_rank', 'pk')
+
+
+class IndexedSearchFilter(SearchFilter):
+    """SearchFilter, который ищет через индекс и сортирует по релевантности.
+
+    Используется первое поле из search_fields представления.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        terms = self.get_search_terms(request)
+        if not search_fields or not terms:
+            return queryset
+        field = search_fields[0].lstrip('^=@$')
+        return SearchBackend(queryset.db).search(
+            queryset, field, terms, ranked=True
+        )
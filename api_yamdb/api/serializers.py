@@ -1,8 +1,13 @@
+from functools import partial
+
 from django.core.validators import MaxValueValidator, MinValueValidator
 from rest_framework import serializers
-from reviews.models import Category, Comment, Genre, Review, Title, User
+from reviews.models import (SCORE_FIELDS, Category, Comment, Genre, Review,
+                            Title, User)
 from users.validators import validate_name
 
+from .sparse import SparseFieldsMixin
+
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,7 +21,22 @@ class GenreSerializer(serializers.ModelSerializer):
         model = Genre
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class AuthorSerializer(serializers.ModelSerializer):
+    class Meta:
+        fields = ('username', 'first_name', 'last_name', 'bio')
+        model = User
+
+
+EXPANDABLE_AUTHOR = {
+    'author': (
+        partial(AuthorSerializer, read_only=True),
+        partial(serializers.SlugRelatedField, slug_field='username',
+                read_only=True),
+    ),
+}
+
+
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = serializers.SlugRelatedField(
         slug_field='username',
         default=serializers.CurrentUserDefault(),
@@ -26,8 +46,12 @@ class ReviewSerializer(serializers.ModelSerializer):
         validators=[MinValueValidator(1), MaxValueValidator(10)]
     )
 
+    expandable_fields = EXPANDABLE_AUTHOR
+    optional_fields = {'comment_count': ('comment_count',)}
+
     class Meta:
-        fields = ('id', 'text', 'author', 'score', 'pub_date')
+        fields = ('id', 'text', 'author', 'score', 'pub_date',
+                  'comment_count')
         model = Review
         read_only_fields = ['title']
 
@@ -44,31 +68,50 @@ class ReviewSerializer(serializers.ModelSerializer):
         return data
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = serializers.SlugRelatedField(slug_field='username',
                                           read_only=True)
+    expandable_fields = EXPANDABLE_AUTHOR
 
     class Meta:
         fields = ('id', 'text', 'author', 'pub_date')
         model = Comment
 
 
-class TitleGETSerializer(serializers.ModelSerializer):
+class TitleGETSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     rating = serializers.IntegerField(read_only=True)
     genre = GenreSerializer(many=True)
     category = CategorySerializer(many=False)
+    score_histogram = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True
+    )
+    expandable_fields = {
+        'genre': (
+            partial(GenreSerializer, many=True, read_only=True),
+            partial(serializers.SlugRelatedField, slug_field='slug',
+                    many=True, read_only=True),
+        ),
+        'category': (
+            partial(CategorySerializer, read_only=True),
+            partial(serializers.SlugRelatedField, slug_field='slug',
+                    read_only=True),
+        ),
+    }
+    default_expand = ('genre', 'category')
+    # Счётчики хранятся в строке произведения: число ревью и гистограмма
+    # оценок 1-10 не требуют запросов к ревью.
+    optional_fields = {
+        'review_count': ('review_count',),
+        'score_histogram': SCORE_FIELDS,
+    }
 
     class Meta:
         model = Title
-        fields = '__all__'
-
-    def get_rating(self, obj):
-        reviews = Review.objects.filter(title_id=obj.id)
-        total_scores = [review.score for review in reviews]
-        if not total_scores:
-            return None
-        return round(sum(total_scores) / len(total_scores))
+        fields = (
+            'id', 'rating', 'genre', 'category', 'name', 'year',
+            'description', 'review_count', 'score_histogram',
+        )
 
 
 class TitlePOSTSerializer(TitleGETSerializer):
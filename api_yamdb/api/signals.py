@@ -0,0 +1,100 @@
+from django.db import connections
+from django.db.models.signals import (m2m_changed, post_delete, post_migrate,
+                                      post_save)
+from django.dispatch import receiver
+from reviews.models import Category, Comment, Genre, Review, Title
+from users.models import User
+
+from .cache import bump_version_on_commit
+from .changes import comment_title_id, record_change
+from .models import ChangeEvent
+from .search import ensure_fts_triggers
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, **kwargs):
+    # Рейтинг произведения виден и в карточке, и в списке произведений.
+    bump_version_on_commit('title', instance.title_id)
+    bump_version_on_commit('titles', 'all')
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=Comment)
+def record_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        record_change(instance, ChangeEvent.CREATED if created else (
+            ChangeEvent.UPDATED
+        ))
+
+
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=Comment)
+def record_deleted(sender, instance, **kwargs):
+    record_change(instance, ChangeEvent.DELETED)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    bump_version_on_commit('title', instance.title_id)
+    bump_version_on_commit('titles', 'all')
+    bump_version_on_commit('review', instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    bump_version_on_commit('review', instance.review_id)
+    # Число комментариев входит в ревью, а список ревью кэшируется по
+    # произведению. Без ревью версию произведения уже сменил review_deleted.
+    title_id = comment_title_id(instance)
+    if title_id is not None:
+        bump_version_on_commit('title', title_id)
+
+
+@receiver(post_save, sender=Title)
+@receiver(post_delete, sender=Title)
+def title_changed(sender, instance, **kwargs):
+    bump_version_on_commit('title', instance.pk)
+    bump_version_on_commit('titles', 'all')
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def title_genres_changed(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # Связи меняли со стороны жанра: затронуты произведения из pk_set.
+        bump_version_on_commit('catalog', 'all')
+        return
+    bump_version_on_commit('title', instance.pk)
+    bump_version_on_commit('titles', 'all')
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalog_changed(sender, instance, **kwargs):
+    # Названия жанров и категорий входят в каждую карточку произведения.
+    bump_version_on_commit('catalog', 'all')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_username', instance.username)
+    if not created and loaded != instance.username:
+        bump_version_on_commit('users', 'all')
+    instance._loaded_username = instance.username
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    bump_version_on_commit('users', 'all')
+
+
+@receiver(post_migrate)
+def search_triggers(sender, using, **kwargs):
+    # post_migrate приходит от каждого приложения, а миграции уже выполнены.
+    if sender.label == 'api':
+        ensure_fts_triggers(connections[using])
@@ -0,0 +1,32 @@
+from rest_framework.exceptions import NotFound
+from reviews.models import SimilarTitle, Title
+
+from .rows import TITLE_VALUES, title_rows
+
+
+def similar_titles(title_id):
+    """Похожие произведения в формате TitleGETSerializer с близостью.
+
+    Соседи вместе с произведением и категорией читаются одним запросом
+    по индексу similar_title_score_idx, жанры - вторым.
+    """
+    try:
+        title_id = int(title_id)
+    except ValueError:
+        raise NotFound()
+    neighbours = SimilarTitle.objects.filter(
+        title_id=title_id
+    ).order_by('-score', 'similar_id').values(
+        'score', *(f'similar__{field}' for field in TITLE_VALUES)
+    )
+    rows = [
+        dict({field: neighbour[f'similar__{field}']
+              for field in TITLE_VALUES}, score=neighbour['score'])
+        for neighbour in neighbours
+    ]
+    if not rows and not Title.objects.filter(pk=title_id).exists():
+        raise NotFound()
+    items = title_rows(rows)
+    for item, row in zip(items, rows):
+        item['similarity'] = round(row['score'], 3)
+    return items
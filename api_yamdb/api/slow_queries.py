@@ -0,0 +1,157 @@
+import glob
+import json
+import logging
+import os
+import random
+import threading
+import traceback
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .workers import worker_files
+
+logger = logging.getLogger(__name__)
+
+# Приложения, в коде которых ищется источник запроса.
+SOURCE_APPS = ('api', 'reviews', 'users')
+# Кадры самих обёрток в источник не попадают.
+SKIPPED_FILES = ('metrics.py', 'slow_queries.py')
+PLAIN_TYPES = (str, int, float, bool, type(None))
+
+
+def source_frame():
+    """Ближайший к запросу кадр стека из кода проекта."""
+    base = str(settings.BASE_DIR)
+    roots = tuple(os.path.join(base, app) + os.sep for app in SOURCE_APPS)
+    for frame in reversed(traceback.extract_stack()):
+        if (frame.filename.startswith(roots)
+                and os.path.basename(frame.filename) not in SKIPPED_FILES):
+            path = os.path.relpath(frame.filename, base)
+            return f'{path}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def plain_params(params, many):
+    if many or params is None:
+        return None
+    return [
+        value if isinstance(value, PLAIN_TYPES) else str(value)
+        for value in params
+    ]
+
+
+def explain(connection, sql, params):
+    """План запроса; где поддерживается - EXPLAIN ANALYZE.
+
+    Выполняется сырым курсором, чтобы не попасть в обёртки execute, и в
+    точке сохранения: ошибка не должна сломать транзакцию запроса.
+    """
+    try:
+        prefix = connection.ops.explain_query_prefix(analyze=True)
+    except ValueError:
+        prefix = connection.ops.explain_query_prefix()
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as wrapper:
+                cursor = wrapper.cursor
+                cursor.execute(f'{prefix} {sql}', params)
+                return [
+                    ' '.join(str(value) for value in row)
+                    for row in cursor.fetchall()
+                ]
+    except connection.Database.Error as error:
+        return [f'EXPLAIN не выполнен: {error}']
+
+
+class SlowQueryLog:
+    """Кольцевой буфер медленных запросов.
+
+    Запись пишется в лог ``api.slow_queries`` и в буфер на
+    SLOW_QUERY_LOG_SIZE последних запросов. При заданном METRICS_DIR буфер
+    процесса сохраняется в файл, и просмотр объединяет все процессы.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = deque()
+
+    def path(self, pid):
+        return os.path.join(
+            settings.METRICS_DIR, f'slow_queries_{pid}.json'
+        )
+
+    def record(self, metrics, sql, params, many, context, duration):
+        connection = context['connection']
+        entry = {
+            'time': timezone.now().isoformat(),
+            'duration_ms': round(duration * 1000, 3),
+            'database': connection.alias,
+            'sql': sql,
+            'params': plain_params(params, many),
+            'view': metrics.view,
+            'action': metrics.action,
+            'serializer': metrics.serializer,
+            'source': source_frame(),
+            'explain': None,
+        }
+        if (not many and sql.lstrip()[:6].upper() == 'SELECT'
+                and random.random() < settings.SLOW_QUERY_EXPLAIN_RATE):
+            metrics.explaining = True
+            try:
+                entry['explain'] = explain(connection, sql, params)
+            finally:
+                metrics.explaining = False
+        logger.warning(
+            'Медленный запрос %.1f мс (%s.%s, %s): %s',
+            entry['duration_ms'], entry['view'], entry['action'],
+            entry['source'], sql,
+        )
+        with self.lock:
+            size = settings.SLOW_QUERY_LOG_SIZE
+            if self.entries.maxlen != size:
+                self.entries = deque(self.entries, maxlen=size)
+            self.entries.append(entry)
+            if settings.METRICS_DIR:
+                self.flush_locked()
+
+    def flush_locked(self):
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = self.path(os.getpid())
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(list(self.entries), f, ensure_ascii=False)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Последние медленные запросы всех процессов, новые первыми."""
+        with self.lock:
+            entries = list(self.entries)
+        if settings.METRICS_DIR:
+            own = os.getpid()
+            for pid, path in worker_files(settings.METRICS_DIR,
+                                          'slow_queries'):
+                if pid == own:
+                    continue
+                try:
+                    with open(path) as f:
+                        entries.extend(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        entries.sort(key=lambda entry: entry['time'], reverse=True)
+        return entries[:settings.SLOW_QUERY_LOG_SIZE]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if settings.METRICS_DIR:
+                pattern = os.path.join(
+                    settings.METRICS_DIR, 'slow_queries_*.json'
+                )
+                for path in glob.glob(pattern):
+                    os.remove(path)
+
+
+slow_queries = SlowQueryLog()
@@ -0,0 +1,153 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_QUERY_PARAM = 'fields'
+EXPAND_QUERY_PARAM = 'expand'
+
+
+def parse_names(request, param):
+    """Имена из ``?param=a,b&param=c``; None, если параметра нет."""
+    if param not in request.query_params:
+        return None
+    return {
+        name.strip()
+        for value in request.query_params.getlist(param)
+        for name in value.split(',')
+        if name.strip()
+    }
+
+
+def related_names(field):
+    """Поля связанной модели, которые читает сериализатор поля."""
+    if isinstance(field, serializers.ManyRelatedField):
+        field = field.child_relation
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    if isinstance(field, serializers.SlugRelatedField):
+        return [field.slug_field]
+    if isinstance(field, serializers.Serializer):
+        return [
+            child.source for child in field.fields.values()
+            if child.source != '*'
+        ]
+    return []
+
+
+class SparseFieldsMixin:
+    """Выбор полей ``?fields=`` и разворачивание связей ``?expand=``.
+
+    ``expandable_fields`` сопоставляет полю пару фабрик: развёрнутое и
+    свёрнутое представление. Без ``?expand=`` развёрнуты поля из
+    ``default_expand``, пустой ``?expand=`` сворачивает все. Поля из
+    ``optional_fields`` выводятся, только если названы в ``?fields=``;
+    значение - столбцы модели, которые они читают. Параметры действуют
+    только на чтение, чтобы не менять набор входных полей.
+    """
+    expandable_fields = {}
+    default_expand = ()
+    optional_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sparse = False
+        request = self.context.get('request')
+        fields = expand = None
+        if request is not None and request.method in SAFE_METHODS:
+            fields = parse_names(request, FIELDS_QUERY_PARAM)
+            expand = parse_names(request, EXPAND_QUERY_PARAM)
+        self.check_names(FIELDS_QUERY_PARAM, fields, self.fields)
+        for name in set(self.optional_fields) - (fields or set()):
+            self.fields.pop(name)
+        if fields is None and expand is None:
+            return
+        self.sparse = True
+        self.check_names(EXPAND_QUERY_PARAM, expand, self.expandable_fields)
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+        if expand is None:
+            return
+        for name, (expanded, collapsed) in self.expandable_fields.items():
+            if name not in self.fields:
+                continue
+            if (name in expand) != (name in self.default_expand):
+                self.fields[name] = expanded() if name in expand else (
+                    collapsed()
+                )
+
+    def check_names(self, param, names, allowed):
+        unknown = sorted((names or set()) - set(allowed))
+        if unknown:
+            raise serializers.ValidationError({
+                param: [f'Неизвестные поля: {", ".join(unknown)}.']
+            })
+
+    def narrow_queryset(self, queryset, required=()):
+        """Ограничивает выборку столбцами и связями выбранных полей."""
+        opts = queryset.model._meta
+        only = {opts.pk.name, *required}
+        select, prefetch = [], []
+        for name in set(self.fields) & set(self.optional_fields):
+            only.update(self.optional_fields[name])
+        for field in self.fields.values():
+            name = field.source.split('.')[0]
+            try:
+                model_field = opts.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if model_field.many_to_many:
+                prefetch.append(Prefetch(
+                    name,
+                    queryset=model_field.related_model.objects.only(
+                        model_field.related_model._meta.pk.name,
+                        *related_names(field),
+                    ),
+                ))
+            elif model_field.is_relation and model_field.concrete:
+                only.add(name)
+                names = related_names(field)
+                if names:
+                    select.append(name)
+                    only.update(f'{name}__{related}' for related in names)
+            elif model_field.concrete:
+                only.add(name)
+        queryset = queryset.select_related(None)
+        if select:
+            # select_related() без аргументов присоединил бы все FK.
+            queryset = queryset.select_related(*select)
+        return queryset.prefetch_related(None).prefetch_related(
+            *prefetch
+        ).only(*only)
+
+
+class SparseFieldsViewMixin:
+    """Сужает queryset под поля, запрошенные у сериализатора.
+
+    Сужение идёт в filter_queryset: get_queryset представления часто
+    переопределён и не вызывает super(). ``required_fields`` - столбцы,
+    которые нужны без сериализатора, например FK родителя: его значение
+    читает менеджер связанных объектов.
+    """
+    required_fields = ()
+
+    def get_required_fields(self):
+        # Поля ключа курсора читаются при построении ссылок на страницы.
+        pagination = getattr(self, 'pagination_class', None)
+        keyset = getattr(pagination, 'keyset_class', None)
+        ordering = getattr(keyset, 'ordering', ())
+        return [*self.required_fields, *(
+            name.lstrip('-') for name in ordering
+        )]
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        serializer = self.get_serializer()
+        if not getattr(serializer, 'sparse', False):
+            return queryset
+        return serializer.narrow_queryset(
+            queryset, self.get_required_fields()
+        )
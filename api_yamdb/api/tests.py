@@ -0,0 +1,1880 @@
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from api.async_views import (ASYNC_READ_ROUTES, StreamingASGIHandler,
+                             async_read_urls, get_executor, get_feed_executor)
+from api.cache import bump_version_on_commit
+from api.changes import fetch_changes, in_db_thread
+from api.checks import shared_cache_check
+from api.confirmation_code import check_confirmation_code
+from api.metrics import (RequestMetrics, current_request, registry,
+                         serializer_timer)
+from api.models import ChangeEvent
+from api.pagination import PubDateKeysetPagination
+from api.rows import ValuesListMixin
+from api.search import SearchBackend, ensure_fts_triggers
+from api.slow_queries import slow_queries
+from api.throttling import take_tokens
+from api.urls import router_v1
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Avg, Count, ProtectedError, QuerySet, Sum
+from django.test import AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from reviews.deletion import anonymize_author, delete_title
+from reviews.models import (SCORE_FIELDS, Category, Comment, DeletionJob,
+                            Genre, GenreTitle, Review, SimilarTitle, Title,
+                            TitleRank)
+from users.models import (DELETED_USERNAME, ConfirmationCode, OutgoingEmail,
+                          User)
+
+DATASET_SIZES = (1, 3, 8)
+
+
+def seed_catalog(size):
+    """Создаёт каталог, в котором каждая выборка растёт вместе с size."""
+    category = Category.objects.create(name='Фильм', slug='movie')
+    genres = [
+        Genre.objects.create(name=f'Жанр {i}', slug=f'genre-{i}')
+        for i in range(size)
+    ]
+    users = [
+        User.objects.create(username=f'user{i}', email=f'user{i}@yamdb.ru')
+        for i in range(size)
+    ]
+    titles = []
+    for i in range(size):
+        title = Title.objects.create(
+            name=f'Произведение {i}', year=2000, category=category
+        )
+        title.genre.set(genres)
+        titles.append(title)
+    reviews = [
+        Review.objects.create(
+            title=titles[0], author=user, text='Текст', score=i % 10 + 1
+        )
+        for i, user in enumerate(users)
+    ]
+    comments = [
+        Comment.objects.create(
+            review=reviews[0], author=user, text='Комментарий'
+        )
+        for user in users
+    ]
+    return SimpleNamespace(
+        title=titles[0], review=reviews[0], comment=comments[0],
+        user=users[0],
+    )
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+    }},
+)
+class QueryCountTests(APITestCase):
+    """Число запросов к БД не должно зависеть от размера выборки."""
+
+    def setUp(self):
+        self.admin = User.objects.create(
+            username='admin', email='admin@yamdb.ru', role=User.ADMIN
+        )
+
+    def assert_constant_queries(self, expected, request,
+                                status_code=status.HTTP_200_OK):
+        for size in DATASET_SIZES:
+            with self.subTest(size=size), transaction.atomic():
+                data = seed_catalog(size)
+                with self.assertNumQueries(expected):
+                    response = request(data)
+                self.assertEqual(
+                    response.status_code, status_code, response.content
+                )
+                transaction.set_rollback(True)
+
+    def get(self, name, **kwargs):
+        return lambda data: self.client.get(reverse(name, kwargs={
+            key: value(data) for key, value in kwargs.items()
+        }))
+
+    def test_titles(self):
+        self.assert_constant_queries(3, self.get('titles-list'))
+        self.assert_constant_queries(
+            2, self.get('titles-detail', pk=lambda data: data.title.pk)
+        )
+
+    def test_genres_and_categories(self):
+        self.assert_constant_queries(2, self.get('genres-list'))
+        self.assert_constant_queries(2, self.get('categories-list'))
+
+    def test_reviews(self):
+        self.assert_constant_queries(3, self.get(
+            'reviews-list', title_id=lambda data: data.title.pk
+        ))
+        self.assert_constant_queries(2, self.get(
+            'reviews-detail',
+            title_id=lambda data: data.title.pk,
+            pk=lambda data: data.review.pk,
+        ))
+
+    def test_comments(self):
+        self.assert_constant_queries(3, self.get(
+            'comments-list',
+            title_id=lambda data: data.title.pk,
+            review_id=lambda data: data.review.pk,
+        ))
+        self.assert_constant_queries(2, self.get(
+            'comments-detail',
+            title_id=lambda data: data.title.pk,
+            review_id=lambda data: data.review.pk,
+            pk=lambda data: data.comment.pk,
+        ))
+
+    def test_users(self):
+        self.client.force_authenticate(self.admin)
+        self.assert_constant_queries(2, self.get('user-list'))
+        self.assert_constant_queries(1, self.get(
+            'user-detail', username=lambda data: data.user.username
+        ))
+        self.assert_constant_queries(0, self.get('user-me-page'))
+
+    def test_auth(self):
+        # Включая одну проверку корзин ограничителя частоты и точки
+        # сохранения update_or_create для кода подтверждения.
+        self.assert_constant_queries(15, lambda data: self.client.post(
+            reverse('signup'),
+            {'username': 'newcomer', 'email': 'newcomer@yamdb.ru'},
+        ))
+        self.assert_constant_queries(2, lambda data: self.client.post(
+            reverse('token'),
+            {'username': data.user.username, 'confirmation_code': 'wrong'},
+        ), status_code=status.HTTP_400_BAD_REQUEST)
+
+
+def encode_cursor(payload):
+    return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+}})
+class PaginationTests(APITestCase):
+    """Курсорная пагинация: обход в обе стороны, равные ключи, ошибки."""
+
+    def setUp(self):
+        category = Category.objects.create(name='Фильм', slug='movie')
+        self.title = Title.objects.create(name='Произведение', year=2000,
+                                          category=category)
+        for number in range(7):
+            user = User.objects.create(username=f'user{number}',
+                                       email=f'user{number}@yamdb.ru')
+            Review.objects.create(title=self.title, author=user,
+                                  text='Текст', score=5)
+        # У пяти ревью одинаковое время: порядок задаёт -id.
+        same = timezone.now()
+        Review.objects.filter(pk__in=Review.objects.order_by('pk').values(
+            'pk'
+        )[1:6]).update(pub_date=same)
+        self.expected = list(Review.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('pk', flat=True))
+        self.url = reverse('reviews-list', args=[self.title.pk])
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            pages.append([item['id'] for item in data['results']])
+            url = data[link]
+        return pages, data
+
+    def test_cursor_walks_both_ways(self):
+        with mock.patch.object(PubDateKeysetPagination, 'page_size', 2):
+            forward, last = self.walk(self.url + '?pagination=cursor',
+                                      'next')
+            backward, first = self.walk(last['previous'], 'previous')
+        self.assertEqual(sum(forward, []), self.expected)
+        self.assertEqual([len(page) for page in forward], [2, 2, 2, 1])
+        self.assertEqual(backward, forward[-2::-1])
+        self.assertIsNone(first['previous'])
+        self.assertIn('cursor=', first['next'])
+
+    def test_page_numbers_by_default(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['count'], 7)
+        self.assertEqual([item['id'] for item in data['results']],
+                         self.expected[:5])
+        data = self.client.get(self.url, {'pagination': 'cursor'}).json()
+        self.assertNotIn('count', data)
+        self.assertIn('cursor=', data['next'])
+        data = self.client.get(data['next'], {'pagination': 'page'}).json()
+        self.assertEqual(data['count'], 7)
+        self.assertNotIn('cursor=', data['next'])
+
+    def test_tampered_cursors(self):
+        review_cursors = (
+            'не-base64', 'e30', encode_cursor([1, 2]), encode_cursor({}),
+            encode_cursor({'p': 5}), encode_cursor({'p': ['2020-01-01']}),
+            encode_cursor({'p': ['вчера', '1']}),
+            encode_cursor({'p': [None, '1']}),
+            encode_cursor({'p': ['2020-01-01T00:00:00', 'x']}),
+        )
+        for cursor in review_cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {'cursor': cursor})
+                self.assertEqual(response.status_code,
+                                 status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('titles-list'), {
+            'cursor': encode_cursor({'p': [str(2 ** 64)]}),
+        })
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+}})
+class SparseFieldsTests(APITestCase):
+    """?fields= и ?expand= сужают ответ и выборку без ленивых запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_catalog(3)
+
+    def get(self, name, query, queries, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(name, kwargs=kwargs) + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK,
+                         response.content)
+        self.assertEqual(len(context), queries)
+        return response.json(), [query['sql'] for query in context]
+
+    def test_title_fields_narrow_queryset(self):
+        data, sql = self.get('titles-list', '?fields=id,name,rating', 2)
+        self.assertEqual(
+            set(data['results'][0]), {'id', 'name', 'rating'}
+        )
+        self.assertNotIn('description', sql[-1])
+        self.assertNotIn('reviews_category', sql[-1])
+
+    def test_title_relations_collapse_to_slugs(self):
+        data, _ = self.get('titles-detail', '?expand=', 2,
+                           pk=self.data.title.pk)
+        self.assertEqual(data['category'], 'movie')
+        self.assertEqual(len(data['genre']), 3)
+        self.assertIsInstance(data['genre'][0], str)
+        data, _ = self.get('titles-detail', '?expand=genre', 2,
+                           pk=self.data.title.pk)
+        self.assertIsInstance(data['genre'][0], dict)
+        self.assertEqual(data['category'], 'movie')
+
+    def test_review_author_expands(self):
+        data, _ = self.get('reviews-list', '?fields=text&pagination=cursor',
+                           2, title_id=self.data.title.pk)
+        self.assertEqual(set(data['results'][0]), {'text'})
+        data, _ = self.get('reviews-list', '?fields=id,author&expand=author',
+                           3, title_id=self.data.title.pk)
+        self.assertEqual(set(data['results'][0]['author']),
+                         {'username', 'first_name', 'last_name', 'bio'})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('titles-list') + '?fields=secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_optional_counters(self):
+        data, _ = self.get('titles-detail', '', 2, pk=self.data.title.pk)
+        self.assertNotIn('score_histogram', data)
+        data, _ = self.get('titles-list',
+                           '?fields=id,review_count,score_histogram', 2)
+        title = data['results'][0]
+        self.assertEqual(title['review_count'], 3)
+        self.assertEqual(title['score_histogram'],
+                         [1, 1, 1, 0, 0, 0, 0, 0, 0, 0])
+        data, _ = self.get('reviews-list',
+                           '?fields=id,comment_count&pagination=cursor', 2,
+                           title_id=self.data.title.pk)
+        counts = {review['id']: review['comment_count']
+                  for review in data['results']}
+        self.assertEqual(counts[self.data.review.pk], 3)
+        self.assertEqual(sum(counts.values()), 3)
+
+
+class CounterTests(APITestCase):
+    """Гистограмма оценок и число комментариев совпадают с пересчётом."""
+
+    def counters(self):
+        return (
+            list(Title.objects.order_by('pk').values_list(*SCORE_FIELDS)),
+            list(Review.objects.order_by('pk').values_list('comment_count')),
+        )
+
+    def test_writes_match_recalculation(self):
+        data = seed_catalog(8)
+        data.review.score = 10
+        data.review.save()
+        Review.objects.filter(score=5).get().delete()
+        data.comment.delete()
+        Comment.objects.create(review=Review.objects.last(),
+                               author=data.user, text='Текст')
+        stored = self.counters()
+        Title.objects.recalculate_ratings()
+        Review.objects.recalculate_comment_counts()
+        self.assertEqual(stored, self.counters())
+        self.assertEqual(sum(stored[0][0]), 7)
+        self.assertEqual(data.title.reviews.aggregate(
+            total=Sum('comment_count'))['total'], 8)
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+}})
+class RatingAggregateTests(APITestCase):
+    """Хранимый рейтинг совпадает с Avg(score) после каждой записи."""
+
+    def setUp(self):
+        category = Category.objects.create(name='Фильм', slug='movie')
+        self.titles = [
+            Title.objects.create(name=f'Произведение {i}', year=2000,
+                                 category=category)
+            for i in range(2)
+        ]
+        self.users = [
+            User.objects.create(username=f'user{i}', email=f'u{i}@yamdb.ru')
+            for i in range(3)
+        ]
+
+    def assert_matches_avg(self):
+        for title in Title.objects.annotate(
+            avg=Avg('reviews__score'), total=Count('reviews'),
+            scores=Sum('reviews__score'),
+        ):
+            self.assertEqual(title.rating, title.avg and int(title.avg))
+            self.assertEqual(title.review_count, title.total)
+            self.assertEqual(title.score_sum, title.scores or 0)
+            self.assertEqual(title.score_histogram, [
+                title.reviews.filter(score=score).count()
+                for score in range(1, 11)
+            ])
+
+    def review(self, user, title, score):
+        self.client.force_authenticate(user)
+        response = self.client.post(
+            reverse('reviews-list', args=[title.pk]),
+            {'text': 'Текст', 'score': score},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def test_create_update_delete(self):
+        first = self.review(self.users[0], self.titles[0], 4)
+        self.assert_matches_avg()
+        self.review(self.users[1], self.titles[0], 9)
+        self.assert_matches_avg()
+        url = reverse('reviews-detail', args=[self.titles[0].pk, first])
+        self.client.force_authenticate(self.users[0])
+        response = self.client.patch(url, {'score': 7})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assert_matches_avg()
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assert_matches_avg()
+        Review.objects.get().delete()
+        self.assert_matches_avg()
+        self.assertIsNone(Title.objects.get(pk=self.titles[0].pk).rating)
+
+    def test_title_change(self):
+        for user, score in zip(self.users, (2, 5, 10)):
+            self.review(user, self.titles[0], score)
+        review = Review.objects.get(score=10)
+        review.title = self.titles[1]
+        review.save()
+        self.assert_matches_avg()
+        review.title = self.titles[0]
+        review.score = 1
+        review.save()
+        self.assert_matches_avg()
+        # Загруженное до записи ревью произведение не затирает агрегаты.
+        stale = self.titles[0]
+        stale.name = 'Новое название'
+        stale.save()
+        self.assert_matches_avg()
+
+    def test_recalculate_ratings_repairs(self):
+        for user, score in zip(self.users, (3, 3, 8)):
+            self.review(user, self.titles[0], score)
+        self.review(self.users[0], self.titles[1], 6)
+        Title.objects.update(score_sum=1, review_count=7, rating=None,
+                             score_1=5)
+        out = StringIO()
+        call_command('recalculate_ratings', stdout=out)
+        self.assertIn('для 2 произведений', out.getvalue())
+        self.assert_matches_avg()
+        self.assertEqual(
+            list(Title.objects.values_list('rating', flat=True)), [4, 6]
+        )
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+}})
+class ValuesListTests(APITestCase):
+    """Быстрый список совпадает с выводом сериализаторов байт в байт."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_catalog(8)
+        Title.objects.filter(pk=cls.data.title.pk).update(description='Т')
+
+    def test_lists_match_serializers(self):
+        urls = [
+            reverse('titles-list'),
+            reverse('titles-list') + '?page=2',
+            reverse('titles-list') + '?pagination=cursor&genre=genre-1',
+            reverse('reviews-list', kwargs={'title_id': self.data.title.pk}),
+            reverse('reviews-list', kwargs={'title_id': self.data.title.pk})
+            + '?pagination=cursor',
+        ]
+        for url in urls:
+            fast = self.client.get(url)
+            with mock.patch.object(ValuesListMixin, 'use_values',
+                                   return_value=False):
+                slow = self.client.get(url)
+            self.assertEqual(fast.status_code, status.HTTP_200_OK)
+            self.assertEqual(fast.content, slow.content)
+
+
+def consume_stream(response):
+    """Читает потоковый ответ: время до первого куска, пик памяти, строки."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    chunks = iter(response.streaming_content)
+    first = next(chunks)
+    time_to_first_byte = time.perf_counter() - started
+    lines = first.count(b'\n')
+    for chunk in chunks:
+        lines += chunk.count(b'\n')
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return time_to_first_byte, peak, lines
+
+
+@override_settings(EXPORT_CHUNK_SIZE=200)
+class ExportTests(APITestCase):
+    """Выгрузка отдаётся потоком: память и время до первого байта не
+    растут вместе с таблицей. Прогон на миллионе строк - команда
+    manage.py bench_export."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_catalog(3)
+        cls.admin = User.objects.create(
+            username='admin', email='admin@yamdb.ru', role=User.ADMIN
+        )
+
+    def add_titles(self, count):
+        category = Category.objects.get(slug='movie')
+        for start in range(0, count, 10000):
+            Title.objects.bulk_create(
+                Title(name=f'Выгрузка {i}', year=2000, category=category)
+                for i in range(start, min(start + 10000, count))
+            )
+
+    def test_admin_only(self):
+        url = reverse('export-titles')
+        self.assertEqual(self.client.get(url).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(self.data.user)
+        self.assertEqual(self.client.get(url).status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+    def test_formats(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('export-reviews'))
+        self.assertEqual(response['Content-Type'],
+                         'application/x-ndjson; charset=utf-8')
+        lines = b''.join(response.streaming_content).splitlines()
+        reviews = [json.loads(line) for line in lines]
+        self.assertEqual(len(reviews), 3)
+        self.assertEqual(reviews[0]['title'], self.data.title.pk)
+        response = self.client.get(reverse('export-titles') + '?format=json')
+        titles = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(titles), 3)
+        self.assertEqual(len(titles[0]['genre']), 3)
+        response = self.client.get(
+            reverse('export-comments') + '?format=json'
+        )
+        self.assertEqual(len(json.loads(
+            b''.join(response.streaming_content)
+        )), 3)
+
+    def test_rows_are_read_in_chunks(self):
+        self.client.force_authenticate(self.admin)
+        self.add_titles(997)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('export-titles'))
+            self.assertEqual(consume_stream(response)[2], 1000)
+        # Жанры выбираются одним запросом на каждую пачку выгрузки.
+        self.assertEqual(len([
+            query for query in queries
+            if 'reviews_genretitle' in query['sql']
+        ]), 5)
+
+    def test_memory_and_first_byte_do_not_grow(self):
+        # Наборы в 5 и 50 пачек: при буферизации всей таблицы пик памяти
+        # вырос бы в десять раз.
+        self.client.force_authenticate(self.admin)
+        url = reverse('export-titles')
+        self.add_titles(1000 - 3)
+        small_ttfb, small_peak, _ = consume_stream(self.client.get(url))
+        self.add_titles(9000)
+        ttfb, peak, lines = consume_stream(self.client.get(url))
+        self.assertEqual(lines, 10000)
+        self.assertLess(peak, small_peak * 2)
+        self.assertLess(ttfb, small_ttfb * 5 + 0.05)
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'response-cache-tests',
+}})
+class ResponseCacheTests(APITestCase):
+    """Закэшированные страницы сбрасываются любой записью родителя."""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.data = seed_catalog(3)
+        self.reviews_url = reverse(
+            'reviews-list', kwargs={'title_id': self.data.title.pk}
+        )
+        self.comments_url = reverse('comments-list', kwargs={
+            'title_id': self.data.title.pk,
+            'review_id': self.data.review.pk,
+        })
+
+    def test_repeated_page_is_served_from_cache(self):
+        for url in (self.reviews_url, self.comments_url):
+            expected = self.client.get(url).json()
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url).json(), expected)
+
+    def test_review_write_invalidates_title_pages(self):
+        self.client.get(self.reviews_url)
+        author = User.objects.create(username='late', email='late@yamdb.ru')
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(
+                title=self.data.title, author=author, text='Новый', score=1
+            )
+        self.assertEqual(self.client.get(self.reviews_url).json()['count'], 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.data.title.reviews.filter(author=author).delete()
+        self.assertEqual(self.client.get(self.reviews_url).json()['count'], 3)
+
+    def test_comment_write_invalidates_review_pages(self):
+        self.client.get(self.comments_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(
+                review=self.data.review, author=self.data.user, text='Ещё'
+            )
+        self.assertEqual(self.client.get(self.comments_url).json()['count'], 4)
+
+    def test_username_change_invalidates_pages(self):
+        self.client.get(self.reviews_url)
+        user = User.objects.get(pk=self.data.user.pk)
+        user.username = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        authors = [
+            review['author']
+            for review in self.client.get(self.reviews_url).json()['results']
+        ]
+        self.assertIn('renamed', authors)
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'conditional-get-tests',
+}})
+class ConditionalGetTests(APITestCase):
+    """Повторный опрос без изменений получает 304 без запросов к БД."""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.data = seed_catalog(3)
+        self.urls = [
+            reverse('titles-list'),
+            reverse('titles-detail', kwargs={'pk': self.data.title.pk}),
+            reverse('reviews-list', kwargs={'title_id': self.data.title.pk}),
+            reverse('comments-list', kwargs={
+                'title_id': self.data.title.pk,
+                'review_id': self.data.review.pk,
+            }),
+        ]
+
+    def assert_modified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unchanged_resources_are_not_modified(self):
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertIn('Last-Modified', response)
+            with self.assertNumQueries(0):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+            self.assertEqual(response.status_code,
+                             status.HTTP_304_NOT_MODIFIED)
+            self.assertFalse(response.content)
+
+    def test_review_write_changes_title_validators(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls[:3]]
+        author = User.objects.create(username='late', email='late@yamdb.ru')
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(
+                title=self.data.title, author=author, text='Новый', score=1
+            )
+        for url, etag in zip(self.urls, etags):
+            self.assert_modified(url, etag)
+
+    def test_genre_rename_changes_title_validators(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls[:2]]
+        genre = Genre.objects.first()
+        genre.name = 'Новое имя'
+        with self.captureOnCommitCallbacks(execute=True):
+            genre.save()
+        for url, etag in zip(self.urls, etags):
+            self.assert_modified(url, etag)
+
+    def test_comment_write_changes_comment_validators(self):
+        url = self.urls[3]
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(
+                review=self.data.review, author=self.data.user, text='Ещё'
+            )
+        self.assert_modified(url, etag)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    """Почтовый сервер, который не принимает письма."""
+
+    def send_messages(self, email_messages):
+        raise SMTPException('сервер недоступен')
+
+
+class UnreachableEmailBackend(BaseEmailBackend):
+    """Почтовый сервер, к которому нельзя подключиться."""
+
+    def open(self):
+        raise ConnectionRefusedError('нет соединения')
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+)
+class SendEmailsTests(APITestCase):
+    """Очередь писем: пачки, повторы с задержкой и предел попыток."""
+
+    def setUp(self):
+        for number in range(3):
+            OutgoingEmail.objects.create(
+                recipient=f'user{number}@yamdb.ru', subject='Код',
+                body=f'Ваш код подтверждения: code{number}!',
+            )
+
+    def send(self, *args):
+        call_command('send_emails', *args, stdout=StringIO())
+
+    def statuses(self):
+        return list(OutgoingEmail.objects.order_by('pk').values_list(
+            'status', 'attempts'
+        ))
+
+    def test_batches_are_sent(self):
+        self.send('--batch-size', '2')
+        self.assertEqual([message.to for message in mail.outbox], [
+            [f'user{number}@yamdb.ru'] for number in range(3)
+        ])
+        self.assertEqual(self.statuses(), [(OutgoingEmail.SENT, 1)] * 3)
+        self.assertFalse(OutgoingEmail.objects.filter(
+            sent_at__isnull=True
+        ).exists())
+
+    def test_only_due_emails_are_claimed(self):
+        OutgoingEmail.objects.filter(recipient='user1@yamdb.ru').update(
+            next_attempt_at=timezone.now() + timedelta(minutes=1)
+        )
+        self.send()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(
+            OutgoingEmail.objects.get(status=OutgoingEmail.PENDING).recipient,
+            'user1@yamdb.ru',
+        )
+
+    @override_settings(EMAIL_BACKEND='api.tests.FailingEmailBackend')
+    def test_retries_with_backoff_until_max_attempts(self):
+        arguments = ('--max-attempts', '3', '--backoff', '30')
+        for attempt, delay in ((1, 30), (2, 60)):
+            started = timezone.now()
+            self.send(*arguments)
+            self.assertEqual(self.statuses(),
+                             [(OutgoingEmail.PENDING, attempt)] * 3)
+            for email in OutgoingEmail.objects.all():
+                self.assertEqual(email.last_error, 'сервер недоступен')
+                self.assertAlmostEqual(
+                    (email.next_attempt_at - started).total_seconds(),
+                    delay, delta=5,
+                )
+            # Задержка ещё не прошла: повторный запуск ничего не берёт.
+            self.send(*arguments)
+            self.assertEqual(self.statuses(),
+                             [(OutgoingEmail.PENDING, attempt)] * 3)
+            OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        self.send(*arguments)
+        self.assertEqual(self.statuses(), [(OutgoingEmail.FAILED, 3)] * 3)
+
+    @override_settings(EMAIL_BACKEND='api.tests.UnreachableEmailBackend')
+    def test_connection_error_fails_whole_batch(self):
+        self.send('--batch-size', '2', '--max-attempts', '1')
+        self.assertEqual(self.statuses(), [(OutgoingEmail.FAILED, 1)] * 3)
+        self.assertEqual(set(OutgoingEmail.objects.values_list(
+            'last_error', flat=True
+        )), {'нет соединения'})
+
+    def test_claim_skips_locked_rows(self):
+        select_for_update = QuerySet.select_for_update
+        with mock.patch.object(
+            connection.features, 'has_select_for_update_skip_locked', True
+        ), mock.patch.object(
+            QuerySet, 'select_for_update', autospec=True,
+            side_effect=select_for_update,
+        ) as spy:
+            self.send()
+        self.assertEqual(spy.call_args[1], {'skip_locked': True})
+        self.assertEqual(len(mail.outbox), 3)
+
+
+class SharedCacheCheckTests(APITestCase):
+    """Проверка api.W001 предупреждает о кэше одного процесса."""
+
+    def test_locmem_cache_warns(self):
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }}):
+            warnings = shared_cache_check(None)
+        self.assertEqual([warning.id for warning in warnings], ['api.W001'])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'yamdb_cache',
+    }})
+    def test_shared_cache_passes(self):
+        self.assertEqual(shared_cache_check(None), [])
+        caches['default'].set('key', 'value')
+        self.assertEqual(caches['default'].get('key'), 'value')
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'auth-cache-tests',
+}})
+class CachedAuthenticationTests(APITestCase):
+    """Пользователь из токена читается из кэша до первой записи в него."""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create(
+            username='reader', email='reader@yamdb.ru'
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}'
+        )
+
+    def test_me_is_served_without_queries(self):
+        url = reverse('user-me-page')
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.json()['username'], 'reader')
+
+    def test_role_change_is_visible_immediately(self):
+        url = reverse('user-list')
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_403_FORBIDDEN
+        )
+        self.user.role = User.ADMIN
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_profile_update_keeps_deferred_fields(self):
+        User.objects.filter(pk=self.user.pk).update(password='hash')
+        self.client.get(reverse('user-me-page'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('user-me-page'), {'bio': 'Новая биография'}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.bio, 'Новая биография')
+        self.assertEqual(self.user.password, 'hash')
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+}})
+class SearchTests(APITestCase):
+    """Поиск подстрок по индексам, созданным полным migrate."""
+
+    def setUp(self):
+        self.admin = User.objects.create(
+            username='admin', email='admin@yamdb.ru', role=User.ADMIN
+        )
+        for slug, name in (('drama', 'Драма'), ('horror', 'Ужасы'),
+                           ('comedy-drama', 'Трагикомедия')):
+            Genre.objects.create(name=name, slug=slug)
+
+    def search_genres(self, text):
+        response = self.client.get(reverse('genres-list'), {'search': text})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['slug'] for item in response.json()['results']]
+
+    def test_ranked_query_passes_text_as_value(self):
+        backend = SearchBackend()
+        backend.connection = SimpleNamespace(vendor='postgresql',
+                                             yamdb_has_trigram=True)
+        queryset = backend.search(Genre.objects.all(), 'name', 'комедия драма',
+                                  ranked=True)
+        sql, params = queryset.query.sql_with_params()
+        self.assertIn('SIMILARITY', sql)
+        self.assertIn('комедия драма', params)
+
+    def test_ranking_needs_trigram_extension(self):
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value.fetchone.return_value = None
+        backend = SearchBackend()
+        backend.connection = SimpleNamespace(
+            vendor='postgresql', cursor=mock.Mock(return_value=cursor)
+        )
+        for _ in range(2):
+            queryset = backend.search(Genre.objects.all(), 'name', 'Драма',
+                                      ranked=True)
+            sql, params = queryset.query.sql_with_params()
+            self.assertNotIn('SIMILARITY', sql)
+            self.assertIn('%Драма%', params)
+        backend.connection.cursor.assert_called_once_with()
+        self.assertEqual(
+            list(queryset.values_list('slug', flat=True)), ['drama']
+        )
+
+    def search_titles(self, text):
+        response = self.client.get(reverse('titles-list'), {'name': text})
+        return [item['name'] for item in response.json()['results']]
+
+    def test_titles_and_users_are_indexed_after_migrate(self):
+        category = Category.objects.create(name='Фильм', slug='movie')
+        title = Title.objects.create(name='The Matrix', year=1999,
+                                     category=category)
+        self.assertEqual(self.search_titles('Matrix'), ['The Matrix'])
+        title.name = 'Reloaded'
+        title.save()
+        self.assertEqual(self.search_titles('Matrix'), [])
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('user-list'), {'search': 'adm'})
+        self.assertEqual(
+            [item['username'] for item in response.json()['results']],
+            ['admin'],
+        )
+
+    @skipUnless(connection.vendor == 'sqlite', 'триггеры FTS5 есть в SQLite')
+    def test_lost_triggers_are_restored(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER "reviews_title_name_fts_ai"')
+        category = Category.objects.create(name='Фильм', slug='movie')
+        Title.objects.create(name='The Matrix', year=1999, category=category)
+        self.assertEqual(self.search_titles('Matrix'), [])
+        ensure_fts_triggers(connection)
+        self.assertEqual(self.search_titles('Matrix'), ['The Matrix'])
+        Title.objects.create(name='Matrix 2', year=2003, category=category)
+        self.assertEqual(len(self.search_titles('Matrix')), 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'нужен PostgreSQL')
+    def test_ranked_search_on_postgresql(self):
+        self.assertEqual(self.search_genres('драма'), ['drama'])
+        self.assertEqual(self.search_genres('ком'), ['comedy-drama'])
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+}})
+class BulkWriteTests(APITestCase):
+    """Пакетная запись не зависит по числу запросов от размера пачки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(
+            username='admin', email='admin@yamdb.ru', role=User.ADMIN
+        )
+        Category.objects.create(name='Фильм', slug='movie')
+        Genre.objects.create(name='Драма', slug='drama')
+        Genre.objects.create(name='Комедия', slug='comedy')
+
+    def setUp(self):
+        self.client.force_authenticate(self.admin)
+
+    def post_titles(self, size):
+        return self.client.post(reverse('titles-bulk'), [
+            {'name': f'Произведение {i}', 'year': 2000,
+             'category': 'movie', 'genre': ['drama', 'comedy']}
+            for i in range(size)
+        ], format='json')
+
+    def test_titles_are_created_in_bulk(self):
+        response = self.post_titles(2)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Title.objects.count(), 2)
+        title = Title.objects.get(pk=response.json()[0]['id'])
+        self.assertEqual(
+            set(title.genre.values_list('slug', flat=True)),
+            {'drama', 'comedy'},
+        )
+        with CaptureQueriesContext(connection) as small:
+            self.post_titles(2)
+        with CaptureQueriesContext(connection) as large:
+            self.post_titles(20)
+        if connection.features.can_return_rows_from_bulk_insert:
+            self.assertEqual(len(small), len(large))
+
+    def test_errors_are_reported_per_item(self):
+        response = self.post_titles(1)
+        title_id = response.json()[0]['id']
+        response = self.client.put(reverse('titles-bulk'), [
+            {'id': title_id, 'name': 'Новое', 'year': 2001,
+             'category': 'movie', 'genre': []},
+            {'name': 'Без категории', 'year': 2001,
+             'category': 'missing', 'genre': ['drama']},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertIn('category', errors[1])
+        self.assertEqual(Title.objects.get(pk=title_id).name, 'Произведение 0')
+
+    def test_genres_upsert_by_slug(self):
+        response = self.client.put(reverse('genres-bulk'), [
+            {'name': 'Драма!', 'slug': 'drama'},
+            {'name': 'Ужасы', 'slug': 'horror'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Genre.objects.get(slug='drama').name, 'Драма!')
+        response = self.client.post(reverse('genres-bulk'), [
+            {'name': 'Ужасы', 'slug': 'horror'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MetricsTests(APITestCase):
+    """Метрики собираются по представлениям и суммируются по процессам."""
+
+    def setUp(self):
+        self.data = seed_catalog(3)
+        self.admin = User.objects.create(
+            username='admin', email='admin@yamdb.ru', role=User.ADMIN
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings_override = override_settings(METRICS_DIR=directory.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.directory = directory.name
+        registry.reset()
+
+    def metric(self, text, name, view, action):
+        pattern = (
+            rf'^yamdb_{name}{{view="{view}",action="{action}",'
+            rf'method="GET",status="200"}} (\S+)$'
+        )
+        return float(re.search(pattern, text, re.MULTILINE).group(1))
+
+    def test_metrics_by_view_and_action(self):
+        self.client.get(reverse('titles-list'))
+        self.client.get(reverse('titles-list'))
+        self.client.get(reverse('titles-detail',
+                                kwargs={'pk': self.data.title.pk}))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(self.admin)
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertEqual(
+            self.metric(text, 'requests_total', 'TitleViewSet', 'list'), 2
+        )
+        self.assertEqual(
+            self.metric(text, 'requests_total', 'TitleViewSet', 'retrieve'),
+            1,
+        )
+        self.assertGreater(
+            self.metric(text, 'db_queries_total', 'TitleViewSet', 'list'), 0
+        )
+        self.assertGreater(self.metric(
+            text, 'serializer_seconds_total', 'TitleViewSet', 'retrieve'
+        ), 0)
+        self.assertGreater(self.metric(
+            text, 'response_bytes_total', 'TitleViewSet', 'list'
+        ), 0)
+        self.assertIn('yamdb_request_duration_seconds_bucket{view="Title'
+                      'ViewSet",action="list",method="GET",status="200",'
+                      'le="+Inf"} 2', text)
+
+    def write_process_file(self, pid, count):
+        labels = ['TitleViewSet', 'list', 'GET', '200']
+        path = os.path.join(self.directory, f'metrics_{pid}.json')
+        with open(path, 'w') as f:
+            json.dump([['requests_total', labels, count]], f)
+        return path
+
+    def test_other_processes_are_summed(self):
+        self.client.get(reverse('titles-list'))
+        self.write_process_file(os.getppid(), 5)
+        self.client.force_authenticate(self.admin)
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertEqual(
+            self.metric(text, 'requests_total', 'TitleViewSet', 'list'), 6
+        )
+
+    def test_dead_process_files_are_removed(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        path = self.write_process_file(process.pid, 5)
+        self.client.get(reverse('titles-list'))
+        self.client.force_authenticate(self.admin)
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertEqual(
+            self.metric(text, 'requests_total', 'TitleViewSet', 'list'), 1
+        )
+        self.assertFalse(os.path.exists(path))
+
+    def test_serializers_are_not_patched(self):
+        # Сериализация замеряется в представлениях, а не в DRF.
+        self.assertEqual(vars(BaseSerializer)['data'].fget.__module__,
+                         'rest_framework.serializers')
+        self.client.get(reverse('genres-list'))
+        self.client.force_authenticate(self.admin)
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertGreater(self.metric(
+            text, 'serializer_seconds_total', 'GenreViewSet', 'list'
+        ), 0)
+
+
+@override_settings(METRICS_DIR=None, SLOW_QUERY_THRESHOLD=0,
+                   SLOW_QUERY_EXPLAIN_RATE=1, CACHES={'default': {
+                       'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+                   }})
+class SlowQueryTests(APITestCase):
+    """Медленные запросы сохраняются с источником и планом."""
+
+    def setUp(self):
+        self.data = seed_catalog(3)
+        self.admin = User.objects.create(
+            username='admin', email='admin@yamdb.ru', role=User.ADMIN
+        )
+        slow_queries.clear()
+        self.addCleanup(slow_queries.clear)
+
+    def test_entries_are_attributed(self):
+        with self.assertLogs('api.slow_queries', 'WARNING'):
+            self.client.get(reverse('titles-detail',
+                                    kwargs={'pk': self.data.title.pk}))
+        self.client.force_authenticate(self.admin)
+        entries = self.client.get(reverse('slow-queries')).json()
+        titles = [
+            entry for entry in entries
+            if entry['view'] == 'TitleViewSet'
+            and entry['action'] == 'retrieve'
+        ]
+        self.assertTrue(titles)
+        for entry in titles:
+            self.assertTrue(entry['source'].startswith('api'))
+            self.assertTrue(entry['explain'])
+        self.assertIn(self.data.title.pk, titles[0]['params'])
+
+    def test_serializer_attribution(self):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        try:
+            with self.assertLogs('api.slow_queries', 'WARNING'):
+                with serializer_timer('TitleGETSerializer'):
+                    list(Title.objects.all())
+        finally:
+            current_request.reset(token)
+        self.assertEqual(slow_queries.collect()[0]['serializer'],
+                         'TitleGETSerializer')
+
+    @override_settings(SLOW_QUERY_THRESHOLD=None)
+    def test_disabled(self):
+        self.client.force_authenticate(self.admin)
+        self.client.get(reverse('titles-list'))
+        self.assertEqual(self.client.get(reverse('slow-queries')).json(), [])
+
+    def test_admin_only(self):
+        user = User.objects.create(username='user', email='user@yamdb.ru')
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('slow-queries'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class AsyncReadViewTests(APITransactionTestCase):
+    """Асинхронные представления чтения отвечают так же, как синхронные.
+
+    Представления выполняются в пуле потоков со своими соединениями,
+    поэтому данные должны быть зафиксированы.
+    """
+
+    def setUp(self):
+        self.data = seed_catalog(3)
+
+    def async_patterns(self):
+        with override_settings(ASYNC_READ_VIEWS=True):
+            return {
+                pattern.name: pattern for pattern in
+                async_read_urls(router_v1.urls)
+                if pattern.name in ASYNC_READ_ROUTES
+            }
+
+    def test_only_read_routes_are_async(self):
+        self.assertIs(async_read_urls(router_v1.urls), router_v1.urls)
+        patterns = self.async_patterns()
+        self.assertEqual(set(patterns), set(ASYNC_READ_ROUTES))
+        for pattern in patterns.values():
+            self.assertTrue(asyncio.iscoroutinefunction(pattern.callback))
+
+    def test_same_response_as_sync_view(self):
+        patterns = self.async_patterns()
+        title = self.data.title.pk
+        for name, url, kwargs in (
+            ('titles-list', reverse('titles-list'), {}),
+            ('titles-detail', reverse('titles-detail', args=[title]),
+             {'pk': str(title)}),
+            ('reviews-list', reverse('reviews-list', args=[title]),
+             {'title_id': str(title)}),
+        ):
+            request = AsyncRequestFactory().get(url)
+            response = async_to_sync(patterns[name].callback)(
+                request, **kwargs
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(json.loads(response.content),
+                             self.client.get(url).json())
+
+    @override_settings(METRICS_DIR=None)
+    def test_sync_view_queries_are_counted_under_asgi(self):
+        registry.reset()
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': reverse('titles-list'),
+            'query_string': b'',
+            'headers': [],
+        }
+
+        async def fetch():
+            communicator = ApplicationCommunicator(
+                StreamingASGIHandler(), scope
+            )
+            await communicator.send_input({'type': 'http.request'})
+            start = await communicator.receive_output(5)
+            await communicator.receive_output(5)
+            return start['status']
+
+        # ASYNC_READ_VIEWS выключен: список - синхронное представление.
+        self.assertEqual(async_to_sync(fetch)(), status.HTTP_200_OK)
+        labels = ('TitleViewSet', 'list', 'GET', '200')
+        values = registry.collect()
+        self.assertEqual(values[('requests_total', labels)], 1)
+        self.assertGreater(values[('db_queries_total', labels)], 0)
+        self.assertGreater(values[('db_seconds_total', labels)], 0)
+
+    def test_export_streams_under_asgi(self):
+        admin = User.objects.create(
+            username='admin', email='admin@yamdb.ru', role=User.ADMIN
+        )
+        token = str(AccessToken.for_user(admin))
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': reverse('export-titles'),
+            'query_string': b'',
+            'headers': [(b'authorization', f'Bearer {token}'.encode())],
+        }
+
+        async def fetch():
+            communicator = ApplicationCommunicator(
+                StreamingASGIHandler(), scope
+            )
+            await communicator.send_input({'type': 'http.request'})
+            start = await communicator.receive_output(5)
+            body = b''
+            while True:
+                message = await communicator.receive_output(5)
+                body += message.get('body', b'')
+                if not message.get('more_body'):
+                    return start['status'], body
+
+        code, body = async_to_sync(fetch)()
+        self.assertEqual(code, status.HTTP_200_OK)
+        lines = body.decode().splitlines()
+        self.assertEqual(len(lines), Title.objects.count())
+
+
+class RateLimitTests(APITestCase):
+    """Корзины токенов ограничивают изменяющие запросы по адресу и имени."""
+
+    def signup(self, number, address='10.0.0.1'):
+        return self.client.post(reverse('signup'), {
+            'username': f'user{number}', 'email': f'user{number}@yamdb.ru',
+        }, REMOTE_ADDR=address)
+
+    @override_settings(RATE_LIMITS={'signup': {'ip': '2/h'}})
+    def test_signup_per_address(self):
+        for number in range(2):
+            self.assertEqual(self.signup(number).status_code,
+                             status.HTTP_200_OK)
+        response = self.signup(2)
+        self.assertEqual(response.status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '1800')
+        self.assertEqual(self.signup(3, address='10.0.0.2').status_code,
+                         status.HTTP_200_OK)
+
+    @override_settings(RATE_LIMITS={'signup': {'ip': '1/h'}})
+    def test_clients_behind_proxy(self):
+        # nginx дописывает адрес клиента в конец X-Forwarded-For.
+        def signup(number, forwarded_for):
+            return self.client.post(reverse('signup'), {
+                'username': f'user{number}',
+                'email': f'user{number}@yamdb.ru',
+            }, REMOTE_ADDR='172.18.0.5', HTTP_X_FORWARDED_FOR=forwarded_for)
+
+        self.assertEqual(signup(0, '10.0.0.1').status_code,
+                         status.HTTP_200_OK)
+        self.assertEqual(signup(1, '10.0.0.2').status_code,
+                         status.HTTP_200_OK)
+        # Подделанный клиентом адрес стоит раньше настоящего.
+        self.assertEqual(signup(2, '10.0.0.3, 10.0.0.1').status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(RATE_LIMITS={'token': {'user': '2/h'}})
+    def test_token_attempts_per_username(self):
+        User.objects.create(username='victim', email='victim@yamdb.ru')
+        codes = [
+            self.client.post(reverse('token'), {
+                'username': 'victim', 'confirmation_code': 'wrong',
+            }, REMOTE_ADDR=f'10.0.0.{number}').status_code
+            for number in range(3)
+        ]
+        self.assertEqual(codes, [status.HTTP_400_BAD_REQUEST] * 2
+                         + [status.HTTP_429_TOO_MANY_REQUESTS])
+
+    @override_settings(RATE_LIMITS={'write': {'ip': '1/h', 'user': '1/h'}})
+    def test_reads_are_not_limited(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse('titles-list'))
+                             .status_code, status.HTTP_200_OK)
+
+    def test_refill_in_one_query(self):
+        buckets = [('test:ip', (1, 1.0)), ('test:user', (2, 1.0))]
+        with self.assertNumQueries(1):
+            self.assertIsNone(take_tokens(buckets, now=100.0))
+        self.assertAlmostEqual(take_tokens(buckets, now=100.5), 0.5)
+        self.assertIsNone(take_tokens(buckets, now=101.6))
+
+
+@override_settings(EMAIL_DELIVERY='queue')
+class ConfirmationCodeTests(APITestCase):
+    """Коды хранятся хешами отдельно от пользователя и истекают."""
+
+    def signup(self, username='newcomer'):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('signup'), {
+                'username': username, 'email': f'{username}@yamdb.ru',
+            })
+        body = OutgoingEmail.objects.latest('pk').body
+        return re.search(r'подтверждения: (\w+)!', body).group(1), queries
+
+    def token(self, code, username='newcomer'):
+        return self.client.post(reverse('token'), {
+            'username': username, 'confirmation_code': code,
+        })
+
+    def test_code_is_hashed_and_user_row_untouched(self):
+        self.signup()
+        code, queries = self.signup()
+        stored = ConfirmationCode.objects.get(user__username='newcomer')
+        self.assertNotIn(code, stored.code_hash)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "users_user"')
+        ])
+
+    def test_code_is_single_use(self):
+        code, _ = self.signup()
+        self.assertEqual(self.token(code).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.token(code).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_reissued_code_is_not_consumed_by_old_one(self):
+        old_code, _ = self.signup()
+        user = User.objects.select_related('confirmation').get(
+            username='newcomer'
+        )
+        code, _ = self.signup()
+        self.assertFalse(check_confirmation_code(user, old_code))
+        self.assertEqual(self.token(code).status_code, status.HTTP_200_OK)
+
+    @override_settings(CONFIRMATION_CODE_MAX_ATTEMPTS=2)
+    def test_attempts_are_limited(self):
+        code, _ = self.signup()
+        for _ in range(2):
+            self.assertEqual(self.token('wrong').status_code,
+                             status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.token(code).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        code, _ = self.signup()
+        self.assertEqual(self.token(code).status_code, status.HTTP_200_OK)
+
+    def test_expired_codes(self):
+        code, _ = self.signup()
+        self.signup('other')
+        ConfirmationCode.objects.filter(user__username='newcomer').update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(self.token(code).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        call_command('purge_confirmation_codes', batch_size=1,
+                     stdout=StringIO())
+        self.assertEqual(
+            list(ConfirmationCode.objects.values_list(
+                'user__username', flat=True
+            )),
+            ['other'],
+        )
+
+    @override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+    )
+    def test_outbox_does_not_keep_codes(self):
+        code, _ = self.signup()
+        call_command('send_emails', stdout=StringIO())
+        self.assertIn(code, mail.outbox[0].body)
+        sent = OutgoingEmail.objects.get()
+        self.assertEqual((sent.status, sent.body), (OutgoingEmail.SENT, ''))
+        self.signup('other')
+        self.signup('stale')
+        OutgoingEmail.objects.filter(recipient='stale@yamdb.ru').update(
+            created_at=timezone.now() - settings.CONFIRMATION_CODE_LIFETIME
+        )
+        call_command('purge_confirmation_codes', batch_size=1,
+                     stdout=StringIO())
+        self.assertEqual(
+            list(OutgoingEmail.objects.values_list('recipient', flat=True)),
+            ['other@yamdb.ru'],
+        )
+
+
+class LeaderboardTests(APITestCase):
+    """Списки лучших берутся из TitleRank и совпадают с полной сборкой."""
+
+    def setUp(self):
+        movie = Category.objects.create(name='Фильм', slug='movie')
+        book = Category.objects.create(name='Книга', slug='book')
+        self.comedy = Genre.objects.create(name='Комедия', slug='comedy')
+        self.drama = Genre.objects.create(name='Драма', slug='drama')
+        self.users = [
+            User.objects.create(username=f'user{i}', email=f'u{i}@yamdb.ru')
+            for i in range(20)
+        ]
+        # Две десятки против двадцати девяток: приор тянет первую вниз.
+        self.few = self.create_title('Мало оценок', movie, 1999, 10, 2)
+        self.many = self.create_title('Много оценок', movie, 2000, 9, 20)
+        self.book = self.create_title('Книга', book, 1999, 5, 3)
+        self.few.genre.set([self.comedy])
+        self.many.genre.set([self.comedy, self.drama])
+
+    def create_title(self, name, category, year, score, count):
+        title = Title.objects.create(name=name, year=year, category=category)
+        for user in self.users[:count]:
+            Review.objects.create(title=title, author=user, text='Текст',
+                                  score=score)
+        return title
+
+    def top(self, **params):
+        return self.client.get(reverse('titles-top'), params)
+
+    def names(self, **params):
+        return [item['name'] for item in self.top(**params).json()]
+
+    def assert_matches_rebuild(self):
+        fields = ('board', 'key', 'title_id', 'score_sum', 'review_count')
+        incremental = sorted(TitleRank.objects.values_list(*fields))
+        TitleRank.objects.rebuild()
+        self.assertEqual(incremental,
+                         sorted(TitleRank.objects.values_list(*fields)))
+
+    def test_boards(self):
+        self.assertEqual(self.names(),
+                         ['Много оценок', 'Мало оценок', 'Книга'])
+        self.assertEqual(self.names(genre='comedy'),
+                         ['Много оценок', 'Мало оценок'])
+        self.assertEqual(self.names(genre='drama'), ['Много оценок'])
+        self.assertEqual(self.names(category='book'), ['Книга'])
+        self.assertEqual(self.names(year=1999, limit=1), ['Мало оценок'])
+        self.assertEqual(self.names(genre='unknown'), [])
+        item = self.top(limit=1).json()[0]
+        self.assertEqual(item['score'], 8.4)
+        self.assertEqual(item['genre'], [
+            {'name': 'Комедия', 'slug': 'comedy'},
+            {'name': 'Драма', 'slug': 'drama'},
+        ])
+
+    def test_invalid_params(self):
+        for params in ({'genre': 'comedy', 'year': 1999}, {'year': 'x'},
+                       {'limit': 0}, {'limit': 1000}):
+            self.assertEqual(self.top(**params).status_code,
+                             status.HTTP_400_BAD_REQUEST)
+
+    def test_two_queries(self):
+        with self.assertNumQueries(2):
+            self.top(genre='comedy')
+
+    def test_incremental_refresh(self):
+        review = self.few.reviews.first()
+        review.score = 1
+        review.save()
+        Review.objects.create(title=self.book, author=self.users[10],
+                              text='Текст', score=10)
+        self.many.reviews.first().delete()
+        self.book.genre.add(self.drama)
+        self.few.refresh_from_db()
+        self.few.year = 2001
+        self.few.save()
+        self.comedy.titles.clear()
+        self.assert_matches_rebuild()
+        self.assertEqual(self.names(year=2001), ['Мало оценок'])
+        self.assertEqual(self.names(genre='comedy'), [])
+
+    def test_bulk_write_refresh(self):
+        admin = User.objects.create(username='admin', email='a@yamdb.ru',
+                                    role=User.ADMIN)
+        self.client.force_authenticate(admin)
+        response = self.client.put(reverse('titles-bulk'), [{
+            'id': self.book.pk, 'name': 'Книга', 'year': 1999,
+            'category': 'movie', 'genre': ['comedy'],
+        }], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK,
+                         response.content)
+        self.assert_matches_rebuild()
+        self.assertIn('Книга', self.names(genre='comedy'))
+
+
+class SimilarTitlesTests(APITestCase):
+    """Похожие произведения: полный и инкрементальный пересчёт совпадают."""
+
+    def setUp(self):
+        category = Category.objects.create(name='Фильм', slug='movie')
+        self.users = [
+            User.objects.create(username=f'user{i}', email=f'u{i}@yamdb.ru')
+            for i in range(6)
+        ]
+        self.titles = {
+            name: Title.objects.create(name=name, year=2000,
+                                       category=category)
+            for name in ('matrix', 'twin', 'other', 'lone', 'empty')
+        }
+        for name, scores in (
+            ('matrix', {0: 9, 1: 9, 2: 9, 3: 9}),
+            ('twin', {0: 9, 1: 9, 2: 9, 3: 9}),
+            ('other', {0: 2, 1: 2, 4: 8}),
+            # Общий оценивший с matrix один - меньше SIMILAR_TITLES_MIN_COMMON.
+            ('lone', {0: 9, 5: 9}),
+        ):
+            self.review(name, scores)
+        call_command('build_similar_titles', '--full', stdout=StringIO())
+
+    def review(self, name, scores):
+        for user, score in scores.items():
+            Review.objects.create(title=self.titles[name], text='Текст',
+                                  author=self.users[user], score=score)
+
+    def similar(self, name):
+        return self.client.get(reverse(
+            'titles-similar', args=[self.titles[name].pk]
+        ))
+
+    def names(self, name):
+        return [item['name'] for item in self.similar(name).json()]
+
+    def pairs(self):
+        return sorted(
+            (title, similar, round(score, 5))
+            for title, similar, score in SimilarTitle.objects.values_list(
+                'title_id', 'similar_id', 'score'
+            )
+        )
+
+    def test_neighbours(self):
+        self.assertEqual(self.names('matrix'), ['twin', 'other'])
+        self.assertEqual(self.names('lone'), [])
+        self.assertEqual(self.names('empty'), [])
+        item = self.similar('matrix').json()[1]
+        self.assertEqual(item['similarity'], 0.236)
+        self.assertEqual(item['category'], {'name': 'Фильм', 'slug': 'movie'})
+        self.assertEqual(
+            self.client.get(reverse('titles-similar', args=[0])).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+    def test_two_queries(self):
+        with self.assertNumQueries(2):
+            self.similar('matrix')
+
+    def test_incremental_refresh(self):
+        self.assertFalse(Title.objects.filter(similar_stale=True).exists())
+        self.review('twin', {4: 8})
+        Review.objects.get(title=self.titles['other'],
+                           author=self.users[1]).delete()
+        self.assertEqual(
+            set(Title.objects.filter(similar_stale=True)
+                .values_list('name', flat=True)),
+            {'twin', 'other'},
+        )
+        call_command('build_similar_titles', stdout=StringIO())
+        self.assertFalse(Title.objects.filter(similar_stale=True).exists())
+        incremental = self.pairs()
+        call_command('build_similar_titles', '--full', stdout=StringIO())
+        self.assertEqual(incremental, self.pairs())
+        self.assertEqual(self.names('matrix'), ['twin'])
+        self.assertEqual(self.names('other'), ['twin'])
+
+
+@override_settings(DELETION_BATCH_SIZE=2)
+class DeletionTests(APITestCase):
+    """Удаление пачками: счётчики и связанные строки остаются согласованы."""
+
+    def setUp(self):
+        self.admin = User.objects.create(
+            username='admin', email='admin@yamdb.ru', role=User.ADMIN
+        )
+        self.client.force_authenticate(self.admin)
+        self.data = seed_catalog(3)
+        self.other = Title.objects.create(
+            name='Другое', year=2000, category=self.data.title.category
+        )
+        self.other_review = Review.objects.create(
+            title=self.other, author=self.data.user, text='Текст', score=4
+        )
+        SimilarTitle.objects.create(title=self.other,
+                                    similar=self.data.title, score=0.5)
+        Title.objects.update(similar_stale=False)
+
+    def delete(self, name, lookup):
+        return self.client.delete(reverse(f'{name}-detail', args=[lookup]))
+
+    def test_delete_title(self):
+        title = self.data.title
+        response = self.delete('titles', title.pk)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Title.objects.filter(pk=title.pk).exists())
+        self.assertEqual(Review.objects.get(), self.other_review)
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(GenreTitle.objects.filter(title=title.pk).exists())
+        self.assertFalse(TitleRank.objects.filter(title=title.pk).exists())
+        self.assertFalse(SimilarTitle.objects.exists())
+        self.assertTrue(Title.objects.get(pk=self.other.pk).similar_stale)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'deletion-tests',
+    }})
+    def test_delete_title_bumps_title_once_per_batch(self):
+        caches['default'].clear()
+        title, review = self.data.title, self.data.review
+        url = reverse('comments-list', args=[title.pk, review.pk])
+        self.assertEqual(self.client.get(url).status_code,
+                         status.HTTP_200_OK)
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch('reviews.deletion.bump_version_on_commit',
+                            wraps=bump_version_on_commit) as bump:
+                delete_title(title.pk, batch_size=1)
+        # Три ревью - три пачки, а не версия на каждое ревью.
+        self.assertEqual(bump.call_count, 3)
+        self.assertEqual({call[0] for call in bump.call_args_list},
+                         {('title', title.pk)})
+        # Страница комментариев сброшена версией произведения.
+        self.assertEqual(self.client.get(url).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_delete_user(self):
+        user = self.data.user
+        # Заглушка уже автор ревью этого произведения.
+        self.assertEqual(self.delete('user', 'user1').status_code,
+                         status.HTTP_204_NO_CONTENT)
+        rating = Title.objects.values_list('score_sum', 'review_count')
+        before = list(rating)
+        response = self.delete('user', user.username)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
+        self.assertEqual(list(rating), before)
+        self.assertEqual(
+            Review.objects.filter(author__username=DELETED_USERNAME,
+                                  anonymized=True).count(), 3,
+        )
+        self.assertEqual(
+            Comment.objects.filter(author__username=DELETED_USERNAME).count(),
+            2,
+        )
+        self.assertTrue(Title.objects.get(pk=self.other.pk).similar_stale)
+        response = self.client.get(
+            reverse('reviews-detail', args=[self.other.pk,
+                                            self.other_review.pk])
+        )
+        self.assertEqual(response.json()['author'], DELETED_USERNAME)
+        self.assertEqual(self.delete('user', DELETED_USERNAME).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_sentinel_name_is_reserved(self):
+        for url in (reverse('user-list'), reverse('signup')):
+            response = self.client.post(url, {
+                'username': DELETED_USERNAME, 'email': 'd@yamdb.ru',
+            })
+            self.assertEqual(response.status_code,
+                             status.HTTP_400_BAD_REQUEST)
+        # Настоящий пользователь с этим именем не получает чужие ревью.
+        User.objects.create(username=DELETED_USERNAME, email='d@yamdb.ru')
+        with self.assertRaises(ValueError):
+            anonymize_author(self.data.user.pk, batch_size=2)
+        self.assertFalse(
+            Review.objects.filter(author__username=DELETED_USERNAME).exists()
+        )
+
+    def test_authors_are_protected_outside_deletion(self):
+        user = self.data.user
+        with self.assertRaises(ProtectedError):
+            with transaction.atomic():
+                User.objects.filter(pk=user.pk).delete()
+        self.assertEqual(Review.objects.filter(author=user).count(), 2)
+        anonymize_author(user.pk, batch_size=2)
+        User.objects.filter(pk=user.pk).delete()
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
+
+    @override_settings(DELETION_BACKGROUND_THRESHOLD=2)
+    def test_background_jobs(self):
+        title, user = self.data.title, self.data.user
+        response = self.delete('titles', title.pk)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.delete('titles', title.pk).json(),
+                         response.json())
+        self.assertEqual(self.delete('user', user.username).status_code,
+                         status.HTTP_202_ACCEPTED)
+        self.assertFalse(User.objects.get(pk=user.pk).is_active)
+        self.assertTrue(Title.objects.filter(pk=title.pk).exists())
+        call_command('run_deletion_jobs', stdout=StringIO())
+        self.assertEqual(
+            list(DeletionJob.objects.values_list('status', flat=True)),
+            [DeletionJob.DONE] * 2,
+        )
+        self.assertFalse(Title.objects.filter(pk=title.pk).exists())
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
+        self.assertEqual(Review.objects.get().author.username,
+                         DELETED_USERNAME)
+
+
+@override_settings(CHANGE_FEED_POLL_INTERVAL=0.05)
+class ChangeFeedTests(APITransactionTestCase):
+    """Лента изменений отдаёт события по курсору, long-poll и SSE.
+
+    Опрос идёт в пуле потоков со своими соединениями, поэтому данные
+    должны быть зафиксированы.
+    """
+
+    def setUp(self):
+        self.data = seed_catalog(1)
+        self.title = self.data.title
+
+    def changes(self, **params):
+        return self.client.get(
+            reverse('title-changes', args=[self.title.pk]), params
+        )
+
+    def test_events_after_cursor(self):
+        cursor = self.changes().json()['cursor']
+        self.assertEqual(cursor, 2)
+        comment = Comment.objects.create(review=self.data.review,
+                                         author=self.data.user, text='Новый')
+        self.data.review.text = 'Исправлено'
+        self.data.review.save()
+        comment_id = comment.pk
+        comment.delete()
+        response = self.changes(since=cursor, wait=0)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['cursor'], 5)
+        self.assertEqual(
+            [(event['type'], event['action'], event['id'])
+             for event in data['events']],
+            [('comment', 'created', comment_id),
+             ('review', 'updated', self.data.review.pk),
+             ('comment', 'deleted', comment_id)],
+        )
+        created = data['events'][0]
+        self.assertEqual(created['review_id'], self.data.review.pk)
+        self.assertEqual(created['data']['author'], self.data.user.username)
+        self.assertEqual(data['events'][1]['data']['text'], 'Исправлено')
+        self.assertIsNone(data['events'][2]['data'])
+        self.assertEqual(self.changes(since=5, wait=0).json(),
+                         {'cursor': 5, 'events': []})
+
+    def test_comment_without_loaded_review(self):
+        comment = Comment.objects.create(review=self.data.review,
+                                         author=self.data.user, text='Новый')
+        comment = Comment.objects.get(pk=comment.pk)
+        with CaptureQueriesContext(connection) as queries:
+            comment.delete()
+        self.assertEqual(
+            [query['sql'] for query in queries
+             if query['sql'].startswith('SELECT')
+             and 'reviews_review' in query['sql']],
+            [mock.ANY],
+        )
+        comment = Comment.objects.create(review=self.data.review,
+                                         author=self.data.user, text='Ещё')
+        comment = Comment.objects.get(pk=comment.pk)
+        self.data.review.delete()
+        # Ревью удалено вместе с комментариями: повторное удаление
+        # комментария не падает и не пишет событие.
+        comment.delete()
+        events = self.changes(since=2, wait=0).json()['events']
+        self.assertEqual(
+            [(event['type'], event['action']) for event in events],
+            [('comment', 'created'), ('comment', 'deleted'),
+             ('comment', 'created'), ('comment', 'deleted'),
+             ('comment', 'deleted'), ('review', 'deleted')],
+        )
+
+    def test_long_poll_waits_for_event(self):
+        # Запись между опросами, а не из другого потока: общая SQLite в
+        # памяти блокирует таблицы при параллельной записи.
+        polls = []
+
+        def fetch(title_id, since):
+            polls.append(since)
+            if len(polls) == 2:
+                Comment.objects.create(review=self.data.review,
+                                       author=self.data.user, text='Позже')
+            return fetch_changes(title_id, since)
+
+        started = time.monotonic()
+        with mock.patch('api.changes.fetch_changes', fetch):
+            data = self.changes(since=2, wait=5).json()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(polls, [2, 2])
+        self.assertEqual([event['seq'] for event in data['events']], [3])
+
+    def test_compaction(self):
+        for i in range(3):
+            Comment.objects.create(review=self.data.review,
+                                   author=self.data.user, text=f'{i}')
+        ChangeEvent.objects.update(
+            created=timezone.now() - timedelta(days=30)
+        )
+        call_command('compact_changes', stdout=StringIO())
+        self.assertEqual(
+            list(ChangeEvent.objects.values_list('seq', flat=True)), [5]
+        )
+        self.assertEqual(self.changes(since=1, wait=0).status_code,
+                         status.HTTP_410_GONE)
+        self.assertEqual(self.changes(since=5, wait=0).json()['events'], [])
+
+    def test_feed_has_own_pool(self):
+        # Ждущие клиенты ленты не занимают потоки представлений чтения.
+        name = in_db_thread(lambda: threading.current_thread().name).result()
+        self.assertTrue(name.startswith('yamdb-feed'))
+        self.assertIsNot(get_feed_executor(), get_executor())
+
+    def test_invalid_params(self):
+        for params in ({'since': 'x'}, {'since': -1},
+                       {'since': 0, 'wait': 1000}):
+            self.assertEqual(self.changes(**params).status_code,
+                             status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(CHANGE_FEED_STREAM_DURATION=0.2)
+    def test_event_stream(self):
+        response = self.client.get(
+            reverse('title-changes', args=[self.title.pk]),
+            HTTP_ACCEPT='text/event-stream', HTTP_LAST_EVENT_ID='1',
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('id: 2\nevent: comment.created\ndata: {', body)
+        self.assertNotIn('id: 1\n', body)
+
+    @override_settings(CHANGE_FEED_STREAM_DURATION=60)
+    def test_stream_stops_on_disconnect(self):
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': reverse('title-changes', args=[self.title.pk]),
+            'query_string': b'since=0',
+            'headers': [(b'accept', b'text/event-stream')],
+        }
+
+        async def stream():
+            communicator = ApplicationCommunicator(
+                StreamingASGIHandler(), scope
+            )
+            await communicator.send_input({'type': 'http.request'})
+            await communicator.receive_output(5)
+            body = b''
+            while b'event: comment.created' not in body:
+                body += (await communicator.receive_output(5))['body']
+            await communicator.send_input({'type': 'http.disconnect'})
+            while True:
+                message = await communicator.receive_output(5)
+                if not message.get('more_body'):
+                    return
+
+        started = time.monotonic()
+        # Поток SSE ждёт в цикле событий, без отдельного потока на ответ.
+        with mock.patch('api.changes.HEARTBEAT_INTERVAL', 0.1):
+            with mock.patch('api.async_views.thread_parts',
+                            side_effect=AssertionError):
+                async_to_sync(stream)()
+        self.assertLess(time.monotonic() - started, 10)
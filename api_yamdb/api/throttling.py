@@ -0,0 +1,107 @@
+import time
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from .models import RateLimitBucket
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'10/m' -> ёмкость корзины и пополнение в секунду."""
+    count, period = rate.split('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+def take_sql(rows):
+    quote = connection.ops.quote_name
+    table = quote(RateLimitBucket._meta.db_table)
+    key, tokens, capacity, rate, updated, allowed = (
+        quote(name) for name in
+        ('key', 'tokens', 'capacity', 'rate', 'updated', 'allowed')
+    )
+    least = 'MIN' if connection.vendor == 'sqlite' else 'LEAST'
+    refill = (
+        f'{least}(EXCLUDED.{capacity}, {table}.{tokens} + '
+        f'(EXCLUDED.{updated} - {table}.{updated}) * EXCLUDED.{rate})'
+    )
+    values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * rows)
+    return (
+        f'INSERT INTO {table} '
+        f'({key}, {tokens}, {capacity}, {rate}, {updated}, {allowed}) '
+        f'VALUES {values} '
+        f'ON CONFLICT ({key}) DO UPDATE SET '
+        f'{tokens} = CASE WHEN {refill} >= 1 '
+        f'THEN {refill} - 1 ELSE {refill} END, '
+        f'{allowed} = {refill} >= 1, '
+        f'{capacity} = EXCLUDED.{capacity}, '
+        f'{rate} = EXCLUDED.{rate}, '
+        f'{updated} = EXCLUDED.{updated} '
+        f'RETURNING {key}, {tokens}, {rate}, {allowed}'
+    )
+
+
+def take_tokens(buckets, now=None):
+    """Берёт по токену из каждой корзины одним запросом к БД.
+
+    buckets - пары (ключ, (ёмкость, пополнение в секунду)). Новая корзина
+    создаётся полной. Возвращает None, если токены были во всех
+    корзинах, иначе число секунд до появления токена.
+    """
+    now = time.time() if now is None else now
+    params = []
+    for key, (capacity, rate) in buckets:
+        params.extend((key, capacity - 1, capacity, rate, now, True))
+    with connection.cursor() as cursor:
+        cursor.execute(take_sql(len(buckets)), params)
+        rows = cursor.fetchall()
+    waits = [
+        (1 - tokens) / rate
+        for _, tokens, rate, allowed in rows if not allowed
+    ]
+    return max(waits) if waits else None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Ограничение изменяющих запросов корзинами токенов в БД.
+
+    Лимиты берутся из RATE_LIMITS по throttle_scope представления: ``ip``
+    - на адрес клиента, ``user`` - на пользователя. Для анонимных
+    запросов пользователя определяет метод представления
+    get_rate_limit_user, если он есть. Все корзины запроса проверяются
+    одним запросом к БД, безопасные методы не ограничиваются.
+    """
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        scope = getattr(view, 'throttle_scope', None)
+        limits = settings.RATE_LIMITS.get(scope)
+        if (not limits or not settings.RATE_LIMIT_ENABLED
+                or request.method in SAFE_METHODS):
+            return True
+        buckets = []
+        if 'ip' in limits:
+            ident = self.get_ident(request)
+            buckets.append((f'{scope}:ip:{ident}'[:255],
+                            parse_rate(limits['ip'])))
+        user = self.get_user(request, view)
+        if 'user' in limits and user:
+            buckets.append((f'{scope}:user:{user}'[:255],
+                            parse_rate(limits['user'])))
+        if not buckets:
+            return True
+        self.wait_seconds = take_tokens(buckets)
+        return self.wait_seconds is None
+
+    def get_user(self, request, view):
+        if request.user.is_authenticated:
+            return request.user.pk
+        get_user = getattr(view, 'get_rate_limit_user', None)
+        return get_user(request) if get_user else None
+
+    def wait(self):
+        return self.wait_seconds
@@ -1,6 +1,9 @@
+from api.async_views import async_read_urls
+from api.changes import title_changes
+from api.export import CommentExportView, ReviewExportView, TitleExportView
 from api.views import (CategoryViewSet, CommentViewSet, GenreViewSet,
-                       RegistrationView, ReviewViewSet, TitleViewSet,
-                       TokenView)
+                       MetricsView, RegistrationView, ReviewViewSet,
+                       SlowQueriesView, TitleViewSet, TokenView)
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
@@ -21,7 +24,7 @@ router_v1.register(r'genres', GenreViewSet, basename='genres')
 router_v1.register(r'categories', CategoryViewSet, basename='categories')
 
 urlpatterns = [
-    path('v1/', include(router_v1.urls)),
+    path('v1/', include(async_read_urls(router_v1.urls))),
     path(
         'v1/auth/signup/',
         RegistrationView.as_view(),
@@ -31,5 +34,35 @@ urlpatterns = [
         'v1/auth/token/',
         TokenView.as_view(),
         name='token',
-    )
+    ),
+    path(
+        'v1/titles/<int:title_id>/changes/',
+        title_changes,
+        name='title-changes',
+    ),
+    path(
+        'v1/export/titles/',
+        TitleExportView.as_view(),
+        name='export-titles',
+    ),
+    path(
+        'v1/export/reviews/',
+        ReviewExportView.as_view(),
+        name='export-reviews',
+    ),
+    path(
+        'v1/export/comments/',
+        CommentExportView.as_view(),
+        name='export-comments',
+    ),
+    path(
+        'v1/metrics/',
+        MetricsView.as_view(),
+        name='metrics',
+    ),
+    path(
+        'v1/slow-queries/',
+        SlowQueriesView.as_view(),
+        name='slow-queries',
+    ),
 ]
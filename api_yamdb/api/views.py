@@ -1,43 +1,87 @@
-from api.confirmation_code import generate_confirmation_code
+from api.bulk import write_slugged, write_titles
+from api.cache import VersionedListCacheMixin
+from api.conditional import ConditionalGetMixin
+from api.confirmation_code import (check_confirmation_code,
+                                   generate_confirmation_code,
+                                   store_confirmation_code)
+from api.deletion import ScheduledDestroyMixin
 from api.filters import TitleFilter
-from api.permissions import IsAdminOrReadOnly, IsAuthorAdminModeratorOrReadOnly
+from api.leaderboards import leaderboard
+from api.metrics import TimedListMixin, TimedRetrieveMixin, registry
+from api.pagination import IdPagination, PubDatePagination
+from api.permissions import (IsAdmin, IsAdminOrReadOnly,
+                             IsAuthorAdminModeratorOrReadOnly)
+from api.rows import (REVIEW_VALUES, TITLE_VALUES, ValuesListMixin,
+                      review_rows, title_rows)
+from api.search import IndexedSearchFilter
 from api.serializers import (CategorySerializer, CommentSerializer,
                              GenreSerializer, RegistrationSerializer,
                              ReviewSerializer, TitleGETSerializer,
                              TitlePOSTSerializer, TokenSerializer)
+from api.similar import similar_titles
+from api.slow_queries import slow_queries
+from api.sparse import SparseFieldsViewMixin
 from django.conf import settings
 from django.core.mail import send_mail
-from django.db.models import Avg
+from django.db.models import Prefetch
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, mixins, status, views, viewsets
+from rest_framework import mixins, status, views, viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
-from reviews.models import Category, Genre, Review, Title
-from users.models import User
+from reviews.models import Category, DeletionJob, Genre, Review, Title
+from users.models import OutgoingEmail, User
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(ConditionalGetMixin, VersionedListCacheMixin,
+                     SparseFieldsViewMixin, TimedRetrieveMixin,
+                     viewsets.ModelViewSet):
     serializer_class = CommentSerializer
     permission_classes = [IsAuthorAdminModeratorOrReadOnly]
+    throttle_scope = 'write'
+    pagination_class = PubDatePagination
+    cache_scope = 'review'
+    cache_lookup_kwarg = 'review_id'
+    required_fields = ('review',)
+
+    def get_list_validator_scopes(self):
+        # Версия произведения сбрасывает и страницы комментариев: удаление
+        # произведения сдвигает одну версию, а не версию каждого ревью.
+        return [('title', self.kwargs.get('title_id')),
+                ('review', self.kwargs.get('review_id')), ('users', 'all')]
 
     def get_review(self, key):
         review_id = self.kwargs.get(key)
-        return get_object_or_404(Review, id=review_id)
+        return get_object_or_404(Review, id=review_id,
+                                 title_id=self.kwargs.get('title_id'))
 
     def get_queryset(self):
         review = self.get_review('review_id')
-        return review.comments.all()
+        return review.comments.select_related('author')
 
     def perform_create(self, serializer):
         review = self.get_review('review_id')
         serializer.save(author=self.request.user, review=review)
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ConditionalGetMixin, VersionedListCacheMixin,
+                    SparseFieldsViewMixin, ValuesListMixin,
+                    TimedRetrieveMixin, viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthorAdminModeratorOrReadOnly]
+    throttle_scope = 'write'
+    pagination_class = PubDatePagination
+    cache_scope = 'title'
+    cache_lookup_kwarg = 'title_id'
+    required_fields = ('title',)
+    values_fields = REVIEW_VALUES
+    build_rows = staticmethod(review_rows)
+
+    def get_list_validator_scopes(self):
+        return [('title', self.kwargs.get('title_id')), ('users', 'all')]
 
     def get_title(self, key):
         title_id = self.kwargs.get(key)
@@ -45,60 +89,118 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         title = self.get_title('title_id')
-        return title.reviews.all()
+        return title.reviews.select_related('author')
 
     def perform_create(self, serializer):
         title = self.get_title('title_id')
         serializer.save(author=self.request.user, title=title)
 
 
-class TitleViewSet(viewsets.ModelViewSet):
-    queryset = Title.objects.all().annotate(rating=Avg('reviews__score'))
+class TitleViewSet(ScheduledDestroyMixin, ConditionalGetMixin,
+                   SparseFieldsViewMixin, ValuesListMixin,
+                   TimedRetrieveMixin, viewsets.ModelViewSet):
+    # Жанры упорядочены по слагу, как и в быстром списке (api.rows).
+    queryset = Title.objects.select_related('category').prefetch_related(
+        Prefetch('genre', queryset=Genre.objects.order_by('slug'))
+    )
     permission_classes = [IsAdminOrReadOnly]
+    throttle_scope = 'write'
+    pagination_class = IdPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = TitleFilter
+    values_fields = TITLE_VALUES
+    build_rows = staticmethod(title_rows)
+    deletion_kind = DeletionJob.TITLE
 
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PATCH', 'DEL'):
             return TitlePOSTSerializer
         return TitleGETSerializer
 
+    def get_list_validator_scopes(self):
+        return [('catalog', 'all'), ('titles', 'all')]
+
+    def get_detail_validator_scopes(self):
+        return [('catalog', 'all'), ('title', self.kwargs.get('pk'))]
+
+    @action(methods=['POST', 'PUT'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """POST создаёт произведения списком, PUT ещё и обновляет по id."""
+        return write_titles(request.data, upsert=request.method == 'PUT')
+
+    @action(methods=['GET'], detail=False, url_path='top')
+    def top(self, request):
+        """Лучшие произведения: все, ?genre=, ?category= или ?year=."""
+        return Response(leaderboard(request.query_params))
+
+    @action(methods=['GET'], detail=True, url_path='similar')
+    def similar(self, request, pk=None):
+        """Похожие по оценкам пользователей (build_similar_titles)."""
+        return Response(similar_titles(pk))
+
+
+class SlugBulkMixin:
+
+    @action(methods=['POST', 'PUT'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """POST создаёт объекты списком, PUT ещё и обновляет по слагу."""
+        return write_slugged(
+            self.queryset.model,
+            self.get_serializer_class(),
+            request.data,
+            upsert=request.method == 'PUT',
+        )
+
 
-class GenreViewSet(mixins.ListModelMixin,
+class GenreViewSet(SlugBulkMixin,
+                   TimedListMixin,
+                   mixins.ListModelMixin,
                    mixins.CreateModelMixin,
                    mixins.DestroyModelMixin,
                    viewsets.GenericViewSet):
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
     permission_classes = [IsAdminOrReadOnly]
-    filter_backends = [filters.SearchFilter]
+    throttle_scope = 'write'
+    filter_backends = [IndexedSearchFilter]
     search_fields = ['name']
     lookup_field = 'slug'
 
 
-class CategoryViewSet(mixins.ListModelMixin,
+class CategoryViewSet(SlugBulkMixin,
+                      TimedListMixin,
+                      mixins.ListModelMixin,
                       mixins.CreateModelMixin,
                       mixins.DestroyModelMixin,
                       viewsets.GenericViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAdminOrReadOnly]
-    filter_backends = [filters.SearchFilter]
+    throttle_scope = 'write'
+    filter_backends = [IndexedSearchFilter]
     search_fields = ['name']
     lookup_field = 'slug'
 
 
 class RegistrationView(views.APIView):
     permission_classes = [AllowAny]
+    throttle_scope = 'signup'
 
     def send_confirmation_code(self, email):
         confirmation_code = generate_confirmation_code()
-        send_mail(
-            subject='Yamdb! Код регистрации для получения JWT-токена',
-            message=f'Ваш код подтверждения: {confirmation_code}!',
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-        )
+        subject = 'Yamdb! Код регистрации для получения JWT-токена'
+        message = f'Ваш код подтверждения: {confirmation_code}!'
+        if settings.EMAIL_DELIVERY == 'inline':
+            send_mail(
+                subject=subject,
+                message=message,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                recipient_list=[email],
+            )
+        else:
+            OutgoingEmail.objects.create(
+                recipient=email, subject=subject, body=message
+            )
         return confirmation_code
 
     def post(self, request):
@@ -109,14 +211,20 @@ class RegistrationView(views.APIView):
             user, _ = User.objects.get_or_create(username=username,
                                                  email=email)
             confirmation_code = self.send_confirmation_code(email)
-            user.confirmation_code = confirmation_code
-            user.save()
+            store_confirmation_code(user, confirmation_code)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 class TokenView(views.APIView):
     permission_classes = [AllowAny]
+    throttle_scope = 'token'
+
+    def get_rate_limit_user(self, request):
+        # Подбор кода одного пользователя ограничен и с разных адресов.
+        if isinstance(request.data, dict):
+            return request.data.get('username')
+        return None
 
     def get_tokens_for_user(self, user):
         refresh = RefreshToken.for_user(user)
@@ -130,8 +238,34 @@ class TokenView(views.APIView):
         if serializer.is_valid():
             username = serializer.data['username']
             confirmation_code = serializer.data['confirmation_code']
-            user = get_object_or_404(User, username=username)
-            if confirmation_code == user.confirmation_code:
+            user = get_object_or_404(
+                User.objects.select_related('confirmation'),
+                username=username,
+            )
+            if check_confirmation_code(user, confirmation_code):
                 token = self.get_tokens_for_user(user)
                 return Response(token, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class MetricsView(views.APIView):
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return HttpResponse(
+            registry.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
+
+
+class SlowQueriesView(views.APIView):
+    """Журнал медленных SQL-запросов, новые первыми."""
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(slow_queries.collect())
+
+    def delete(self, request):
+        slow_queries.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
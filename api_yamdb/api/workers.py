@@ -0,0 +1,39 @@
+import glob
+import os
+import re
+
+
+def pid_alive(pid):
+    if os.name != 'posix':
+        # Вне POSIX os.kill завершает процесс, а не проверяет его.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def worker_files(directory, prefix):
+    """Пары (pid, путь) файлов {prefix}_<pid>.json процессов в directory.
+
+    Файлы завершившихся процессов удаляются: перезапущенные воркеры
+    gunicorn получают новые pid, и каталог иначе рос бы без конца. Живость
+    проверяется по pid, поэтому каталог не должен быть общим для машин
+    или контейнеров.
+    """
+    name = re.compile(rf'{re.escape(prefix)}_(\d+)\.json')
+    for path in glob.glob(os.path.join(directory, f'{prefix}_*.json')):
+        match = name.fullmatch(os.path.basename(path))
+        if match is None:
+            continue
+        pid = int(match.group(1))
+        if pid_alive(pid):
+            yield pid, path
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
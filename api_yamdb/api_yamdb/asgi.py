@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_yamdb.settings')
+# Под ASGI чтение каталога, отзывов и комментариев идёт асинхронно.
+os.environ.setdefault('ASYNC_READ_VIEWS', 'true')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+from api.async_views import StreamingASGIHandler  # noqa: E402
+
+application = StreamingASGIHandler()
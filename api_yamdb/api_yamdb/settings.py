@@ -29,6 +29,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,10 +70,33 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=0)),
     }
 }
 
+# Cache
+# Версии списков и закэшированные пользователи должны быть общими для всех
+# процессов gunicorn, поэтому по умолчанию кэш хранится в БД (таблицу
+# создаёт manage.py createcachetable). С Redis: CACHE_BACKEND=
+# django_redis.cache.RedisCache и CACHE_LOCATION=redis://redis:6379/1.
+# LocMemCache годится только для одного процесса, о нём предупреждает
+# проверка api.W001.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.db.DatabaseCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='yamdb_cache'),
+    }
+}
+
+RESPONSE_CACHE_ALIAS = 'default'
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', default=300))
+
 # Password validation
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -119,21 +143,120 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
+    ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.TokenBucketThrottle',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,
+    # Перед приложением стоит один nginx (infra/nginx): адрес клиента для
+    # ограничителя частоты - последний в X-Forwarded-For, подставленный им.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', default=1)),
 }
 
+AUTH_USER_CACHE_ALIAS = 'default'
+
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', default=60))
+
+BULK_MAX_ITEMS = 10000
+
+# Байесовский рейтинг списков лучших: средняя оценка стягивается к
+# LEADERBOARD_PRIOR_MEAN с весом LEADERBOARD_PRIOR_WEIGHT ревью. После
+# изменения нужен manage.py rebuild_leaderboards.
+LEADERBOARD_PRIOR_MEAN = 6.0
+
+LEADERBOARD_PRIOR_WEIGHT = 5
+
+LEADERBOARD_MIN_REVIEWS = 1
+
+LEADERBOARD_MAX_SIZE = 100
+
+# Похожие произведения (manage.py build_similar_titles): сколько соседей
+# хранить и сколько общих оценивших нужно, чтобы пара считалась похожей.
+SIMILAR_TITLES_COUNT = 20
+
+SIMILAR_TITLES_MIN_COMMON = 2
+
+# Удаление произведений и пользователей (reviews.deletion): строк в одной
+# транзакции и число ревью и комментариев, с которого удаление уходит в
+# очередь manage.py run_deletion_jobs.
+DELETION_BATCH_SIZE = 1000
+
+DELETION_BACKGROUND_THRESHOLD = 10000
+
+# Корзины токенов по throttle_scope представлений: ёмкость/период для
+# адреса клиента (ip) и пользователя (user). Ограничиваются только
+# изменяющие запросы.
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', default='true').lower() == 'true'
+
+RATE_LIMITS = {
+    'signup': {'ip': '10/h'},
+    'token': {'ip': '30/h', 'user': '10/h'},
+    'write': {'ip': '300/m', 'user': '60/m'},
+}
+
+# Лента изменений ревью и комментариев (api.changes): события на ответ,
+# период опроса БД ожидающими клиентами, максимальное ожидание long-poll и
+# длительность потока SSE, после которой клиент переподключается.
+CHANGE_FEED_PAGE_SIZE = 100
+
+CHANGE_FEED_POLL_INTERVAL = 1.0
+
+CHANGE_FEED_MAX_WAIT = 25
+
+CHANGE_FEED_STREAM_DURATION = 300
+
+# Потоки с соединениями БД для опроса ленты, отдельно от ASYNC_DB_THREADS.
+CHANGE_FEED_DB_THREADS = int(os.getenv('CHANGE_FEED_DB_THREADS', default=4))
+
+# События старше срока удаляет manage.py compact_changes.
+CHANGE_FEED_RETENTION = datetime.timedelta(days=7)
+
+# Каталог, через который воркеры gunicorn делятся метриками. Без него
+# эндпоинт метрик показывает только процесс, который ответил на запрос.
+# Файлы завершившихся воркеров удаляются по pid, поэтому каталог должен
+# быть своим у каждого контейнера.
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', default=1))
+
+# Запросы к БД дольше порога (секунды) попадают в журнал медленных
+# запросов; для доли из них выполняется EXPLAIN ANALYZE.
+SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', default=0.5))
+
+SLOW_QUERY_EXPLAIN_RATE = float(
+    os.getenv('SLOW_QUERY_EXPLAIN_RATE', default=0.1)
+)
+
+SLOW_QUERY_LOG_SIZE = 200
+
+# Асинхронные представления чтения (включаются в asgi.py) и число
+# потоков с соединениями БД, в которых они выполняются.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', default='false').lower() == 'true'
+
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', default=16))
+
+# Строк за одно чтение серверного курсора в потоковой выгрузке.
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', default=2000))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': datetime.timedelta(hours=24),
     'REFRESH_TOKEN_LIFETIME': datetime.timedelta(days=31),
 }
 
+CONFIRMATION_CODE_LIFETIME = datetime.timedelta(hours=24)
+
+CONFIRMATION_CODE_MAX_ATTEMPTS = 5
+
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 DEFAULT_FROM_EMAIL = 'YourConfirmationCode@google.ru'
 
+# queue - письма копятся в OutgoingEmail и уходят командой send_emails,
+# inline - отправка прямо в запросе регистрации.
+EMAIL_DELIVERY = os.getenv('EMAIL_DELIVERY', default='queue')
+
 AUTH_USER_MODEL = 'users.User'
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Category, Comment, Genre, GenreTitle, Review, Title
+from .models import (Category, Comment, DeletionJob, Genre, GenreTitle,
+                     ImportProgress, Review, Title)
 
 
 class GenreInline(admin.TabularInline):
@@ -17,3 +18,5 @@ admin.site.register(Title, TitleAdmin)
 admin.site.register(GenreTitle)
 admin.site.register(Review)
 admin.site.register(Comment)
+admin.site.register(DeletionJob)
+admin.site.register(ImportProgress)
@@ -0,0 +1,138 @@
+from api.cache import bump_version_on_commit
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from users.models import User, get_deleted_user
+
+from .models import Comment, DeletionJob, Review, Title
+
+
+def delete_rows(model, field, ids):
+    """DELETE строк model, у которых field входит в ids; число строк.
+
+    Обычный SQL через connection.cursor(): QuerySet.delete() собрал бы
+    строки в Python и отправил сигналы каждой из них. Счётчики, кэш и
+    связанные таблицы вызывающий код поддерживает сам.
+    """
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    column = quote(model._meta.get_field(field).column)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {column} IN ({placeholders})', ids
+        )
+        return cursor.rowcount
+
+
+def delete_title(title_id, batch_size):
+    """Удаляет произведение; возвращает число удалённых строк.
+
+    Ревью с комментариями удаляются пачками по batch_size, каждая в своей
+    транзакции. Остальное - ревью, записанные во время удаления, жанры,
+    места в рейтингах и похожие - удаляет каскад вместе с произведением.
+    События ленты об удалении ревью не пишутся: списки удалённого
+    произведения отвечают 404.
+    """
+    reviews = Review.objects.filter(title_id=title_id).order_by(
+        'pk'
+    ).values_list('pk', flat=True)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(reviews[:batch_size])
+            if not batch:
+                break
+            deleted += delete_rows(Comment, 'review', batch)
+            deleted += delete_rows(Review, 'id', batch)
+            # Списки ревью и комментариев кэшируются по версии произведения.
+            bump_version_on_commit('title', title_id)
+    with transaction.atomic():
+        # Списки, в которых было произведение, пересчитает
+        # build_similar_titles.
+        Title.objects.filter(similar_titles__similar_id=title_id).update(
+            similar_stale=True
+        )
+        deleted += Title.objects.filter(pk=title_id).delete()[0]
+    return deleted
+
+
+def anonymize_author(user_id, batch_size):
+    """Передаёт ревью и комментарии пользователя заглушке.
+
+    Строки меняются UPDATE пачками по batch_size. Оценки остаются,
+    поэтому агрегаты и рейтинги произведений не меняются; похожие для
+    произведений с ревью пользователя пересчитает build_similar_titles.
+    """
+    sentinel = get_deleted_user()
+    if sentinel.pk == user_id:
+        raise ValueError('Заглушку удалённых пользователей удалить нельзя.')
+    moved = 0
+    for model in (Review, Comment):
+        rows = model.objects.filter(author_id=user_id).order_by(
+            'pk'
+        ).values_list('pk', flat=True)
+        while True:
+            with transaction.atomic():
+                batch = list(rows[:batch_size])
+                if not batch:
+                    break
+                changes = {'author': sentinel}
+                if model is Review:
+                    Title.objects.filter(reviews__pk__in=batch).update(
+                        similar_stale=True
+                    )
+                    changes['anonymized'] = True
+                moved += model.objects.filter(pk__in=batch).update(**changes)
+                # Имя автора входит в закэшированные страницы списков.
+                bump_version_on_commit('users', 'all')
+    return moved
+
+
+def delete_user(user_id, batch_size):
+    """Удаляет пользователя; возвращает число изменённых строк.
+
+    Внешние ключи авторов - PROTECT, поэтому ревью, записанные после
+    пачек anonymize_author, передаются заглушке в транзакции удаления.
+    """
+    rows = anonymize_author(user_id, batch_size)
+    with transaction.atomic():
+        rows += anonymize_author(user_id, batch_size)
+        rows += User.objects.filter(pk=user_id).delete()[0]
+    return rows
+
+
+DELETERS = {
+    DeletionJob.TITLE: delete_title,
+    DeletionJob.USER: delete_user,
+}
+
+
+def deletion_size(kind, object_id):
+    if kind == DeletionJob.TITLE:
+        totals = Review.objects.filter(title_id=object_id).aggregate(
+            reviews=Count('pk'), comments=Sum('comment_count')
+        )
+        return totals['reviews'] + (totals['comments'] or 0)
+    return (Review.objects.filter(author_id=object_id).count()
+            + Comment.objects.filter(author_id=object_id).count())
+
+
+def schedule_deletion(kind, object_id):
+    """Удаляет объект сразу или ставит задачу; возвращает задачу или None.
+
+    В очередь уходят объекты, у которых ревью и комментариев не меньше
+    DELETION_BACKGROUND_THRESHOLD. Пользователь в очереди сразу теряет
+    доступ к API.
+    """
+    if deletion_size(kind, object_id) < settings.DELETION_BACKGROUND_THRESHOLD:
+        DELETERS[kind](object_id, settings.DELETION_BATCH_SIZE)
+        return None
+    with transaction.atomic():
+        if kind == DeletionJob.USER:
+            user = User.objects.get(pk=object_id)
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+        return DeletionJob.objects.get_or_create(
+            kind=kind, object_id=object_id, status__in=DeletionJob.ACTIVE
+        )[0]
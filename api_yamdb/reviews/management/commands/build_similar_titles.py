@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from reviews.similarity import build_similar_titles
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие произведения по косинусной близости оценок '
+        'пользователей. По умолчанию - только списки, затронутые ревью с '
+        'прошлого запуска; --full пересчитывает все.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+        parser.add_argument(
+            '--batch-size', type=int, default=50000,
+            help='Ревью в одной пачке чтения.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=256,
+            help='Произведений в одной пачке расчёта: ограничивает память.',
+        )
+
+    def handle(self, *args, **options):
+        written = build_similar_titles(
+            full=options['full'],
+            batch_size=options['batch_size'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано пар похожих произведений: {written}.'
+        ))
@@ -1,29 +1,223 @@
 import csv
+import os
+import time
+from io import StringIO
+from itertools import islice
 
-from django.core.management.base import BaseCommand
-from reviews.models import Category, Comment, Genre, Genre_Title, Review, Title
+from api.cache import bump_version_on_commit
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from reviews.models import (Category, Comment, Genre, GenreTitle,
+                            ImportProgress, Review, Title)
 from users.models import User
 
 FILESPATH = {
     Category: 'category.csv',
     Genre: 'genre.csv',
     Title: 'titles.csv',
-    Genre_Title: 'genre_title.csv',
+    GenreTitle: 'genre_title.csv',
     User: 'users.csv',
     Review: 'review.csv',
     Comment: 'comments.csv',
 }
 
+COPY_NULL = r'\N'
+
 
 class Command(BaseCommand):
+    help = (
+        'Потоково загружает CSV из static/data пачками. На PostgreSQL '
+        'используется COPY, на остальных СУБД - executemany. С --resume '
+        'пропускаются строки, зафиксированные прошлым запуском: их число '
+        'для каждого файла хранится в ImportProgress.'
+    )
 
-    def handle(self, *args, **options):
-        for key, value in FILESPATH.items():
-            with open(f'static/data/{value}', 'r', encoding='utf-8-sig',
-                      newline='') as f:
-                reader = csv.DictReader(f)
-                key.objects.bulk_create(key(**kwargs) for kwargs in reader)
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default='static/data',
+            help='Каталог с CSV-файлами.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество строк в одной вставке.',
+        )
+        parser.add_argument(
+            '--commit', choices=('file', 'batch'), default='file',
+            help='Фиксировать транзакцию после файла или после каждой пачки.',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с последней зафиксированной пачки.',
+        )
 
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        self.batch_size = options['batch_size']
+        self.use_copy = connection.vendor == 'postgresql'
+        for model, filename in FILESPATH.items():
+            path = os.path.join(options['path'], filename)
+            progress, _ = ImportProgress.objects.get_or_create(
+                filename=filename
+            )
+            if not options['resume']:
+                progress.rows = 0
+                progress.save(update_fields=['rows'])
+            if options['commit'] == 'file':
+                with transaction.atomic():
+                    rows = self.import_file(model, path, progress,
+                                            atomic=False)
+            else:
+                rows = self.import_file(model, path, progress, atomic=True)
+            self.reset_sequence(model)
             self.stdout.write(self.style.SUCCESS(f'Данные модели '
-                                                 f'{key.__name__}'
-                                                 f' импортированы успешно!'))
+                                                 f'{model.__name__}'
+                                                 f' импортированы успешно! '
+                                                 f'({rows} строк)'))
+        # Вставки идут мимо сигналов, поэтому агрегаты пересчитываются здесь.
+        with transaction.atomic():
+            Title.objects.recalculate_ratings()
+            Review.objects.recalculate_comment_counts()
+            bump_version_on_commit('catalog', 'all')
+
+    def import_file(self, model, path, progress, atomic):
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return 0
+            fields = self.get_fields(model, header)
+            defaults = self.get_defaults(model, fields)
+            columns = [field.column for field in fields] + [
+                field.column for field, _ in defaults
+            ]
+            default_values = [value for _, value in defaults]
+            skip = progress.rows
+            if skip:
+                self.stdout.write(f'{model.__name__}: пропуск {skip} '
+                                  f'уже загруженных строк')
+                for _ in islice(reader, skip):
+                    pass
+            started = last_report = time.monotonic()
+            total = 0
+            while True:
+                batch = [
+                    [self.to_python(field, value)
+                     for field, value in zip(fields, row)] + default_values
+                    for row in islice(reader, self.batch_size)
+                ]
+                if not batch:
+                    break
+                total += len(batch)
+                progress.rows = skip + total
+                if atomic:
+                    with transaction.atomic():
+                        self.insert(model, columns, batch)
+                        progress.save(update_fields=['rows'])
+                else:
+                    self.insert(model, columns, batch)
+                now = time.monotonic()
+                if now - last_report >= 1:
+                    last_report = now
+                    self.report(model, skip + total, total, now - started)
+            self.report(model, skip + total, total,
+                        time.monotonic() - started)
+        if not atomic:
+            progress.save(update_fields=['rows'])
+        return total
+
+    def report(self, model, position, rows, elapsed):
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(f'{model.__name__}: {position} строк, '
+                          f'{rate:.0f} строк/с')
+
+    def get_fields(self, model, header):
+        """Сопоставляет столбцы CSV полям модели, FK пишутся в *_id."""
+        fields = []
+        for name in header:
+            try:
+                field = model._meta.get_field(name.strip())
+            except FieldDoesNotExist:
+                raise CommandError(
+                    f'{model.__name__}: неизвестный столбец {name!r}'
+                )
+            if not field.concrete or field.many_to_many:
+                raise CommandError(
+                    f'{model.__name__}: столбец {name!r} не хранится '
+                    f'в таблице'
+                )
+            fields.append(field)
+        return fields
+
+    def get_defaults(self, model, fields):
+        """Значения для столбцов, которых нет в CSV."""
+        defaults = []
+        now = timezone.now()
+        for field in model._meta.concrete_fields:
+            if field in fields or field.primary_key:
+                continue
+            if getattr(field, 'auto_now', False) or getattr(
+                    field, 'auto_now_add', False):
+                value = now
+            else:
+                value = field.get_default()
+            defaults.append((field, self.prepare(field, value)))
+        return defaults
+
+    def to_python(self, field, value):
+        if value == '' and field.null:
+            return None
+        if field.is_relation:
+            value = field.target_field.to_python(value)
+        else:
+            value = field.to_python(value)
+        return self.prepare(field, value)
+
+    def prepare(self, field, value):
+        if self.use_copy:
+            return value
+        return field.get_db_prep_save(value, connection)
+
+    def insert(self, model, columns, batch):
+        table = connection.ops.quote_name(model._meta.db_table)
+        names = ', '.join(connection.ops.quote_name(c) for c in columns)
+        with connection.cursor() as cursor:
+            if self.use_copy:
+                buffer = StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows(
+                    [self.copy_value(value) for value in row]
+                    for row in batch
+                )
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY {table} ({names}) FROM STDIN "
+                    f"WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                    buffer,
+                )
+            else:
+                placeholders = ', '.join(['%s'] * len(columns))
+                cursor.executemany(
+                    f'INSERT INTO {table} ({names}) '
+                    f'VALUES ({placeholders})',
+                    batch,
+                )
+
+    def copy_value(self, value):
+        if value is None:
+            return COPY_NULL
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+    def reset_sequence(self, model):
+        statements = connection.ops.sequence_reset_sql(no_style(), [model])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
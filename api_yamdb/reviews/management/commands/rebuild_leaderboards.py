@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from reviews.models import TitleRank
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересоздаёт таблицу рейтинговых списков по хранимым агрегатам '
+        'произведений. Нужна после изменения настроек LEADERBOARD_*.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = TitleRank.objects.rebuild(
+                batch_size=options['batch_size']
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано строк рейтинговых списков: {created}.'
+        ))
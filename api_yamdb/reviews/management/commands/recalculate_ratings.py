@@ -0,0 +1,20 @@
+from api.cache import bump_version_on_commit
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from reviews.models import Review, Title
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает хранимые рейтинги и гистограммы оценок произведений '
+        'и число комментариев ревью.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = Title.objects.recalculate_ratings()
+            Review.objects.recalculate_comment_counts()
+            bump_version_on_commit('catalog', 'all')
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинги пересчитаны для {updated} произведений.'
+        ))
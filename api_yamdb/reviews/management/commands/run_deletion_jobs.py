@@ -0,0 +1,77 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from reviews.deletion import DELETERS
+from reviews.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет задачи DeletionJob: удаляет большие произведения и '
+        'пользователей пачками, вне запроса DELETE.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.DELETION_BATCH_SIZE,
+            help='Строк в одной транзакции.',
+        )
+        parser.add_argument(
+            '--requeue', action='store_true',
+            help='Вернуть в очередь задачи, оставшиеся выполняющимися '
+                 'после остановки воркера.',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться, а ждать новые задачи.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Пауза между проверками пустой очереди в режиме --loop.',
+        )
+
+    def handle(self, *args, **options):
+        if options['requeue']:
+            DeletionJob.objects.filter(status=DeletionJob.RUNNING).update(
+                status=DeletionJob.PENDING
+            )
+        while True:
+            job = self.claim()
+            if job is not None:
+                self.run(job, options['batch_size'])
+                self.stdout.write(str(job))
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def claim(self):
+        with transaction.atomic():
+            queryset = DeletionJob.objects.filter(
+                status=DeletionJob.PENDING
+            ).order_by('pk')
+            if connection.features.has_select_for_update_skip_locked:
+                # Несколько воркеров берут разные задачи без ожидания.
+                queryset = queryset.select_for_update(skip_locked=True)
+            job = queryset.first()
+            if job is not None:
+                job.status = DeletionJob.RUNNING
+                job.save(update_fields=['status'])
+        return job
+
+    def run(self, job, batch_size):
+        # Пачки уже удалённых строк зафиксированы, поэтому задачу с
+        # ошибкой можно поставить заново повторным DELETE.
+        try:
+            job.rows = DELETERS[job.kind](job.object_id, batch_size)
+        except Exception as error:
+            job.status = DeletionJob.FAILED
+            job.last_error = str(error)
+        else:
+            job.status = DeletionJob.DONE
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'rows', 'last_error',
+                                'finished_at'])
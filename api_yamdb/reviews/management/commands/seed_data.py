@@ -0,0 +1,168 @@
+import random
+
+from api.cache import bump_version_on_commit
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from reviews.models import Category, Comment, Genre, GenreTitle, Review, Title
+from users.models import User
+
+SEED_PREFIX = 'seed'
+
+# Слова названий синтетических произведений; их же ищет bench_search.
+WORDS = (
+    'звёздные', 'войны', 'хроники', 'марсианские', 'властелин', 'колец',
+    'тайна', 'третьей', 'планеты', 'винни', 'пух', 'давеча', 'сюита',
+    'matrix', 'reloaded', 'godfather', 'pulp', 'fiction', 'shawshank',
+    'redemption', 'interstellar', 'inception', 'gladiator', 'amadeus',
+)
+
+
+def zipf_weights(count, exponent):
+    """Веса рангов по закону Ципфа: первые элементы заметно популярнее."""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def new_ids(model, after):
+    # bulk_create на SQLite не возвращает id, поэтому они перечитываются.
+    return list(
+        model.objects.filter(pk__gt=after).order_by('pk').values_list(
+            'pk', flat=True
+        )
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическим каталогом для нагрузочного теста. '
+        'Популярность произведений и активность пользователей распределены '
+        'по Ципфу. Вставка идёт пачками через bulk_create, рейтинги '
+        'пересчитываются в конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--genres', type=int, default=30)
+        parser.add_argument('--titles', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=40000)
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель распределения Ципфа.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(
+                username__startswith=f'{SEED_PREFIX}_user').exists():
+            raise CommandError('Синтетические данные уже загружены.')
+        if options['reviews'] > options['titles'] * options['users']:
+            raise CommandError('Ревью больше, чем пар пользователь - '
+                               'произведение.')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.skew = options['skew']
+        with transaction.atomic():
+            categories = self.create(Category, [
+                Category(name=f'Категория {i}', slug=f'{SEED_PREFIX}-cat-{i}')
+                for i in range(options['categories'])
+            ])
+            genres = self.create(Genre, [
+                Genre(name=f'Жанр {i}', slug=f'{SEED_PREFIX}-genre-{i}')
+                for i in range(options['genres'])
+            ])
+            users = self.seed_users(options['users'])
+            titles = self.seed_titles(options['titles'], categories, genres)
+            reviews = self.seed_reviews(options['reviews'], titles, users)
+            self.seed_comments(options['comments'], reviews, users)
+            Title.objects.recalculate_ratings()
+            Review.objects.recalculate_comment_counts()
+            bump_version_on_commit('catalog', 'all')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: {len(categories)} категорий, {len(genres)} жанров, '
+            f'{len(titles)} произведений, {len(users)} пользователей, '
+            f'{len(reviews)} ревью, {options["comments"]} комментариев.'
+        ))
+
+    def create(self, model, objects):
+        after = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        for start in range(0, len(objects), self.batch_size):
+            model.objects.bulk_create(
+                objects[start:start + self.batch_size]
+            )
+        return new_ids(model, after)
+
+    def seed_users(self, count):
+        users = [
+            User(username=f'{SEED_PREFIX}_user{i}',
+                 email=f'{SEED_PREFIX}_user{i}@yamdb.ru')
+            for i in range(count)
+        ]
+        users.append(User(username=f'{SEED_PREFIX}_admin',
+                          email=f'{SEED_PREFIX}_admin@yamdb.ru',
+                          role=User.ADMIN))
+        return self.create(User, users)[:count]
+
+    def seed_titles(self, count, categories, genres):
+        rng = self.rng
+        category_weights = zipf_weights(len(categories), self.skew)
+        titles = self.create(Title, [
+            Title(
+                name=' '.join(rng.sample(WORDS, 2) + [str(i)]),
+                year=rng.randint(1900, 2022),
+                category_id=rng.choices(categories, category_weights)[0],
+                description=rng.choice(['', None, 'Описание произведения.']),
+            )
+            for i in range(count)
+        ])
+        genre_weights = zipf_weights(len(genres), self.skew)
+        links = []
+        for title_id in titles:
+            chosen = set(rng.choices(genres, genre_weights,
+                                     k=rng.randint(1, 3)))
+            links.extend(
+                GenreTitle(title_id=title_id, genre_id=genre_id)
+                for genre_id in chosen
+            )
+        self.create(GenreTitle, links)
+        return titles
+
+    def seed_reviews(self, count, titles, users):
+        """Ревью по популярности произведений, не больше одного на пару."""
+        rng = self.rng
+        weights = zipf_weights(len(titles), self.skew)
+        per_title = dict.fromkeys(titles, 0)
+        for title_id in rng.choices(titles, weights, k=count):
+            per_title[title_id] += 1
+        # Излишек самых популярных произведений переносится на следующие.
+        overflow = 0
+        for title_id in titles:
+            per_title[title_id] += overflow
+            overflow = max(per_title[title_id] - len(users), 0)
+            per_title[title_id] -= overflow
+        reviews = [
+            Review(title_id=title_id, author_id=author_id,
+                   text='Синтетический отзыв.',
+                   score=min(10, max(1, round(rng.gauss(7, 2)))))
+            for title_id, reviews_count in per_title.items()
+            for author_id in rng.sample(users, reviews_count)
+        ]
+        return self.create(Review, reviews)
+
+    def seed_comments(self, count, reviews, users):
+        rng = self.rng
+        if not reviews:
+            return
+        comments = [
+            Comment(review_id=review_id, author_id=author_id,
+                    text='Синтетический комментарий.')
+            for review_id, author_id in zip(
+                rng.choices(reviews, zipf_weights(len(reviews), self.skew),
+                            k=count),
+                rng.choices(users, zipf_weights(len(users), self.skew),
+                            k=count),
+            )
+        ]
+        self.create(Comment, comments)
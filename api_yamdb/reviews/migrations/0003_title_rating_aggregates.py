@@ -0,0 +1,51 @@
+# Generated by Django 3.2 on 2026-10-18 13:13
+
+from django.db import migrations, models
+from django.db.models import (Count, ExpressionWrapper, IntegerField,
+                              OuterRef, Subquery, Sum)
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    Title = apps.get_model('reviews', 'Title')
+    Review = apps.get_model('reviews', 'Review')
+    reviews = Review.objects.filter(
+        title=OuterRef('pk')
+    ).order_by().values('title')
+    Title.objects.update(
+        score_sum=Coalesce(Subquery(
+            reviews.annotate(total=Sum('score')).values('total')
+        ), 0),
+        review_count=Coalesce(Subquery(
+            reviews.annotate(total=Count('pk')).values('total')
+        ), 0),
+        rating=Subquery(reviews.annotate(total=ExpressionWrapper(
+            Sum('score') / Count('pk'), output_field=IntegerField()
+        )).values('total')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='rating',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='Рейтинг'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество ревью'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='score_sum',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Сумма оценок'),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
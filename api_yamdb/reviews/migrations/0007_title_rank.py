@@ -0,0 +1,67 @@
+# Generated by Django 3.2 on 2026-10-18 13:54
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_title_ranks(apps, schema_editor):
+    from reviews.models import bayesian_score
+
+    Title = apps.get_model('reviews', 'Title')
+    GenreTitle = apps.get_model('reviews', 'GenreTitle')
+    TitleRank = apps.get_model('reviews', 'TitleRank')
+    genres = defaultdict(set)
+    for title_id, genre_id in GenreTitle.objects.values_list(
+            'title_id', 'genre_id').iterator():
+        genres[title_id].add(genre_id)
+    ranks = []
+    for row in Title.objects.values(
+            'pk', 'year', 'category_id', 'score_sum', 'review_count'
+    ).iterator():
+        boards = [('all', 0), ('category', row['category_id']),
+                  ('year', row['year'])]
+        boards += [('genre', genre_id) for genre_id in genres[row['pk']]]
+        score = bayesian_score(row['score_sum'], row['review_count'])
+        ranks.extend(
+            TitleRank(board=board, key=key, title_id=row['pk'],
+                      score_sum=row['score_sum'],
+                      review_count=row['review_count'], score=score)
+            for board, key in boards
+        )
+        if len(ranks) >= 5000:
+            TitleRank.objects.bulk_create(ranks)
+            ranks = []
+    TitleRank.objects.bulk_create(ranks)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0006_default_ordering_and_genre_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TitleRank',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('all', 'Все произведения'), ('genre', 'Жанр'), ('category', 'Категория'), ('year', 'Год')], max_length=10, verbose_name='Список')),
+                ('key', models.IntegerField(verbose_name='id жанра или категории, год')),
+                ('score_sum', models.PositiveBigIntegerField(verbose_name='Сумма оценок')),
+                ('review_count', models.PositiveIntegerField(verbose_name='Количество ревью')),
+                ('score', models.FloatField(verbose_name='Байесовский рейтинг')),
+                ('title', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ranks', to='reviews.title', verbose_name='Произведение')),
+            ],
+            options={
+                'verbose_name': 'Место в рейтинге',
+                'verbose_name_plural': 'Места в рейтингах',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='titlerank',
+            index=models.Index(fields=['board', 'key', '-score', 'title'], name='title_rank_board_idx'),
+        ),
+        migrations.RunPython(fill_title_ranks, migrations.RunPython.noop),
+    ]
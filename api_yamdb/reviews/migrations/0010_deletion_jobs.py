@@ -0,0 +1,64 @@
+# Generated by Django 3.2 on 2026-10-18 14:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reviews', '0009_score_histogram_comment_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('title', 'Произведение'), ('user', 'Пользователь')], max_length=10, verbose_name='Объект')),
+                ('object_id', models.BigIntegerField(verbose_name='id объекта')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('running', 'Выполняется'), ('done', 'Выполнено'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('rows', models.PositiveBigIntegerField(default=0, verbose_name='Удалено или передано строк')),
+                ('last_error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Поставлено в очередь')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+            ],
+            options={
+                'verbose_name': 'Задача удаления',
+                'verbose_name_plural': 'Задачи удаления',
+            },
+        ),
+        migrations.RemoveConstraint(
+            model_name='review',
+            name='unique_review',
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='anonymized',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Автор удалён'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='comments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='reviews', to=settings.AUTH_USER_MODEL, verbose_name='Автор ревью'),
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(condition=models.Q(anonymized=False), fields=('title', 'author'), name='unique_review'),
+        ),
+        migrations.AddIndex(
+            model_name='deletionjob',
+            index=models.Index(fields=['status', 'id'], name='deletion_job_queue_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='deletionjob',
+            constraint=models.UniqueConstraint(condition=models.Q(status__in=('pending', 'running')), fields=('kind', 'object_id'), name='deletion_job_active'),
+        ),
+    ]
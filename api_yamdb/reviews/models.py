@@ -1,5 +1,11 @@
+from collections import defaultdict
+
+from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (Case, Count, ExpressionWrapper, F, OuterRef, Q,
+                              Subquery, Sum, Value, When)
+from django.db.models.functions import Coalesce
 from users.models import User
 
 from .validators import validate_year
@@ -38,8 +44,106 @@ class Genre(models.Model):
         return self.name
 
 
-class Title(models.Model):
+# Гистограмма оценок произведения: число ревью с оценкой 1, 2, ... 10.
+SCORE_FIELDS = tuple(f'score_{score}' for score in range(1, 11))
+
+
+class CounterFieldsMixin:
+    """save() существующей строки не пишет поля counter_fields.
+
+    Их меняют только UPDATE с F(), а экземпляр, загруженный до
+    параллельной записи, иначе затёр бы её своими старыми значениями.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            skipped = {*self.counter_fields, *self.get_deferred_fields()}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+class TitleQuerySet(models.QuerySet):
+
+    def update_rating(self, added=None, removed=None):
+        """Учитывает оценку added и снимает оценку removed одним UPDATE.
+
+        Сдвигаются сумма, число ревью, рейтинг и счётчики гистограммы. Все
+        правые части считаются по старым значениям строки, поэтому
+        параллельные записи ревью не теряют обновления друг друга. Тем же
+        UPDATE произведение помечается для пересчёта похожих.
+        """
+        score_delta = (added or 0) - (removed or 0)
+        count_delta = (added is not None) - (removed is not None)
+        histogram = defaultdict(int)
+        if added is not None:
+            histogram[added] += 1
+        if removed is not None:
+            histogram[removed] -= 1
+        rating = ExpressionWrapper(
+            (F('score_sum') + score_delta) / (F('review_count') + count_delta),
+            output_field=models.IntegerField(),
+        )
+        if count_delta < 0:
+            rating = Case(
+                When(review_count=-count_delta, then=Value(None)),
+                default=rating,
+            )
+        return self.update(
+            score_sum=F('score_sum') + score_delta,
+            review_count=F('review_count') + count_delta,
+            rating=rating,
+            similar_stale=True,
+            **{
+                f'score_{score}': F(f'score_{score}') + delta
+                for score, delta in histogram.items() if delta
+            },
+        )
+
+    def recalculate_ratings(self):
+        """Пересчитывает агрегаты рейтинга и строки рейтинговых списков."""
+        reviews = Review.objects.filter(
+            title=OuterRef('pk')
+        ).order_by().values('title')
+        score_sum = reviews.annotate(total=Sum('score')).values('total')
+        review_count = reviews.annotate(total=Count('pk')).values('total')
+        rating = reviews.annotate(
+            total=ExpressionWrapper(
+                Sum('score') / Count('pk'),
+                output_field=models.IntegerField(),
+            )
+        ).values('total')
+        histogram = {
+            name: Coalesce(Subquery(
+                reviews.filter(score=score).annotate(
+                    total=Count('pk')
+                ).values('total')
+            ), 0)
+            for score, name in enumerate(SCORE_FIELDS, start=1)
+        }
+        updated = self.update(
+            score_sum=Coalesce(Subquery(score_sum), 0),
+            review_count=Coalesce(Subquery(review_count), 0),
+            rating=Subquery(rating),
+            similar_stale=True,
+            **histogram,
+        )
+        if updated:
+            TitleRank.objects.rebuild(self)
+        return updated
+
+
+class Title(CounterFieldsMixin, models.Model):
     """Это - произведения с годом их выпуска и категорией произведения"""
+    counter_fields = (
+        'score_sum', 'review_count', 'rating', 'similar_stale',
+        *SCORE_FIELDS,
+    )
 
     name = models.CharField(max_length=256,
                             verbose_name='Название фильма')
@@ -65,14 +169,98 @@ class Title(models.Model):
         null=True,
         verbose_name='Описание',
     )
+    score_sum = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Сумма оценок',
+    )
+    review_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество ревью',
+    )
+    rating = models.PositiveSmallIntegerField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Рейтинг',
+    )
+    similar_stale = models.BooleanField(
+        default=True,
+        editable=False,
+        verbose_name='Похожие устарели',
+    )
+    # Гистограмма оценок: поля перечислены в SCORE_FIELDS.
+    score_1 = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Ревью с оценкой 1',
+    )
+    score_2 = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Ревью с оценкой 2',
+    )
+    score_3 = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Ревью с оценкой 3',
+    )
+    score_4 = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Ревью с оценкой 4',
+    )
+    score_5 = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Ревью с оценкой 5',
+    )
+    score_6 = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Ревью с оценкой 6',
+    )
+    score_7 = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Ревью с оценкой 7',
+    )
+    score_8 = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Ревью с оценкой 8',
+    )
+    score_9 = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Ревью с оценкой 9',
+    )
+    score_10 = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Ревью с оценкой 10',
+    )
+
+    objects = TitleQuerySet.as_manager()
 
     class Meta:
+        ordering = ('id',)
         verbose_name = 'Произведение'
         verbose_name_plural = 'Произведения'
+        indexes = [
+            # Частичный индекс: в нём только ждущие пересчёта похожих.
+            models.Index(fields=['id'], condition=Q(similar_stale=True),
+                         name='title_similar_stale_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def score_histogram(self):
+        return [getattr(self, name) for name in SCORE_FIELDS]
+
 
 class GenreTitle(models.Model):
     """Это - таблица многие ко многим, связывающая Genre и Title"""
@@ -92,13 +280,203 @@ class GenreTitle(models.Model):
     class Meta:
         verbose_name = 'Жанр: Произведение'
         verbose_name_plural = 'Жанр: Произведение'
+        indexes = [
+            models.Index(fields=['genre', 'title'],
+                         name='genre_title_genre_idx'),
+        ]
 
     def __str__(self):
         return f'{str(self.genre)}: {str(self.title)}'
 
 
-class Review(models.Model):
+def bayesian_score(score_sum, review_count):
+    """Средняя оценка, стянутая к LEADERBOARD_PRIOR_MEAN.
+
+    Приор весит как LEADERBOARD_PRIOR_WEIGHT ревью, поэтому пара
+    десяток не обгоняет сотню девяток.
+    """
+    weight = settings.LEADERBOARD_PRIOR_WEIGHT
+    return (
+        (settings.LEADERBOARD_PRIOR_MEAN * weight + score_sum)
+        / (weight + review_count)
+    )
+
+
+class TitleRankQuerySet(models.QuerySet):
+
+    def shift(self, score_delta, count_delta):
+        """Сдвигает агрегаты и балл строк одним UPDATE, как update_rating."""
+        weight = float(settings.LEADERBOARD_PRIOR_WEIGHT)
+        score = ExpressionWrapper(
+            (Value(settings.LEADERBOARD_PRIOR_MEAN * weight)
+             + F('score_sum') + score_delta)
+            / (Value(weight) + F('review_count') + count_delta),
+            output_field=models.FloatField(),
+        )
+        return self.update(
+            score_sum=F('score_sum') + score_delta,
+            review_count=F('review_count') + count_delta,
+            score=score,
+        )
+
+    def rebuild(self, titles=None, batch_size=5000):
+        """Пересоздаёт строки списков для произведений titles (всех).
+
+        Произведения читаются пачками по id, строки вставляются
+        bulk_create. Возвращает число созданных строк.
+        """
+        if titles is None:
+            titles = Title.objects.all()
+            self.all().delete()
+        else:
+            self.filter(title__in=titles.values('pk')).delete()
+        titles = titles.order_by('pk').values(
+            'pk', 'year', 'category_id', 'score_sum', 'review_count'
+        )
+        created = 0
+        last = 0
+        while True:
+            batch = list(titles.filter(pk__gt=last)[:batch_size])
+            if not batch:
+                return created
+            last = batch[-1]['pk']
+            genres = GenreTitle.objects.filter(
+                title_id__gte=batch[0]['pk'], title_id__lte=last
+            ).values_list('title_id', 'genre_id')
+            boards = {
+                row['pk']: [
+                    (TitleRank.ALL, 0),
+                    (TitleRank.CATEGORY, row['category_id']),
+                    (TitleRank.YEAR, row['year']),
+                ]
+                for row in batch
+            }
+            for title_id, genre_id in genres:
+                if title_id in boards:
+                    boards[title_id].append((TitleRank.GENRE, genre_id))
+            for title_id, title_boards in boards.items():
+                boards[title_id] = dict.fromkeys(title_boards)
+            ranks = [
+                TitleRank(
+                    board=board, key=key, title_id=row['pk'],
+                    score_sum=row['score_sum'],
+                    review_count=row['review_count'],
+                    score=bayesian_score(row['score_sum'],
+                                         row['review_count']),
+                )
+                for row in batch
+                for board, key in boards[row['pk']]
+            ]
+            self.bulk_create(ranks, batch_size=batch_size)
+            created += len(ranks)
+
+
+class TitleRank(models.Model):
+    """Строка рейтингового списка: всех произведений, жанра, категории
+    или года.
+
+    У произведения по строке на каждый свой список. Индекс по
+    (board, key, -score) отдаёт первые места списка без агрегации ревью.
+    """
+
+    ALL = 'all'
+    GENRE = 'genre'
+    CATEGORY = 'category'
+    YEAR = 'year'
+
+    BOARDS = [
+        (ALL, 'Все произведения'),
+        (GENRE, 'Жанр'),
+        (CATEGORY, 'Категория'),
+        (YEAR, 'Год'),
+    ]
+    board = models.CharField(
+        max_length=10,
+        choices=BOARDS,
+        verbose_name='Список',
+    )
+    key = models.IntegerField(
+        verbose_name='id жанра или категории, год',
+    )
+    title = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='ranks',
+        verbose_name='Произведение',
+    )
+    score_sum = models.PositiveBigIntegerField(
+        verbose_name='Сумма оценок',
+    )
+    review_count = models.PositiveIntegerField(
+        verbose_name='Количество ревью',
+    )
+    score = models.FloatField(
+        verbose_name='Байесовский рейтинг',
+    )
+
+    objects = TitleRankQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Место в рейтинге'
+        verbose_name_plural = 'Места в рейтингах'
+        indexes = [
+            models.Index(fields=['board', 'key', '-score', 'title'],
+                         name='title_rank_board_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.board} {self.key}: {self.title_id} ({self.score:.2f})'
+
+
+class SimilarTitle(models.Model):
+    """Сосед произведения по оценкам пользователей.
+
+    Строки считает manage.py build_similar_titles (reviews.similarity),
+    индекс по (title, -score) отдаёт соседей одним запросом.
+    """
+    title = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='similar_titles',
+        verbose_name='Произведение',
+    )
+    similar = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожее произведение',
+    )
+    score = models.FloatField(
+        verbose_name='Косинусная близость',
+    )
+
+    class Meta:
+        verbose_name = 'Похожее произведение'
+        verbose_name_plural = 'Похожие произведения'
+        indexes = [
+            models.Index(fields=['title', '-score', 'similar'],
+                         name='similar_title_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.title_id} ~ {self.similar_id} ({self.score:.3f})'
+
+
+class ReviewQuerySet(models.QuerySet):
+
+    def recalculate_comment_counts(self):
+        """Пересчитывает хранимое число комментариев ревью."""
+        comments = Comment.objects.filter(
+            review=OuterRef('pk')
+        ).order_by().values('review').annotate(
+            total=Count('pk')
+        ).values('total')
+        return self.update(comment_count=Coalesce(Subquery(comments), 0))
+
+
+class Review(CounterFieldsMixin, models.Model):
     """Это - ревью к произведению"""
+    counter_fields = ('comment_count',)
 
     title = models.ForeignKey(
         Title,
@@ -109,9 +487,11 @@ class Review(models.Model):
     text = models.TextField(
         verbose_name='Текст ревью',
     )
+    # Пользователя с ревью удалить нельзя: reviews.deletion сначала
+    # передаёт его ревью и комментарии заглушке UPDATE пачками.
     author = models.ForeignKey(
         User,
-        on_delete=models.SET("deleted"),
+        on_delete=models.PROTECT,
         related_name='reviews',
         verbose_name='Автор ревью',
     )
@@ -120,18 +500,53 @@ class Review(models.Model):
         verbose_name='Оценка',
     )
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+    )
+    anonymized = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Автор удалён',
+    )
+
+    objects = ReviewQuerySet.as_manager()
 
     class Meta:
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Ревью'
         verbose_name_plural = 'Ревью'
         constraints = [
+            # У заглушки удалённых авторов много ревью одного произведения.
             models.UniqueConstraint(fields=['title', 'author'],
+                                    condition=Q(anonymized=False),
                                     name='unique_review'),
         ]
+        indexes = [
+            models.Index(fields=['title', 'pub_date', 'id'],
+                         name='review_title_pub_date_idx'),
+            # Частичный unique_review не годится для проверки «одно ревью
+            # на произведение» в ReviewSerializer.validate.
+            models.Index(fields=['title', 'author'],
+                         name='review_title_author_idx'),
+        ]
 
     def __str__(self):
         return self.text
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_score = instance.__dict__.get('score')
+        instance._loaded_title_id = instance.__dict__.get('title_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Агрегаты произведения обновляются в post_save, в той же транзакции.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     """Это - комментарии к ревью фильма"""
@@ -143,13 +558,126 @@ class Comment(models.Model):
     )
     text = models.TextField()
     author = models.ForeignKey(
-        User, on_delete=models.SET("deleted"), related_name='comments'
+        User, on_delete=models.PROTECT, related_name='comments'
     )
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
 
     class Meta:
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Комментарий к ревью'
         verbose_name_plural = 'Комментарии к ревью'
+        indexes = [
+            models.Index(fields=['review', 'pub_date', 'id'],
+                         name='comment_review_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text
+
+    def save(self, *args, **kwargs):
+        # Счётчик ревью и событие ленты пишутся в post_save, в той же
+        # транзакции.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class DeletionJob(models.Model):
+    """Фоновое удаление произведения или пользователя.
+
+    Задачи ставит reviews.deletion, когда строк для удаления больше
+    DELETION_BACKGROUND_THRESHOLD, а выполняет manage.py run_deletion_jobs.
+    """
+
+    TITLE = 'title'
+    USER = 'user'
+    KINDS = [
+        (TITLE, 'Произведение'),
+        (USER, 'Пользователь'),
+    ]
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнено'),
+        (FAILED, 'Ошибка'),
+    ]
+    ACTIVE = (PENDING, RUNNING)
+    kind = models.CharField(
+        max_length=10,
+        choices=KINDS,
+        verbose_name='Объект',
+    )
+    object_id = models.BigIntegerField(
+        verbose_name='id объекта',
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус',
+    )
+    rows = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Удалено или передано строк',
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка',
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Поставлено в очередь',
+    )
+    finished_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Завершено',
+    )
+
+    class Meta:
+        verbose_name = 'Задача удаления'
+        verbose_name_plural = 'Задачи удаления'
+        constraints = [
+            # Повторный DELETE не ставит вторую задачу на тот же объект.
+            models.UniqueConstraint(
+                fields=['kind', 'object_id'],
+                condition=Q(status__in=('pending', 'running')),
+                name='deletion_job_active',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'id'],
+                         name='deletion_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}: {self.status}'
+
+
+class ImportProgress(models.Model):
+    """Сколько строк CSV-файла import_csv уже зафиксировал.
+
+    Счётчик меняется в той же транзакции, что и вставка пачки, поэтому
+    --resume продолжает ровно с первой незафиксированной строки, даже
+    если в таблице были строки не из файла.
+    """
+
+    filename = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Файл',
+    )
+    rows = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Загружено строк',
+    )
+
+    class Meta:
+        verbose_name = 'Прогресс импорта'
+        verbose_name_plural = 'Прогресс импорта'
+
+    def __str__(self):
+        return f'{self.filename}: {self.rows}'
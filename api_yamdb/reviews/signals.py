@@ -0,0 +1,90 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Category, Comment, Genre, Review, Title, TitleRank
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    titles = Title.objects.filter(pk=instance.title_id)
+    ranks = TitleRank.objects.filter(title_id=instance.title_id)
+    if created:
+        titles.update_rating(added=instance.score)
+        ranks.shift(instance.score, 1)
+    else:
+        old_score = getattr(instance, '_loaded_score', None)
+        old_title_id = getattr(instance, '_loaded_title_id', None)
+        if old_score is None or old_title_id is None:
+            titles.recalculate_ratings()
+        elif old_title_id != instance.title_id:
+            # Ревью перенесено: оценка снимается со старого произведения.
+            Title.objects.filter(pk=old_title_id).update_rating(
+                removed=old_score
+            )
+            TitleRank.objects.filter(title_id=old_title_id).shift(
+                -old_score, -1
+            )
+            titles.update_rating(added=instance.score)
+            ranks.shift(instance.score, 1)
+        elif old_score != instance.score:
+            titles.update_rating(added=instance.score, removed=old_score)
+            ranks.shift(instance.score - old_score, 0)
+    instance._loaded_score = instance.score
+    instance._loaded_title_id = instance.title_id
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    Title.objects.filter(pk=instance.title_id).update_rating(
+        removed=instance.score
+    )
+    TitleRank.objects.filter(title_id=instance.title_id).shift(
+        -instance.score, -1
+    )
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Review.objects.filter(pk=instance.review_id).update(
+            comment_count=F('comment_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    Review.objects.filter(pk=instance.review_id).update(
+        comment_count=F('comment_count') - 1
+    )
+
+
+@receiver(post_save, sender=Title)
+def title_saved(sender, instance, raw=False, **kwargs):
+    # Категория и год могли смениться: строки списков пересоздаются.
+    if not raw:
+        TitleRank.objects.rebuild(Title.objects.filter(pk=instance.pk))
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def title_genres_changed(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        TitleRank.objects.rebuild(Title.objects.filter(pk=instance.pk))
+    elif action == 'post_clear':
+        TitleRank.objects.filter(
+            board=TitleRank.GENRE, key=instance.pk
+        ).delete()
+    else:
+        TitleRank.objects.rebuild(Title.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Category)
+def board_deleted(sender, instance, **kwargs):
+    board = TitleRank.GENRE if sender is Genre else TitleRank.CATEGORY
+    TitleRank.objects.filter(board=board, key=instance.pk).delete()
@@ -0,0 +1,161 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from .models import Review, SimilarTitle, Title
+
+# Ограничение числа параметров IN для SQLite.
+ID_BATCH = 500
+
+
+def id_batches(ids, size=ID_BATCH):
+    for start in range(0, len(ids), size):
+        yield [int(pk) for pk in ids[start:start + size]]
+
+
+def load_ratings(batch_size):
+    """Матрица оценок пользователи x произведения и id её столбцов.
+
+    Ревью читаются пачками по id сразу в массивы numpy: в памяти только
+    по 12 байт на ревью, без объектов моделей. Столбцы нормированы, так
+    что произведение столбцов - косинусная близость.
+    """
+    # Ревью удалённых авторов у одной заглушки: их оценки не принадлежат
+    # одному человеку и в близость не входят.
+    reviews = Review.objects.filter(anonymized=False).order_by(
+        'pk'
+    ).values_list('pk', 'author_id', 'title_id', 'score')
+    authors, titles, scores = [], [], []
+    last = 0
+    while True:
+        batch = np.array(
+            list(reviews.filter(pk__gt=last)[:batch_size]), dtype=np.int64
+        ).reshape(-1, 4)
+        if not len(batch):
+            break
+        last = int(batch[-1, 0])
+        authors.append(batch[:, 1].astype(np.int32))
+        titles.append(batch[:, 2].astype(np.int32))
+        scores.append(batch[:, 3].astype(np.float32))
+    if not titles:
+        return None, np.empty(0, dtype=np.int32)
+    title_ids, columns = np.unique(np.concatenate(titles),
+                                   return_inverse=True)
+    author_ids, rows = np.unique(np.concatenate(authors),
+                                 return_inverse=True)
+    ratings = sparse.csc_matrix(
+        (np.concatenate(scores), (rows, columns)),
+        shape=(len(author_ids), len(title_ids)),
+    )
+    norms = np.sqrt(np.asarray(ratings.multiply(ratings).sum(axis=0)))
+    return (ratings @ sparse.diags(1 / norms.ravel())).tocsc(), title_ids
+
+
+def neighbours(ratings, rated, columns, count, min_common):
+    """Соседи произведений columns: по count самых близких.
+
+    Близость считается для всех столбцов пачки разом как произведение
+    разреженных матриц; размер результата ограничен размером пачки.
+    """
+    similarity = (ratings[:, columns].T @ ratings).tocsr()
+    common = (rated[:, columns].T @ rated).tocsr()
+    similarity = similarity.multiply(common >= min_common).tocsr()
+    for row, column in enumerate(columns):
+        start, end = similarity.indptr[row], similarity.indptr[row + 1]
+        others = similarity.indices[start:end]
+        scores = similarity.data[start:end]
+        keep = (others != column) & (scores > 0)
+        others, scores = others[keep], scores[keep]
+        if len(scores) > count:
+            best = np.argpartition(-scores, count)[:count]
+            others, scores = others[best], scores[best]
+        order = np.lexsort((others, -scores))
+        yield column, others[order], scores[order]
+
+
+def affected_titles(ratings, title_ids, stale):
+    """Произведения, чьи списки соседей мог изменить пересчёт stale.
+
+    Это сами stale, все оценённые вместе с ними и те, у кого stale уже
+    в соседях (общие оценки могли исчезнуть). Близость остальных пар не
+    зависит от ревью stale и не меняется.
+    """
+    stale = np.unique(np.asarray(stale, dtype=np.int32))
+    targets = [stale]
+    if ratings is not None:
+        columns = np.flatnonzero(np.isin(title_ids, stale))
+        raters = np.unique(ratings[:, columns].indices)
+        targets.append(title_ids[np.unique(ratings.tocsr()[raters].indices)])
+    for batch in id_batches(stale):
+        targets.append(np.fromiter(
+            SimilarTitle.objects.filter(similar_id__in=batch)
+            .values_list('title_id', flat=True).distinct(),
+            dtype=np.int32,
+        ))
+    return np.unique(np.concatenate(targets))
+
+
+def write_neighbours(ratings, title_ids, targets, chunk_size):
+    count = settings.SIMILAR_TITLES_COUNT
+    min_common = settings.SIMILAR_TITLES_MIN_COMMON
+    rated = None
+    if ratings is not None:
+        rated = ratings.copy()
+        rated.data[:] = 1
+    written = 0
+    for start in range(0, len(targets), chunk_size):
+        chunk = targets[start:start + chunk_size]
+        rows = []
+        if ratings is not None:
+            # Произведения без ревью остаются без соседей.
+            positions = np.searchsorted(title_ids, chunk)
+            found = positions < len(title_ids)
+            found[found] = title_ids[positions[found]] == chunk[found]
+            columns = positions[found]
+            rows = [
+                SimilarTitle(title_id=int(title_ids[column]),
+                             similar_id=int(title_ids[other]),
+                             score=float(score))
+                for column, others, scores in neighbours(
+                    ratings, rated, columns, count, min_common
+                )
+                for other, score in zip(others, scores)
+            ]
+        with transaction.atomic():
+            SimilarTitle.objects.filter(
+                title_id__in=[int(pk) for pk in chunk]
+            ).delete()
+            SimilarTitle.objects.bulk_create(rows)
+        written += len(rows)
+    return written
+
+
+def build_similar_titles(full=False, batch_size=50000, chunk_size=256):
+    """Пересчитывает похожие произведения; возвращает число строк.
+
+    Без full пересчитываются только списки, которые могли измениться из
+    за ревью помеченных similar_stale произведений. Флаги снимаются до
+    чтения ревью: ревью, записанные во время расчёта, снова пометят
+    произведение, и его подхватит следующий запуск.
+    """
+    stale = Title.objects.filter(similar_stale=True)
+    stale_ids = list(stale.values_list('pk', flat=True))
+    if not full and not stale_ids:
+        return 0
+    for batch in id_batches(stale_ids):
+        Title.objects.filter(pk__in=batch).update(similar_stale=False)
+    try:
+        ratings, title_ids = load_ratings(batch_size)
+        if full:
+            targets = np.fromiter(
+                Title.objects.order_by('pk').values_list('pk', flat=True),
+                dtype=np.int32,
+            )
+        else:
+            targets = affected_titles(ratings, title_ids, stale_ids)
+        return write_neighbours(ratings, title_ids, targets, chunk_size)
+    except BaseException:
+        for batch in id_batches(stale_ids):
+            Title.objects.filter(pk__in=batch).update(similar_stale=True)
+        raise
@@ -0,0 +1,316 @@
+import json
+import os
+import re
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import Count, F
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from users.models import User
+
+from .management.commands.import_csv import Command as ImportCommand
+from .models import (Category, Comment, Genre, GenreTitle, ImportProgress,
+                     Review, Title)
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+def explain(sql):
+    """Возвращает таблицы, которые план запроса читает целиком."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Seq Scan при выключенном enable_seqscan остаётся в плане,
+            # только если подходящего индекса нет.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return set(postgresql_scans(plan[0]['Plan']))
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return {
+            match.group(1)
+            for match in (
+                SQLITE_SCAN.match(row[-1]) for row in cursor.fetchall()
+            )
+            if match
+        }
+
+
+def postgresql_scans(node):
+    if node.get('Node Type') == 'Seq Scan':
+        yield node['Relation Name']
+    for child in node.get('Plans', []):
+        yield from postgresql_scans(child)
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+}})
+class QueryPlanTests(APITestCase):
+    """Горячие запросы эндпоинтов должны идти по индексам.
+
+    Для каждого эндпоинта перечислены таблицы, полный просмотр которых
+    считается деградацией плана.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [
+            Category.objects.create(name=f'Категория {i}', slug=f'cat-{i}')
+            for i in range(5)
+        ]
+        genres = [
+            Genre.objects.create(name=f'Жанр {i}', slug=f'genre-{i}')
+            for i in range(10)
+        ]
+        users = [
+            User.objects.create(username=f'user{i}', email=f'user{i}@ya.ru')
+            for i in range(40)
+        ]
+        titles = []
+        for i in range(60):
+            title = Title.objects.create(
+                name=f'Произведение {i}', year=1950 + i,
+                category=categories[i % len(categories)],
+            )
+            title.genre.set(genres[i % 7:i % 7 + 3])
+            titles.append(title)
+        for number, title in enumerate(titles):
+            for user in users[number % 5:number % 5 + 20]:
+                review = Review.objects.create(
+                    title=title, author=user, text='Текст',
+                    score=number % 10 + 1,
+                )
+                Comment.objects.create(
+                    review=review, author=user, text='Комментарий'
+                )
+        cls.title = titles[10]
+        cls.review = cls.title.reviews.first()
+        cls.user = users[3]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assert_no_full_scans(self, forbidden, request):
+        with CaptureQueriesContext(connection) as context:
+            response = request()
+        self.assertLess(response.status_code, status.HTTP_400_BAD_REQUEST,
+                        response.content)
+        selects = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].lstrip().upper().startswith('SELECT')
+        ]
+        self.assertTrue(selects)
+        for sql in selects:
+            scanned = explain(sql) & set(forbidden)
+            self.assertFalse(
+                scanned, f'Полный просмотр {scanned} в запросе:\n{sql}'
+            )
+
+    def get(self, forbidden, name, query='', **kwargs):
+        url = reverse(name, kwargs=kwargs) + query
+        self.assert_no_full_scans(forbidden, lambda: self.client.get(url))
+
+    def test_titles(self):
+        self.get(['reviews_genretitle'], 'titles-list')
+        self.get(['reviews_genretitle', 'reviews_genre'], 'titles-list',
+                 query='?genre=genre-4')
+        self.get(['reviews_genretitle'], 'titles-detail', pk=self.title.pk)
+
+    def test_reviews(self):
+        forbidden = ['reviews_review', 'users_user']
+        self.get(forbidden, 'reviews-list', title_id=self.title.pk)
+        self.get(forbidden, 'reviews-list', title_id=self.title.pk,
+                 query='?pagination=cursor')
+        self.get(forbidden, 'reviews-detail',
+                 title_id=self.title.pk, pk=self.review.pk)
+
+    def test_review_uniqueness_check(self):
+        author = User.objects.create(username='late', email='late@ya.ru')
+        self.client.force_authenticate(author)
+        url = reverse('reviews-list', kwargs={'title_id': self.title.pk})
+        self.assert_no_full_scans(
+            ['reviews_review', 'users_user'],
+            lambda: self.client.post(url, {'text': 'Текст', 'score': 5}),
+        )
+
+    def test_comments(self):
+        self.get(
+            ['reviews_comment', 'reviews_review', 'users_user'],
+            'comments-list',
+            title_id=self.title.pk, review_id=self.review.pk,
+        )
+
+    def test_users(self):
+        admin = User.objects.create(
+            username='admin', email='admin@ya.ru', role=User.ADMIN
+        )
+        self.client.force_authenticate(admin)
+        self.get(['users_user'], 'user-detail', username=self.user.username)
+
+
+class SeedDataTests(APITestCase):
+    """seed_data создаёт согласованный каталог с перекосом популярности."""
+
+    def test_seed_data(self):
+        call_command('seed_data', titles=50, users=20, genres=5,
+                     categories=3, reviews=300, comments=200,
+                     stdout=StringIO())
+        self.assertEqual(Title.objects.count(), 50)
+        self.assertEqual(Review.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertTrue(User.objects.filter(role=User.ADMIN).exists())
+        self.assertFalse(
+            GenreTitle.objects.filter(title__isnull=True).exists()
+        )
+        counts = list(Title.objects.annotate(
+            total=Count('reviews')
+        ).order_by('pk').values_list('total', 'review_count'))
+        self.assertTrue(all(total == stored for total, stored in counts))
+        self.assertFalse(Review.objects.annotate(
+            total=Count('comments')
+        ).exclude(total=F('comment_count')).exists())
+        self.assertLessEqual(max(total for total, _ in counts), 20)
+        self.assertGreater(counts[0][0], counts[-1][0])
+
+
+IMPORT_FIXTURES = {
+    'category.csv': 'id,name,slug\n1,Фильм,movie\n2,Книга,book\n'
+                    '3,Музыка,music\n',
+    'genre.csv': 'id,name,slug\n1,Драма,drama\n2,Комедия,comedy\n',
+    'titles.csv': 'id,name,year,category\n1,"Т, 1",1991,2\n'
+                  '2,Т2,1992,1\n3,Т3,1993,2\n',
+    'genre_title.csv': 'id,title_id,genre_id\n1,1,2\n2,2,1\n3,3,2\n',
+    'users.csv': 'id,username,email,role,bio,first_name,last_name\n'
+                 '1,u1,u1@x.ru,user,,,\n2,u2,u2@x.ru,moderator,,,\n'
+                 '3,u3,u3@x.ru,admin,,,\n',
+    'review.csv': 'id,title_id,text,author,score,pub_date\n'
+                  '1,1,т,1,4,2019-09-24T21:08:21.567Z\n'
+                  '2,1,т,2,9,2019-09-24T21:08:21.567Z\n'
+                  '3,2,т,1,3,2019-09-24T21:08:21.567Z\n'
+                  '4,3,т,3,10,2019-09-24T21:08:21.567Z\n',
+    'comments.csv': 'id,review_id,text,author,pub_date\n'
+                    '1,1,к,2,2019-09-24T21:08:21.567Z\n'
+                    '2,1,к,3,2019-09-24T21:08:21.567Z\n'
+                    '3,4,к,1,2019-09-24T21:08:21.567Z\n',
+}
+
+
+def failing_insert(model, batch_number):
+    """Подменяет вставку: пачка batch_number модели model падает."""
+    insert = ImportCommand.insert
+    batches = []
+
+    def fail(self, target, columns, batch):
+        if target is model:
+            batches.append(batch)
+            if len(batches) == batch_number:
+                raise DatabaseError('Соединение разорвано')
+        return insert(self, target, columns, batch)
+
+    return mock.patch.object(ImportCommand, 'insert', fail)
+
+
+class ImportCSVTests(APITestCase):
+    """import_csv загружает CSV пачками и продолжает с места обрыва."""
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        for filename, text in IMPORT_FIXTURES.items():
+            with open(os.path.join(self.path, filename), 'w',
+                      encoding='utf-8') as f:
+                f.write(text)
+
+    def import_csv(self, **options):
+        call_command('import_csv', path=self.path, batch_size=2,
+                     stdout=StringIO(), **options)
+
+    def assert_imported(self):
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(Genre.objects.count(), 2)
+        self.assertEqual(User.objects.filter(pk__in=[1, 2, 3]).count(), 3)
+        self.assertEqual(
+            list(Review.objects.order_by('pk').values_list('pk', flat=True)),
+            [1, 2, 3, 4],
+        )
+        self.assertEqual(Comment.objects.count(), 3)
+
+    def test_foreign_keys(self):
+        self.import_csv()
+        self.assert_imported()
+        title = Title.objects.get(pk=1)
+        self.assertEqual(title.name, 'Т, 1')
+        self.assertEqual(title.category.slug, 'book')
+        self.assertEqual(list(title.genre.values_list('slug', flat=True)),
+                         ['comedy'])
+        self.assertEqual(
+            list(title.reviews.order_by('pk').values_list(
+                'author__username', flat=True
+            )),
+            ['u1', 'u2'],
+        )
+        self.assertEqual(Comment.objects.get(pk=3).author.username, 'u1')
+        self.assertEqual(User.objects.get(pk=3).role, User.ADMIN)
+        # Вставки идут мимо сигналов: агрегаты пересчитаны после загрузки.
+        self.assertEqual((title.review_count, title.score_sum, title.rating),
+                         (2, 13, 6))
+        self.assertEqual(Review.objects.get(pk=1).comment_count, 2)
+        self.assertEqual(
+            ImportProgress.objects.get(filename='review.csv').rows, 4
+        )
+
+    def test_commit_per_batch(self):
+        with failing_insert(Review, 2), self.assertRaises(DatabaseError):
+            self.import_csv(commit='batch')
+        self.assertEqual(
+            list(Review.objects.order_by('pk').values_list('pk', flat=True)),
+            [1, 2],
+        )
+        self.assertEqual(
+            ImportProgress.objects.get(filename='review.csv').rows, 2
+        )
+        self.import_csv(commit='batch', resume=True)
+        self.assert_imported()
+
+    def test_commit_per_file(self):
+        with failing_insert(Review, 2), self.assertRaises(DatabaseError):
+            self.import_csv()
+        self.assertFalse(Review.objects.exists())
+        self.assertEqual(
+            ImportProgress.objects.get(filename='review.csv').rows, 0
+        )
+        self.assertEqual(Title.objects.count(), 3)
+        self.import_csv(resume=True)
+        self.assert_imported()
+
+    def test_resume_ignores_rows_from_elsewhere(self):
+        # Строка не из файла не сдвигает место продолжения.
+        Category.objects.create(id=100, name='Игры', slug='games')
+        with failing_insert(Category, 2), self.assertRaises(DatabaseError):
+            self.import_csv(commit='batch')
+        self.assertEqual(Category.objects.count(), 3)
+        self.import_csv(commit='batch', resume=True)
+        self.assertEqual(
+            list(Category.objects.order_by('pk').values_list(
+                'slug', flat=True
+            )),
+            ['movie', 'book', 'music', 'games'],
+        )
+        self.assertEqual(Title.objects.count(), 3)
+
+    def test_restart_without_resume(self):
+        with failing_insert(Category, 2), self.assertRaises(DatabaseError):
+            self.import_csv(commit='batch')
+        Category.objects.all().delete()
+        # Без --resume счётчик сбрасывается и файл читается заново.
+        self.import_csv(commit='batch')
+        self.assert_imported()
@@ -1,5 +1,18 @@
 from django.contrib import admin
 
-from .models import User
+from .models import ConfirmationCode, OutgoingEmail, User
 
 admin.site.register(User)
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'subject', 'status', 'attempts',
+                    'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+
+
+@admin.register(ConfirmationCode)
+class ConfirmationCodeAdmin(admin.ModelAdmin):
+    list_display = ('user', 'expires_at', 'attempts')
+    exclude = ('code_hash',)
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (AuthenticationFailed,
+                                                 InvalidToken)
+from rest_framework_simplejwt.settings import api_settings
+
+USER_CACHE_KEY = 'yamdb:auth-user:{pk}'
+
+# Поля для проверки прав и для ответа /users/me/, остальные поля
+# пользователя остаются отложенными и читаются из БД только по обращению.
+CACHED_USER_FIELDS = {
+    'id', 'username', 'role', 'is_superuser', 'is_active',
+    'email', 'first_name', 'last_name', 'bio',
+}
+
+
+def get_user_cache():
+    return caches[settings.AUTH_USER_CACHE_ALIAS]
+
+
+def forget_cached_user(pk):
+    """Сбрасывает закэшированного пользователя после фиксации записи."""
+    transaction.on_commit(
+        lambda: get_user_cache().delete(USER_CACHE_KEY.format(pk=pk))
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT-аутентификация без запроса к БД на каждый запрос.
+
+    Пользователь восстанавливается из кэша как объект модели с отложенными
+    полями, поэтому его можно сохранять: UPDATE затронет только
+    загруженные поля.
+    """
+
+    def get_cached_fields(self):
+        # Model.from_db ждёт значения в порядке полей модели.
+        return [
+            field.attname for field in self.user_model._meta.concrete_fields
+            if field.attname in CACHED_USER_FIELDS
+        ]
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                'Token contained no recognizable user identification'
+            )
+        fields = self.get_cached_fields()
+        cache = get_user_cache()
+        key = USER_CACHE_KEY.format(pk=user_id)
+        values = cache.get(key)
+        if values is None or len(values) != len(fields):
+            values = self.user_model.objects.filter(
+                **{api_settings.USER_ID_FIELD: user_id}
+            ).values_list(*fields).first()
+            if values is None:
+                raise AuthenticationFailed(
+                    'User not found', code='user_not_found'
+                )
+            cache.set(key, values, settings.AUTH_USER_CACHE_TIMEOUT)
+        user = self.user_model.from_db(
+            DEFAULT_DB_ALIAS, fields, values
+        )
+        if not user.is_active:
+            raise AuthenticationFailed(
+                'User is inactive', code='user_inactive'
+            )
+        return user
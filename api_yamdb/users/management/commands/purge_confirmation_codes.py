@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from users.models import ConfirmationCode, OutgoingEmail
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет просроченные коды подтверждения пачками по индексу '
+        'expires_at, а также отправленные письма и письма с истёкшими '
+        'кодами из очереди OutgoingEmail. Рассчитана на периодический '
+        'запуск, например из cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        codes = self.purge(
+            ConfirmationCode.objects.filter(expires_at__lte=now),
+            options['batch_size'],
+        )
+        emails = self.purge(
+            OutgoingEmail.objects.filter(
+                Q(status=OutgoingEmail.SENT)
+                | Q(created_at__lte=now - settings.CONFIRMATION_CODE_LIFETIME)
+            ),
+            options['batch_size'],
+        )
+        self.stdout.write(f'Удалено кодов: {codes}, писем: {emails}')
+
+    def purge(self, queryset, batch_size):
+        total = 0
+        while True:
+            batch = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return total
+            deleted, _ = queryset.model.objects.filter(
+                pk__in=batch
+            ).delete()
+            total += deleted
@@ -0,0 +1,111 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from users.models import OutgoingEmail
+
+
+class Command(BaseCommand):
+    help = (
+        'Отправляет письма из очереди OutgoingEmail пачками через одно '
+        'соединение с почтовым сервером, с повторами и экспоненциальной '
+        'задержкой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--max-attempts', type=int, default=5,
+            help='После стольких неудач письмо помечается ошибочным.',
+        )
+        parser.add_argument(
+            '--backoff', type=float, default=30,
+            help='Базовая задержка перед повтором, в секундах.',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться, а ждать новые письма.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help='Пауза между проверками пустой очереди в режиме --loop.',
+        )
+
+    def handle(self, *args, **options):
+        mail_connection = get_connection()
+        try:
+            while True:
+                sent, failed = self.send_batch(mail_connection, options)
+                if sent or failed:
+                    self.stdout.write(
+                        f'Отправлено: {sent}, с ошибкой: {failed}'
+                    )
+                    continue
+                if not options['loop']:
+                    break
+                mail_connection.close()
+                time.sleep(options['interval'])
+        finally:
+            mail_connection.close()
+
+    def claim(self, batch_size):
+        queryset = OutgoingEmail.objects.filter(
+            status=OutgoingEmail.PENDING,
+            next_attempt_at__lte=timezone.now(),
+        ).order_by('next_attempt_at')
+        if connection.features.has_select_for_update_skip_locked:
+            # Несколько воркеров разбирают разные письма без ожидания.
+            queryset = queryset.select_for_update(skip_locked=True)
+        return list(queryset[:batch_size])
+
+    def send_batch(self, mail_connection, options):
+        sent = failed = 0
+        with transaction.atomic():
+            emails = self.claim(options['batch_size'])
+            if not emails:
+                return sent, failed
+            try:
+                mail_connection.open()
+            except Exception as error:
+                open_error = error
+            else:
+                open_error = None
+            for email in emails:
+                now = timezone.now()
+                email.attempts += 1
+                try:
+                    if open_error is not None:
+                        raise open_error
+                    EmailMessage(
+                        subject=email.subject,
+                        body=email.body,
+                        from_email=settings.DEFAULT_FROM_EMAIL,
+                        to=[email.recipient],
+                        connection=mail_connection,
+                    ).send()
+                except Exception as error:
+                    failed += 1
+                    email.last_error = str(error)
+                    if email.attempts >= options['max_attempts']:
+                        email.status = OutgoingEmail.FAILED
+                    else:
+                        email.next_attempt_at = now + timedelta(
+                            seconds=options['backoff']
+                            * 2 ** (email.attempts - 1)
+                        )
+                else:
+                    sent += 1
+                    email.status = OutgoingEmail.SENT
+                    email.sent_at = now
+                    # В тексте код подтверждения: после отправки он не
+                    # хранится нигде, кроме хеша в ConfirmationCode.
+                    email.body = ''
+            OutgoingEmail.objects.bulk_update(emails, [
+                'status', 'attempts', 'next_attempt_at', 'last_error',
+                'sent_at', 'body',
+            ])
+        return sent, failed
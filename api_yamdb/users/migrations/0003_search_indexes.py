@@ -0,0 +1,85 @@
+import logging
+
+from django.db import DatabaseError, migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+SEARCH_COLUMNS = (
+    ('users_user', 'username'),
+)
+
+# SQL зафиксирован в миграции и не зависит от кода api.search. Триггеры,
+# которые SQLite удаляет при перестройке таблиц в следующих миграциях,
+# восстанавливает api.search.ensure_fts_triggers после migrate.
+POSTGRESQL_CREATE = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS "{table}_{column}_trgm" ON "{table}" '
+    'USING gin ((UPPER("{column}"::text)) gin_trgm_ops)',
+)
+POSTGRESQL_DROP = (
+    'DROP INDEX IF EXISTS "{table}_{column}_trgm"',
+)
+SQLITE_CREATE = (
+    'CREATE VIRTUAL TABLE "{fts}" USING fts5("{column}", '
+    'content="{table}", content_rowid=id, tokenize=\'trigram\')',
+    'CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{table}" BEGIN '
+    'INSERT INTO "{fts}"(rowid, "{column}") VALUES (new.id, new."{column}"); '
+    'END',
+    'CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{table}" BEGIN '
+    'INSERT INTO "{fts}"("{fts}", rowid, "{column}") '
+    'VALUES (\'delete\', old.id, old."{column}"); END',
+    'CREATE TRIGGER "{fts}_au" AFTER UPDATE OF "{column}" ON "{table}" BEGIN '
+    'INSERT INTO "{fts}"("{fts}", rowid, "{column}") '
+    'VALUES (\'delete\', old.id, old."{column}"); '
+    'INSERT INTO "{fts}"(rowid, "{column}") VALUES (new.id, new."{column}"); '
+    'END',
+    'INSERT INTO "{fts}"("{fts}") VALUES (\'rebuild\')',
+)
+SQLITE_DROP = (
+    'DROP TRIGGER IF EXISTS "{fts}_ai"',
+    'DROP TRIGGER IF EXISTS "{fts}_ad"',
+    'DROP TRIGGER IF EXISTS "{fts}_au"',
+    'DROP TABLE IF EXISTS "{fts}"',
+)
+STATEMENTS = {
+    'postgresql': (POSTGRESQL_CREATE, POSTGRESQL_DROP),
+    'sqlite': (SQLITE_CREATE, SQLITE_DROP),
+}
+
+
+def run(schema_editor, create):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        return
+    for table, column in SEARCH_COLUMNS:
+        names = {'table': table, 'column': column,
+                 'fts': f'{table}_{column}_fts'}
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                for sql in statements[0 if create else 1]:
+                    schema_editor.execute(sql.format(**names))
+        except DatabaseError as error:
+            if not create:
+                raise
+            # Без расширения или FTS5 поиск продолжит работать через LIKE.
+            logger.warning('Индекс поиска для %s.%s не создан: %s',
+                           table, column, error)
+
+
+def create_indexes(apps, schema_editor):
+    run(schema_editor, create=True)
+
+
+def drop_indexes(apps, schema_editor):
+    run(schema_editor, create=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_outgoing_email'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
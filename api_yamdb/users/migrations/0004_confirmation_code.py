@@ -0,0 +1,57 @@
+# Generated by Django 3.2 on 2026-10-18 13:52
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+import django.db.models.deletion
+
+# Соль и алгоритм api.confirmation_code на момент миграции: миграция не
+# должна зависеть от кода приложения, который может измениться.
+CODE_HASH_SALT = 'api.confirmation_code'
+
+
+def move_codes(apps, schema_editor):
+    # Выданные коды переносятся хешами и действуют ещё полный срок.
+    User = apps.get_model('users', 'User')
+    ConfirmationCode = apps.get_model('users', 'ConfirmationCode')
+    expires_at = timezone.now() + settings.CONFIRMATION_CODE_LIFETIME
+    users = User.objects.exclude(confirmation_code='').values_list(
+        'pk', 'confirmation_code'
+    )
+    ConfirmationCode.objects.bulk_create(
+        (ConfirmationCode(user_id=pk, expires_at=expires_at,
+                          code_hash=salted_hmac(
+                              CODE_HASH_SALT, code, algorithm='sha256'
+                          ).hexdigest())
+         for pk, code in users.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConfirmationCode',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='confirmation', serialize=False, to='users.user', verbose_name='Пользователь')),
+                ('code_hash', models.CharField(max_length=64, verbose_name='Хеш кода')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Действует до')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Неудачных попыток')),
+            ],
+            options={
+                'verbose_name': 'Код подтверждения',
+                'verbose_name_plural': 'Коды подтверждения',
+            },
+        ),
+        migrations.RunPython(move_codes, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='user',
+            name='confirmation_code',
+        ),
+    ]
@@ -1,5 +1,7 @@
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -41,10 +43,6 @@ class User(AbstractUser):
         choices=USER_ROLES,
         default='user',
     )
-    confirmation_code = models.CharField(
-        max_length=250,
-        blank=True,
-    )
 
     @property
     def is_admin(self):
@@ -61,5 +59,136 @@ class User(AbstractUser):
         """Проверка на наличие стандартных прав."""
         return self.role == self.USER
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_username = instance.__dict__.get('username')
+        return instance
+
     def __str__(self):
         return self.username
+
+
+# Заглушка, которой передаются ревью и комментарии удалённых пользователей.
+# validate_name запрещает это имя при регистрации и в UserSerializer, так
+# что занять его через API нельзя; UserViewSet заглушку не показывает.
+DELETED_USERNAME = 'deleted'
+
+
+def get_deleted_user():
+    """Неактивный пользователь-заглушка; создаётся при первом обращении.
+
+    Активный пользователь с тем же именем (например, созданный в
+    админке) заглушкой не считается: ему не передаются чужие ревью.
+    """
+    user = User.objects.get_or_create(
+        username=DELETED_USERNAME,
+        defaults={
+            'email': 'deleted@yamdb.invalid',
+            'is_active': False,
+            'password': make_password(None),
+        },
+    )[0]
+    if user.is_active or user.has_usable_password():
+        raise ValueError(
+            f'Имя {DELETED_USERNAME} занято настоящим пользователем.'
+        )
+    return user
+
+
+class ConfirmationCode(models.Model):
+    """Код подтверждения: хеш, срок действия и счётчик попыток.
+
+    Отдельная узкая таблица, чтобы регистрация не переписывала строку
+    пользователя. Просроченные коды удаляет purge_confirmation_codes.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='confirmation',
+        verbose_name='Пользователь',
+    )
+    code_hash = models.CharField(
+        max_length=64,
+        verbose_name='Хеш кода',
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+        verbose_name='Действует до',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Неудачных попыток',
+    )
+
+    class Meta:
+        verbose_name = 'Код подтверждения'
+        verbose_name_plural = 'Коды подтверждения'
+
+    def __str__(self):
+        return f'{self.user_id} до {self.expires_at:%Y-%m-%d %H:%M}'
+
+
+class OutgoingEmail(models.Model):
+    """Очередь исходящих писем, которую разбирает команда send_emails."""
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUSES = [
+        (PENDING, 'Ожидает отправки'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Ошибка отправки'),
+    ]
+    recipient = models.EmailField(
+        max_length=254,
+        verbose_name='Получатель',
+    )
+    subject = models.CharField(
+        max_length=255,
+        verbose_name='Тема',
+    )
+    body = models.TextField(
+        verbose_name='Текст письма',
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток отправки',
+    )
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Следующая попытка',
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка',
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Поставлено в очередь',
+    )
+    sent_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Отправлено',
+    )
+
+    class Meta:
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'],
+                         name='outgoing_email_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipient}: {self.subject}'
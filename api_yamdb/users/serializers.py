@@ -1,16 +1,21 @@
+from api.sparse import SparseFieldsMixin
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
 from .models import User
+from .validators import validate_name
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     username = serializers.RegexField(
         required=True,
         max_length=150,
         regex=r"^[^\W\d]\w*$",
-        validators=[UniqueValidator(queryset=User.objects.all())]
+        validators=[
+            validate_name,
+            UniqueValidator(queryset=User.objects.all()),
+        ]
     )
 
     email = serializers.EmailField(
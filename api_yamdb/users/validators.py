@@ -1,9 +1,10 @@
 from rest_framework import serializers
 
+from .models import DELETED_USERNAME
+
 
 def validate_name(value):
-    me = 'me'
-    if value == me:
+    if value in ('me', DELETED_USERNAME):
         raise serializers.ValidationError(
             f'Использовать имя {value} в качестве имя пользователя запрещено!'
         )
@@ -1,22 +1,31 @@
+from api.deletion import ScheduledDestroyMixin
+from api.metrics import TimedRetrieveMixin
+from api.pagination import IdPagination
 from api.permissions import IsAdmin
+from api.search import IndexedSearchFilter
+from api.sparse import SparseFieldsViewMixin
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from reviews.models import DeletionJob
 
-from .models import User
+from .models import DELETED_USERNAME, User
 from .serializers import UserSerializer
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ScheduledDestroyMixin, SparseFieldsViewMixin,
+                  TimedRetrieveMixin, viewsets.ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete']
     lookup_field = 'username'
-    queryset = User.objects.all()
+    queryset = User.objects.exclude(username=DELETED_USERNAME)
     serializer_class = UserSerializer
     permission_classes = (IsAdmin,)
-    filter_backends = (SearchFilter,)
+    throttle_scope = 'write'
+    pagination_class = IdPagination
+    filter_backends = (IndexedSearchFilter,)
     search_fields = ('username',)
+    deletion_kind = DeletionJob.USER
 
     @action(
         methods=['GET', 'PATCH'],
@@ -26,10 +35,10 @@ class UserViewSet(viewsets.ModelViewSet):
     )
     def me_page(self, request):
         if request.method == 'GET':
-            serializer = UserSerializer(request.user)
+            serializer = self.get_serializer(request.user)
             return Response(serializer.data, status=status.HTTP_200_OK)
         if request.method == 'PATCH':
-            serializer = UserSerializer(
+            serializer = self.get_serializer(
                 request.user, data=request.data, partial=True)
             if serializer.is_valid():
                 serializer.save(role=request.user.role)